@@ -20,6 +20,9 @@ AeroGCM - A Application to visualize and analyze flight routes
 import os
 import sys
 
+# Import the startup profile first, so it measures the time of all other imports
+from aerogcm_startup import startup_profile, aerogcm_cache_dir, resource_path
+
 # Import the Kivy framework for the App
 from kivy.app import App
 from kivy.uix.button import Button
@@ -28,50 +31,36 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.switch import Switch
-from kivy_garden.matplotlib import FigureCanvasKivyAgg
 from kivy.core.window import Window
 from kivy.uix.accordion import Accordion, AccordionItem
 from kivy.uix.gridlayout import GridLayout
-from kivy_garden.filebrowser import FileBrowser
-from kivy.uix.filechooser import FileChooserIconView
 from kivy.uix.popup import Popup
-
-#Import numpy for some general maths vector handling
-import numpy as np
-
-#Import geodesic, to calcualte some map metrics
-from geopy.distance import geodesic
-
-
-# Import Matplotlib to draw the map
-import matplotlib.pyplot as plt
-
-# Import Basemap for the plotting of the world map
-from mpl_toolkits.basemap import Basemap
-
-# Import airportsdata to get the lat and long coordinates of each airport based on its ICAO/IATA code
-import airportsdata
-
-# Import NumPy for numerical operations
-import numpy as np
+from kivy.uix.image import Image
+from kivy.uix.progressbar import ProgressBar
+from kivy.clock import Clock
 
 # Import all the global datastructures
 from aerogcm_datastructures import *
 
-# Import the input parser that parses the inputs into the dataset for plotting
-from aerogcm_input_parser import AirportInputParser
+# The heavy modules (Matplotlib, Basemap, the airport data, the file chooser and the popups)
+# are imported on first use, so the window is shown as fast as possible.
 
-#Import the License Info Info
-from license_info import LicenseInfo
+# Set the default window size
+Window.size = (1200, 800)
 
-# Import the Flight Logger
-from flight_logger import FlightLogger
+# Cached image of the empty world map, shown until the map canvas is ready
+BACKGROUND_CACHE_FILE = 'world_map_background_v1.png'
 
-# Import the City Airport Search
-from city_airport_search import CityAirportSearch  # <-- import the new module
+# Delay in seconds after the first frame, before the map is initialized
+MAP_INIT_DELAY = 0.1
 
-# Set the default window size
-Window.size = (1200, 800)
+# Delay in seconds after the last keystroke, before the live preview renders the map
+LIVE_PREVIEW_DELAY = 0.3
+
+# Delay in seconds after the last size change of the map, before it is rendered again at the new size
+MAP_RESIZE_DELAY = 0.2
+
+startup_profile.mark('imports done')
 
 # Main Application Layout
 class MainLayout(BoxLayout):
@@ -79,11 +68,24 @@ class MainLayout(BoxLayout):
         super().__init__(**kwargs)
         self.orientation = 'horizontal'  # Layout is now horizontal to fit the map and settings sections
 
-        # Initialize the Input Parser
-        self.parser = AirportInputParser()
+        # The License Info and the background map renderer are created on first use
+        self.license_info = None
+        self.render_worker = None
+
+        # Generation of the newest render job, results of older generations are discarded
+        self.render_generation = 0
+
+        # Input text of the last map request, None while the empty world map is shown
+        self.mapped_text = None
+
+        # Distance model of the route distances, 'spherical' or 'ellipsoidal'
+        self.distance_model = 'spherical'
 
-        #Initialize the License Info
-        self.license_info = LicenseInfo()
+        # Size of the map in the last render job
+        self.map_size = None
+
+        # Re-render the map, once the size of the map view stops changing
+        self.map_resize_trigger = Clock.create_trigger(self.on_map_resize, MAP_RESIZE_DELAY)
 
         # Left side: Settings Menu using Accordion
         settings_layout = BoxLayout(orientation='vertical', size_hint=(0.2, 1), padding=10, spacing=10)
@@ -118,6 +120,27 @@ class MainLayout(BoxLayout):
         map_style_layout.add_widget(Label(text="City Names"))
         map_style_layout.add_widget(self.city_names_toggle_switch)
 
+        # Add the On/Off switch to toggle ellipsoidal (WGS84) route distances
+        self.ellipsoidal_distances_toggle_switch = Switch(active=False)  # Default is 'off' (spherical distances)
+        self.ellipsoidal_distances_toggle_switch.bind(active=self.on_ellipsoidal_distances_toggle)
+        # Add label and switch to toggle the distance model
+        map_style_layout.add_widget(Label(text="WGS84 Distances"))
+        map_style_layout.add_widget(self.ellipsoidal_distances_toggle_switch)
+
+        # Add the On/Off switch to toggle the route density heatmap
+        self.route_density_toggle_switch = Switch(active=False)  # Default is 'off' (single routes)
+        self.route_density_toggle_switch.bind(active=self.on_route_density_toggle)
+        # Add label and switch to toggle the route density
+        map_style_layout.add_widget(Label(text="Route Density"))
+        map_style_layout.add_widget(self.route_density_toggle_switch)
+
+        # Add the On/Off switch to toggle the live preview of the input
+        self.live_preview_toggle_switch = Switch(active=False)  # Default is 'off' (map on button press only)
+        self.live_preview_toggle_switch.bind(active=self.on_live_preview_toggle)
+        # Add label and switch to toggle the live preview
+        map_style_layout.add_widget(Label(text="Live Preview"))
+        map_style_layout.add_widget(self.live_preview_toggle_switch)
+
         # Create File section
         file_item = AccordionItem(title='File')
 
@@ -199,27 +222,23 @@ class MainLayout(BoxLayout):
         # Add accordion to the settings layout
         settings_layout.add_widget(settings_accordion)
 
-        # Right side: World map (using Matplotlib with Basemap)
-        self.map_fig, self.map_ax = plt.subplots()
-        self.map_canvas = FigureCanvasKivyAgg(self.map_fig)
-
-        # Initialize the world map
-        self.m = Basemap(projection='mill', llcrnrlat=-60, urcrnrlat=90,
-                        llcrnrlon=-180, urcrnrlon=180, resolution='c', ax=self.map_ax)
-        # Set the figure background color to black
-        self.map_fig.patch.set_facecolor('black')
-
-        # Draw the map boundary with black fill
-        self.m.drawmapboundary(fill_color='black')
-
-        # Draw coastlines with white color
-        self.m.drawcoastlines(color='white')
+        # Right side: World map (rendered with Matplotlib and Basemap in the background)
+        # Until the first map is rendered, the cached background image is shown
+        self.map_container = BoxLayout(orientation='vertical')
+        self.map_area = BoxLayout()
+        background_path = os.path.join(aerogcm_cache_dir(), BACKGROUND_CACHE_FILE)
+        if os.path.isfile(background_path):
+            self.map_area.add_widget(Image(source=background_path, fit_mode='fill'))
+        else:
+            self.map_area.add_widget(Label(text="Loading map..."))
+        self.map_container.add_widget(self.map_area)
 
-        # Fill continents and lakes with colors
-        self.m.fillcontinents(color='gray', lake_color='black')
+        # Progress indicator, visible while a map is rendered
+        self.render_progress = ProgressBar(max=1, value=0, size_hint_y=None, height=6, opacity=0)
+        self.map_container.add_widget(self.render_progress)
 
-        # Add the map canvas
-        self.add_widget(self.map_canvas)
+        # Add the map container
+        self.add_widget(self.map_container)
 
         # Right side: Input section for ICAO/IATA code pairs
         right_layout = BoxLayout(orientation='vertical', size_hint=(0.4, 1), padding=10, spacing=10)
@@ -253,6 +272,7 @@ class MainLayout(BoxLayout):
             font_size=16,
             background_color=(0.2, 0.2, 0.2, 1),
             foreground_color=(1, 1, 1, 1))
+        self.icao_input.bind(text=self.on_icao_input_text)
         scroll_view.add_widget(self.icao_input)
         right_layout.add_widget(scroll_view)
 
@@ -294,17 +314,116 @@ class MainLayout(BoxLayout):
         # Default: Show city names (switch default to 'off')
         self.show_city_names = False
 
+        # Default: Draw every route as a line (switch default to 'off')
+        self.route_style = 'lines'
+
+        # Default: No live preview (switch default to 'off')
+        self.live_preview = False
+
+        # Live preview: render the map, once the input did not change for LIVE_PREVIEW_DELAY seconds
+        self.live_preview_trigger = Clock.create_trigger(self.update_map, LIVE_PREVIEW_DELAY)
+
+        # Label widgets of the rows of the Flight Route Distance Table, reused when the table is updated
+        self.flight_route_table_rows = []
+
     def exit(self, *args):
         """
         Function to close the Kivy application.
         """
         App.get_running_app().stop()  # Stop the app
     
+    def ensure_map(self, *args):
+        """
+        Start the background map renderer on first use. It renders the empty world map first,
+        which replaces the cached background image as soon as it is done.
+        """
+        if self.render_worker is not None:
+            return self.render_worker
+
+        from aerogcm_render_worker import MapRenderWorker
+        from aerogcm_map_canvas import MapView
+
+        # Results and progress are reported from the worker thread, and handed over to the Kivy thread by the Clock
+        self.render_worker = MapRenderWorker(
+            lambda result: Clock.schedule_once(lambda dt: self.on_render_result(result)),
+            lambda generation, fraction: Clock.schedule_once(lambda dt: self.on_render_progress(generation, fraction)))
+
+        # The map view replaces the background image with the first rendered map
+        self.map_view = MapView()
+        self.map_view.bind(size=self.map_resize_trigger)
+
+        self.request_render(world_map=True)
+        return self.render_worker
+
+    def request_render(self, world_map=False):
+        """
+        Send a new render job with the current input and map settings to the background renderer.
+        Increasing the generation discards all renders, that are still in flight.
+        """
+        from aerogcm_render_worker import RenderJob
+
+        if not world_map:
+            self.mapped_text = self.icao_input.text
+        self.render_generation += 1
+        width, height = self.map_size = tuple(self.map_area.children[0].size)
+        options = {'show_labels': self.show_labels,
+                   'show_country_lines': self.show_country_lines,
+                   'show_city_names': self.show_city_names,
+                   'route_style': self.route_style}
+        self.render_worker.submit(RenderJob(
+            self.render_generation, self.mapped_text or '', int(width), int(height), options, self.distance_model,
+            world_map=world_map,
+            background_path=os.path.join(aerogcm_cache_dir(), BACKGROUND_CACHE_FILE)))
+
+        # Show the progress indicator while the render is in flight
+        self.render_progress.value = 0
+        self.render_progress.opacity = 1
+
+    def on_map_resize(self, *args):
+        """
+        Render the map again at the new size of the map view.
+        """
+        if self.render_worker is not None and self.map_view.parent is not None and tuple(self.map_view.size) != self.map_size:
+            self.request_render(world_map=self.mapped_text is None)
+
+    def on_render_progress(self, generation, fraction):
+        if generation == self.render_generation:
+            self.render_progress.value = fraction
+
+    def on_render_result(self, result):
+        """
+        Show a finished render, unless it was superseded by a newer input or setting.
+        """
+        if result.generation != self.render_generation:
+            return
+        self.render_progress.opacity = 0
+
+        if result.error is not None:
+            print(f"Could not render the map: {result.error}")
+            return
+
+        # Update the Flight Route Distance Table
+        if result.route_distances is not None:
+            self.update_flight_route_table(result.route_distances)
+
+        if result.rgba is not None:
+            # Replace the background image with the map view on the first rendered map
+            if self.map_view.parent is None:
+                self.map_area.clear_widgets()
+                self.map_area.add_widget(self.map_view)
+                startup_profile.mark('map ready')
+                startup_profile.print_report()
+            self.map_view.show_image(result.rgba, result.width, result.height)
+
     def show_license_info(self, *args):
+        if self.license_info is None:
+            from license_info import LicenseInfo
+            self.license_info = LicenseInfo()
         self.license_info.open()
 
     def save_icao_input_content(self, *args):
         # Show a file dialog to select the file path
+        from kivy.uix.filechooser import FileChooserIconView
         file_chooser = FileChooserIconView()
         file_chooser.path = os.getcwd()
         file_chooser.filters = [lambda folder, filename: filename.endswith('.aerogcm')]
@@ -344,6 +463,7 @@ class MainLayout(BoxLayout):
     
     def open_icao_input_content(self, *args):
         # Show a file dialog to select the file path
+        from kivy.uix.filechooser import FileChooserIconView
         file_chooser = FileChooserIconView()
         file_chooser.path = os.getcwd()
         file_chooser.filters = [lambda folder, filename: filename.endswith('.aerogcm')]
@@ -394,313 +514,84 @@ class MainLayout(BoxLayout):
         self.show_city_names = value
         self.update_map(None)  # Update map when switch is changed
 
-    def sample_great_circle(self, start, end, num_points=100):
+    def on_route_density_toggle(self, instance, value):
         """
-        Samples `num_points` along the great circle between two coordinates.
-        Uses spherical interpolation for accurate representation.
-        Returns two lists: latitudes and longitudes of the sampled points.
+        Toggle between single route lines and the route density heatmap based on the switch value.
+        True means density, False means lines.
         """
-        lat1, lon1 = np.radians(start)  # Start point in radians
-        lat2, lon2 = np.radians(end)    # End point in radians
-
-        # Compute the great circle points
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-
-        # Compute the angular distance
-        a = (np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2)
-        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-
-        # Sample points along the great circle
-        lat_points = []
-        lon_points = []
-        for i in range(num_points + 1):
-            f = i / num_points
-            A = np.sin((1 - f) * c) / np.sin(c)
-            B = np.sin(f * c) / np.sin(c)
-
-            x = A * np.cos(lat1) * np.cos(lon1) + B * np.cos(lat2) * np.cos(lon2)
-            y = A * np.cos(lat1) * np.sin(lon1) + B * np.cos(lat2) * np.sin(lon2)
-            z = A * np.sin(lat1) + B * np.sin(lat2)
-
-            lat_points.append(np.degrees(np.arctan2(z, np.sqrt(x**2 + y**2))))
-            lon_points.append(np.degrees(np.arctan2(y, x)))
+        self.route_style = 'density' if value else 'lines'
+        self.update_map(None)  # Update map when switch is changed
 
-        return lat_points, lon_points
-    
-    def calc_bounding_box(self, parsed_pairs, all_lats, all_lons):
+    def on_live_preview_toggle(self, instance, value):
         """
-        Function calculates the bounding box of all the great circles, to zoom into the section of the map, that is showing the mapped great circles
+        Toggle the live preview of the input based on the switch value.
+        True means the map follows the input while typing, False means it is updated with the Map Routes button.
         """
-        # Initialize lists to store latitudes and longitudes for bounding box calculation by taking the values of the distance rings
-        all_lats = all_lats
-        all_lons = all_lons
-
-        # Clear the map
-        self.map_ax.clear()
-        
-        # Initialize the world map again
-        self.m = Basemap(projection='mill', llcrnrlat=-60, urcrnrlat=90,
-                        llcrnrlon=-180, urcrnrlon=180, resolution='c', ax=self.map_ax)
-
-        # Iterate over parsed pairs and draw great circles manually
-        for pair in parsed_pairs:
-            # Sample points along the great circle
-            start = (pair.startcoord.lat, pair.startcoord.lon)
-            end = (pair.endcoord.lat, pair.endcoord.lon)
-            lats, lons = self.sample_great_circle(start, end, 100)
-
-            # Add the sampled latitudes and longitudes to the list for bounds calculation
-            all_lats.extend(lats)
-            all_lons.extend(lons)
-
-        # Determine the bounds of the great circle paths with padding
-        min_lat = max(min(all_lats) - 5, -90)
-        max_lat = min(max(all_lats) + 5, 90)
-        min_lon = max(min(all_lons) - 5, -180)
-        max_lon = min(max(all_lons) + 5, 180)
-
-        return min_lat, max_lat, min_lon, max_lon
-    
-    def plot_airports(self, parsed_pairs, parsed_rings):
-        """
-        Function plots the airport labels and a dot on every airport.
-        Ensures that each airport is plotted only once, even if it appears in multiple lists.
-        """
-        # Set to store unique airport codes that have already been plotted
-        plotted_airports = set()
-
-        # Plot airports from parsed_pairs
-        for pair in parsed_pairs:
-            # Check if the start airport has been plotted already
-            if pair.start_code not in plotted_airports:
-                start_coord = self.m(pair.startcoord.lon, pair.startcoord.lat)
-                self.map_ax.text(start_coord[0], start_coord[1], pair.start_code, fontsize=10, ha='right', color=pair.color)
-                self.map_ax.plot(start_coord[0], start_coord[1], 'o', color=pair.color, markersize=5)
-                plotted_airports.add(pair.start_code)  # Add to plotted set
-
-            # Check if the end airport has been plotted already
-            if pair.end_code not in plotted_airports:
-                end_coord = self.m(pair.endcoord.lon, pair.endcoord.lat)
-                self.map_ax.text(end_coord[0], end_coord[1], pair.end_code, fontsize=10, ha='left', color=pair.color)
-                self.map_ax.plot(end_coord[0], end_coord[1], 'o', color=pair.color, markersize=5)
-                plotted_airports.add(pair.end_code)  # Add to plotted set
-
-        # Plot airports from parsed_rings
-        for ring in parsed_rings:
-            # Check if the ring's starting airport has been plotted already
-            if ring.start_code not in plotted_airports:
-                start_coord = self.m(ring.startcoord.lon, ring.startcoord.lat)
-                self.map_ax.text(start_coord[0], start_coord[1], ring.start_code, fontsize=10, ha='right', color=ring.color)
-                self.map_ax.plot(start_coord[0], start_coord[1], 'o', color=ring.color, markersize=5)
-                plotted_airports.add(ring.start_code)  # Add to plotted set
-        
-    def plot_cities(self):
-        """
-        Plots markers and names of important world cities on the Basemap instance (self.m).
-        """
-        # List of major cities with their coordinates (latitude, longitude) and names
-        major_cities = [
-            {"name": "New York", "lat": 40.7128, "lon": -74.0060},
-            {"name": "London", "lat": 51.5074, "lon": -0.1278},
-            {"name": "Tokyo", "lat": 35.6895, "lon": 139.6917},
-            {"name": "Paris", "lat": 48.8566, "lon": 2.3522},
-            {"name": "Sydney", "lat": -33.8688, "lon": 151.2093},
-            {"name": "Moscow", "lat": 55.7558, "lon": 37.6176},
-            {"name": "Cairo", "lat": 30.0444, "lon": 31.2357},
-            {"name": "Beijing", "lat": 39.9042, "lon": 116.4074},
-            {"name": "Mumbai", "lat": 19.0760, "lon": 72.8777},
-            {"name": "Rio de Janeiro", "lat": -22.9068, "lon": -43.1729}
-        ]
-
-        # Define marker color in RGBA format
-        marker_color = (19.6/100, 64.3/100,80.8/100,1) # Custom color (dark blue-grey)
-
-        # Plot each city on the map
-        for city in major_cities:
-            # Convert city coordinates to map projection
-            x, y = self.m(city["lon"], city["lat"])
-            
-            # Plot a marker for the city
-            self.m.plot(x, y, marker='o', markersize=5, markerfacecolor=marker_color, markeredgewidth=0)
-            
-            # Add the city name next to the marker
-            plt.text(x, y, city["name"], fontsize=10, ha='right', color=marker_color)
-
-    def plot_distance_rings(self, distance_rings):
-        """
-        Plots the specified distance rings on the Basemap without connecting points across the map boundary.
-
-        Parameters:
-        distance_rings (list): List of DistanceRing objects to be plotted.
-        """
-
-        all_lats = []
-        all_lons = []
-        for ring in distance_rings:
-            try:
-                lat = ring.startcoord.lat 
-                lon = ring.startcoord.lon 
-                distance_km = ring.distance  # Already in kilometers
-
-                # Generate points every degree around the circle (360 degrees)
-                num_points = 360
-                circle_points = []
-
-                for angle in np.linspace(0, 360, num_points):
-                    # Use geopy's geodesic method to calculate the destination point from the center
-                    destination = geodesic(kilometers=distance_km).destination((lat, lon), angle)
-                    circle_points.append((destination.latitude, destination.longitude))
-
-                # Extract lats and lons separately for plotting
-                circle_lats, circle_lons = zip(*circle_points)
-
-                # Project these lat/lon points to map coordinates
-                map_x, map_y = self.m(circle_lons, circle_lats)
-
-                # Check for large jumps in both x and y coordinates to detect boundary crossings
-                split_indices = [0]  # Start index for each segment
-                for i in range(1, len(map_x)):
-                    if (abs(map_x[i] - map_x[i - 1]) > self.m.xmax / 2) or (abs(map_y[i] - map_y[i - 1]) > self.m.ymax / 2):
-                        # If a large jump is detected in x or y, add a new segment
-                        split_indices.append(i)
-
-                split_indices.append(len(map_x))  # End of the last segment
-
-                # Plot each segment separately to avoid connecting across boundaries
-                for i in range(len(split_indices) - 1):
-                    start_idx = split_indices[i]
-                    end_idx = split_indices[i + 1]
-                    self.m.plot(map_x[start_idx:end_idx], map_y[start_idx:end_idx], linewidth=1.5, color=ring.color)
-
-            except Exception as e:
-                print(f"Failed to plot ring for {ring.startcoord}: {e}")
-
-            all_lats.extend(circle_lats)
-            all_lons.extend(circle_lons)
-
-            #Add the coordinates of the airport of the distance ring, in case the ring is so big, that it does not encompass the destination (eg. 14000km@LAX)
-            all_lats.append(lat)
-            all_lons.append(lon)
-
-        return all_lats, all_lons
+        self.live_preview = value
+        if value:
+            self.update_map(None)
 
-                
-    def plot_great_circles(self, parsed_pairs):
+    def on_icao_input_text(self, instance, value):
         """
-        Function plots the great circles onto the map without connecting 
-        points across the map boundary in longitude and latitude.
+        In live preview mode, schedule a map update. Every keystroke restarts the delay,
+        so the map is only rendered when the typing pauses.
         """
-        for pair in parsed_pairs:
-            # Sample points along the great circle
-            lats, lons = self.sample_great_circle((pair.startcoord.lat, pair.startcoord.lon), 
-                                                (pair.endcoord.lat, pair.endcoord.lon), 500)
-
-            # Convert latitude and longitude to map projection coordinates
-            x, y = self.m(lons, lats)
-
-            # Check for large jumps in both x and y coordinates
-            split_indices = [0]  # Start index for each segment
-            for i in range(1, len(x)):
-                if (abs(x[i] - x[i - 1]) > self.m.xmax / 2) or (abs(y[i] - y[i - 1]) > self.m.ymax / 2): 
-                    # If a large jump is detected in longitude (x) or latitude (y)
-                    split_indices.append(i)  # Start a new segment
+        if self.live_preview:
+            self.live_preview_trigger()
 
-            split_indices.append(len(x))  # End of the last segment
-
-            print(split_indices)
-            # Plot each segment separately to avoid connecting across boundaries
-            for i in range(len(split_indices) - 1):
-                start_idx = split_indices[i]
-                end_idx = split_indices[i + 1]
-                self.m.plot(x[start_idx:end_idx], y[start_idx:end_idx], linewidth=2, color=pair.color)
+    def on_ellipsoidal_distances_toggle(self, instance, value):
+        """
+        Toggle between spherical and ellipsoidal (WGS84) route distances based on the switch value.
+        True means ellipsoidal, False means spherical.
+        """
+        self.distance_model = 'ellipsoidal' if value else 'spherical'
+        self.update_map(None)  # Update map and distance table when switch is changed
 
      # Function to update the flight route distance table with new data
     def update_flight_route_table(self, flight_data_list):
         """
-        Updates the flight route table with the current routes and corresponding distances
+        Updates the flight route table with the current routes and corresponding distances.
+        The rows are updated in place: existing labels get the new texts, and rows are only added or removed,
+        if the number of routes changed.
         """
-        # Clear existing data rows (keeping the headers)
-        self.flight_route_table_layout.clear_widgets()
-        
-        # Re-add headers
-        self.flight_route_table_layout.add_widget(Label(text="Flight Route", size_hint_y=None, height=40, bold=True))
-        self.flight_route_table_layout.add_widget(Label(text="Distance", size_hint_y=None, height=40, bold=True))
-
-        # Populate the table with the new flight data
-        for flight in flight_data_list:
-            self.flight_route_table_layout.add_widget(Label(text=flight.route, size_hint_y=None, height=30))
-            self.flight_route_table_layout.add_widget(Label(text=f"{flight.distancekm:.2f} km", size_hint_y=None, height=30))
+        rows = self.flight_route_table_rows
+
+        # Update the existing rows
+        for (route_label, distance_label), flight in zip(rows, flight_data_list):
+            route_label.text = flight.route
+            distance_label.text = f"{flight.distancekm:.2f} km"
+
+        # Add the missing rows
+        for flight in flight_data_list[len(rows):]:
+            route_label = Label(text=flight.route, size_hint_y=None, height=30)
+            distance_label = Label(text=f"{flight.distancekm:.2f} km", size_hint_y=None, height=30)
+            self.flight_route_table_layout.add_widget(route_label)
+            self.flight_route_table_layout.add_widget(distance_label)
+            rows.append((route_label, distance_label))
+
+        # Remove the surplus rows
+        while len(rows) > len(flight_data_list):
+            route_label, distance_label = rows.pop()
+            self.flight_route_table_layout.remove_widget(route_label)
+            self.flight_route_table_layout.remove_widget(distance_label)
     
     def update_map(self, instance):
         """
         Updates the map by drawing great circles based on the parsed ICAO/IATA pairs
         and adjusts the map boundaries to fit all great circles.
+        The map and the Flight Route Distance Table are rendered in the background and shown when they are done.
         """
-        # Get the parsed ICAO/IATA pairs from the input
-        input_text = self.icao_input.text.strip()
-        parsed_pairs, parsed_rings = self.parser.parseInput(input_text)
-
-        #If the Update Map Button was pressed, also update the Flight Route Distance Table
-        self.update_flight_route_table(self.parser.calculate_route_distance(input_text))
-        
-        # If no valid pairs, skip updating
-        if not (parsed_pairs or parsed_rings):
-            return
-
-        #Use the plot distance ring function, to calculate the lats and lons of the distance ring for bounding box calculation
-        all_lats, all_lons = self.plot_distance_rings(parsed_rings)
-
-        #Calculate the bounding box, in which all the distance rings and great circles are contained to zoom the map
-        min_lat, max_lat, min_lon, max_lon = self.calc_bounding_box(parsed_pairs, all_lats, all_lons)
-
-        # Clear the map and reset the map view with new bounds
-        self.map_ax.clear()
-        self.m = Basemap(projection='mill',
-                        llcrnrlat=min_lat, urcrnrlat=max_lat,
-                        llcrnrlon=min_lon, urcrnrlon=max_lon,
-                        resolution='l', ax=self.map_ax)
-        # Set the figure background color to black
-        self.map_fig.patch.set_facecolor('black')
-
-        # Draw the map boundary with black fill
-        self.m.drawmapboundary(fill_color='black')
-
-        # Draw coastlines with white color
-        self.m.drawcoastlines(color='white')
-
-        # Fill continents and lakes with colors
-        self.m.fillcontinents(color='gray', lake_color='black')
-
-        #Draw the Country Lines, if desired
-        if self.show_country_lines == True:
-            # Optionally draw countries
-            self.m.drawcountries(color='lightgray')
-
-        # Plot the great circles again after setting the new boundaries
-        self.plot_great_circles(parsed_pairs)
-
-        #Plot the distance rings around the airport
-        self.plot_distance_rings(parsed_rings)
-
-        # Plot the airports, if desired
-        if self.show_labels:
-            #Optionally draw airport names
-            self.plot_airports(parsed_pairs, parsed_rings)
-
-        #Plot the city names, if that is desired
-        if self.show_city_names == True:
-            #Optionally draw city names of some known cities
-            self.plot_cities()
-
-        # Refresh the map with the new great circles
-        self.map_canvas.draw()
+        # Make sure the background map renderer exists
+        self.ensure_map()
+        self.request_render()
 
     def open_flight_logger(self, *args):
+        from flight_logger import FlightLogger
         flight_logger = FlightLogger(self)
         flight_logger.open()
 
     def open_city_airport_search(self, *args):
+        from city_airport_search import CityAirportSearch
         city_search = CityAirportSearch(self)
         city_search.open()
 
@@ -709,12 +600,19 @@ class MainLayout(BoxLayout):
 class AeroGCMApp(App):
     def build(self):
         # Determine the path to the icon file
-        if hasattr(sys, '_MEIPASS'):
-            icon_path = os.path.join(sys._MEIPASS, 'AeroGCM_Icon.png')
-        else:
-            icon_path = './AeroGCM_Icon.png'
-        self.icon = icon_path
-        return MainLayout()
+        self.icon = resource_path('AeroGCM_Icon.png')
+        with startup_profile.phase('main layout'):
+            return MainLayout()
+
+    def on_start(self):
+        # Record when the first frame is shown, then initialize the map shortly after
+        Clock.schedule_once(lambda dt: startup_profile.mark('window shown'), 0)
+        Clock.schedule_once(self.root.ensure_map, MAP_INIT_DELAY)
+
+    def on_stop(self):
+        # Stop the background map renderer
+        if self.root.render_worker is not None:
+            self.root.render_worker.stop()
 
 # Run the application
 if __name__ == "__main__":
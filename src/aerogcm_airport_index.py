@@ -0,0 +1,251 @@
+""""
+AeroGCM - A Application to visualize and analyze flight routes
+    Copyright (C) 2025  MaxQ22
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+
+#Import numpy for the columnar storage of the airport data
+import numpy as np
+
+#Import airportsdata as the source of the airport table
+import airportsdata
+
+#Import all the global datastructures
+from aerogcm_datastructures import *
+
+#Import the unit vector conversion of the geometry engine
+from aerogcm_geometry import latlon_to_unit_vectors
+
+#Import the common cache directory
+from aerogcm_startup import aerogcm_cache_dir
+
+"""
+AirportIndex
+------------------
+This module provides one process-wide, columnar airport table shared by every AeroGCM component.
+Features:
+- ICAO and IATA code to row lookup tables
+- float64 latitude/longitude arrays and precomputed ECEF unit vectors
+- Interned text columns (name, city, subdivision, country, timezone, FAA LID) stored as id arrays into a value table
+- A versioned binary cache of .npy files, loaded memory-mapped and rebuilt only when airportsdata changes
+"""
+
+# Version of the on-disk cache layout. Increase it whenever the stored columns change.
+AIRPORT_INDEX_FORMAT_VERSION = 1
+
+# Text columns of airportsdata, that are stored interned
+TEXT_COLUMNS = ('name', 'city', 'subd', 'country', 'tz', 'lid')
+
+# Numeric and code columns, that are stored as plain arrays
+ARRAY_COLUMNS = ('icao', 'iata', 'lat', 'lon', 'elevation', 'unit_vectors')
+
+def _intern_column(values):
+    """
+    Intern a list of strings into a value table and an int32 id array.
+    Returns (ids, values) so that values[ids[row]] is the string of each row.
+    """
+    table = {}
+    ids = np.empty(len(values), dtype=np.int32)
+    for row, value in enumerate(values):
+        ids[row] = table.setdefault(value, len(table))
+    return ids, np.array(list(table), dtype=str)
+
+class AirportIndex:
+    def __init__(self, columns, version=None):
+        """
+        Create the index from a dict of column arrays.
+        Use AirportIndex.build() or get_airport_index() instead of calling this directly.
+        """
+        self.version = version
+        self.icao = columns['icao']
+        self.iata = columns['iata']
+        self.lat = columns['lat']
+        self.lon = columns['lon']
+        self.elevation = columns['elevation']
+        self.unit_vectors = columns['unit_vectors']
+
+        # Interned text columns: <column>_ids holds the row ids, <column>_values the unique strings
+        for column in TEXT_COLUMNS:
+            setattr(self, column + '_ids', columns[column + '_ids'])
+            setattr(self, column + '_values', columns[column + '_values'])
+
+        # Code to row lookup tables. For duplicate IATA codes the last row wins, like in airportsdata.
+        self.icao_rows = dict(zip(self.icao.tolist(), range(len(self.icao))))
+        self.iata_rows = {code: row for row, code in enumerate(self.iata.tolist()) if code}
+
+    def __len__(self):
+        return len(self.icao)
+
+    @classmethod
+    def build(cls):
+        """
+        Build the index from the airport table bundled with airportsdata.
+        """
+        airports = list(airportsdata.load('ICAO').values())
+        columns = {
+            'icao': np.array([airport['icao'] for airport in airports], dtype='<U4'),
+            'iata': np.array([airport['iata'] for airport in airports], dtype='<U3'),
+            'lat': np.array([airport['lat'] for airport in airports], dtype=np.float64),
+            'lon': np.array([airport['lon'] for airport in airports], dtype=np.float64),
+            'elevation': np.array([airport['elevation'] for airport in airports], dtype=np.float64),
+        }
+        columns['unit_vectors'] = latlon_to_unit_vectors(columns['lat'], columns['lon'])
+        for column in TEXT_COLUMNS:
+            ids, values = _intern_column([airport[column] for airport in airports])
+            columns[column + '_ids'] = ids
+            columns[column + '_values'] = values
+        return cls(columns, airportsdata.__version__)
+
+    @staticmethod
+    def cache_path(cache_dir=None):
+        """
+        Returns the cache directory of the index for the installed airportsdata version.
+        """
+        if cache_dir is None:
+            cache_dir = aerogcm_cache_dir()
+        name = f"airport_index_v{AIRPORT_INDEX_FORMAT_VERSION}_{airportsdata.__version__}"
+        return os.path.join(cache_dir, name)
+
+    @staticmethod
+    def column_names():
+        """
+        Returns the names of all arrays stored in the cache.
+        """
+        names = list(ARRAY_COLUMNS)
+        for column in TEXT_COLUMNS:
+            names += [column + '_ids', column + '_values']
+        return names
+
+    def save(self, cache_dir=None):
+        """
+        Write the index to its versioned cache directory.
+        The files are written to a temporary directory first and moved in place, so a crashed
+        or concurrent writer never leaves a half written cache behind.
+        """
+        path = self.cache_path(cache_dir)
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        temp_path = tempfile.mkdtemp(prefix='.airport_index_', dir=parent)
+        try:
+            for name in self.column_names():
+                np.save(os.path.join(temp_path, name + '.npy'), np.ascontiguousarray(getattr(self, name)))
+            with open(os.path.join(temp_path, 'meta.json'), 'w') as file:
+                json.dump({'format': AIRPORT_INDEX_FORMAT_VERSION, 'airportsdata': airportsdata.__version__,
+                           'rows': len(self)}, file)
+            os.replace(temp_path, path)
+        except OSError:
+            # Another process may have written the cache in the meantime
+            shutil.rmtree(temp_path, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+
+    @classmethod
+    def load(cls, cache_dir=None):
+        """
+        Load the index memory-mapped from its cache directory.
+        Returns None, if there is no valid cache for the installed airportsdata version.
+        """
+        path = cls.cache_path(cache_dir)
+        try:
+            with open(os.path.join(path, 'meta.json')) as file:
+                meta = json.load(file)
+            if meta.get('format') != AIRPORT_INDEX_FORMAT_VERSION or meta.get('airportsdata') != airportsdata.__version__:
+                return None
+            columns = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+                       for name in cls.column_names()}
+        except (OSError, ValueError):
+            return None
+        if any(len(columns[name]) != meta.get('rows') for name in ARRAY_COLUMNS):
+            return None
+        return cls(columns, meta['airportsdata'])
+
+    def find(self, code):
+        """
+        Returns the row of an ICAO or IATA code, or None if the code is unknown.
+        ICAO codes take precedence over IATA codes.
+        """
+        code = code.strip().upper()
+        row = self.icao_rows.get(code)
+        if row is None:
+            row = self.iata_rows.get(code)
+        return row
+
+    def find_many(self, codes):
+        """
+        Returns an int64 array with the row of every code, or -1 for unknown codes.
+        """
+        return np.fromiter((-1 if row is None else row for row in map(self.find, codes)),
+                           dtype=np.int64, count=len(codes))
+
+    def coordinate(self, row):
+        """
+        Returns a Coordinate object for the airport in the given row.
+        """
+        return Coordinate(float(self.lat[row]), float(self.lon[row]))
+
+    def text(self, column, row):
+        """
+        Returns the value of an interned text column (e.g. 'city') for the given row.
+        """
+        return str(getattr(self, column + '_values')[getattr(self, column + '_ids')[row]])
+
+    def record(self, row):
+        """
+        Returns the airport in the given row as a dict with the keys used by airportsdata.
+        """
+        record = {'icao': str(self.icao[row]), 'iata': str(self.iata[row]),
+                  'elevation': float(self.elevation[row]),
+                  'lat': float(self.lat[row]), 'lon': float(self.lon[row])}
+        for column in TEXT_COLUMNS:
+            record[column] = self.text(column, row)
+        return record
+
+    def rows_matching(self, column, phrase):
+        """
+        Returns the rows (in table order) whose interned text column contains the lower case phrase.
+        Only the unique values are scanned, not every airport.
+        """
+        values = getattr(self, column + '_values')
+        matching = [i for i, value in enumerate(values.tolist()) if phrase in value.lower()]
+        return np.flatnonzero(np.isin(getattr(self, column + '_ids'), matching))
+
+# Process-wide airport index, created on first use
+_airport_index = None
+_airport_index_lock = threading.Lock()
+
+def get_airport_index():
+    """
+    Returns the process-wide AirportIndex.
+    On the first call the cache is loaded, or built and written if it is missing or outdated.
+    """
+    global _airport_index
+    if _airport_index is None:
+        with _airport_index_lock:
+            if _airport_index is None:
+                index = AirportIndex.load()
+                if index is None:
+                    index = AirportIndex.build()
+                    try:
+                        index.save()
+                    except OSError as e:
+                        print(f"Could not write the airport index cache: {e}")
+                _airport_index = index
+    return _airport_index
@@ -0,0 +1,233 @@
+""""
+AeroGCM - A Application to visualize and analyze flight routes
+    Copyright (C) 2025  MaxQ22
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import sys
+import csv
+import json
+import argparse
+import itertools
+import multiprocessing
+
+# Import the shared airport index, so the cache exists before any worker process starts
+from aerogcm_airport_index import get_airport_index
+
+# Import the input parser that parses the route strings and calculates the distances
+from aerogcm_input_parser import AirportInputParser, DISTANCE_MODELS
+
+"""
+AeroGCM Command Line Interface
+------------------
+This module provides a headless distance engine, that does not need Kivy, matplotlib or Basemap.
+Features:
+- Streams route strings in the AeroGCM syntax (e.g. KLAX-KATL/KORD-KEWR) from files or stdin, one input per line
+- Computes the distances in worker processes, which all memory-map the same read-only airport index cache
+- Writes the results incrementally as CSV or JSON lines
+
+Usage:
+    python ./src/aerogcm_cli.py routes.txt --format jsonl --workers 8 --model ellipsoidal
+"""
+
+# Number of input lines sent to a worker process at once
+DEFAULT_CHUNK_SIZE = 1000
+
+# Number of expanded routes a worker evaluates in one vectorized call, this bounds the memory of the expanded routes
+ROUTE_FLUSH_SIZE = 50000
+
+# Output columns of the distance results
+OUTPUT_FIELDS = ['line', 'route', 'distance_km', 'distance_nm']
+
+# Parser of the current worker process, created once by the pool initializer
+_worker_parser = None
+_worker_options = None
+
+def _init_worker(options):
+    """
+    Initialize a worker process. The airport index is loaded memory-mapped from the shared cache.
+    """
+    global _worker_parser, _worker_options
+    _worker_parser = AirportInputParser()
+    _worker_options = options
+
+def _process_chunk(chunk):
+    """
+    Calculate the distances of a chunk of (line number, input text) tuples in a worker process.
+    Returns the result rows and the diagnostics of the chunk.
+    """
+    rows = []
+    diagnostics = []
+    mode, k, max_routes, model = _worker_options
+    if max_routes is None:
+        max_routes = _worker_parser.max_expanded_routes
+
+    # Expand the routes of the lines and evaluate them in vectorized calls of up to ROUTE_FLUSH_SIZE routes
+    route_lines = []
+    route_labels = []
+    route_rows = []
+
+    def flush_routes():
+        distances = _worker_parser.route_distance_array(route_rows, model).tolist()
+        for line_number, route_label, distance in zip(route_lines, route_labels, distances):
+            if distance == distance:  # Skip routes with missing airport info (NaN)
+                rows.append((line_number, route_label, distance, distance * 0.539957))
+        route_lines.clear()
+        route_labels.clear()
+        route_rows.clear()
+
+    for line_number, text in chunk:
+        compiled = _worker_parser.compile_input(text)
+        if mode == 'all':
+            routes = _worker_parser.iter_expanded_routes(compiled)
+            for route_label, rows_of_route in itertools.islice(routes, max_routes):
+                route_lines.append(line_number)
+                route_labels.append(route_label)
+                route_rows.append(rows_of_route)
+                if len(route_rows) >= ROUTE_FLUSH_SIZE:
+                    flush_routes()
+            if next(routes, None) is not None:
+                diagnostics.append((line_number, f"Route expansion stopped after the maximum number of routes: {max_routes}"))
+        else:
+            for result in _worker_parser.best_route_distances(compiled, mode, k, model):
+                rows.append((line_number, result.route, result.distancekm, result.distancenm))
+        diagnostics.extend((line_number, str(diagnostic)) for diagnostic in compiled.diagnostics)
+
+    if route_rows:
+        flush_routes()
+    return rows, diagnostics
+
+def read_inputs(paths):
+    """
+    Lazily yield (line number, input text) tuples from the given files, or from stdin if no file is given.
+    Empty lines and lines starting with '#' are skipped. Line numbers count across all files.
+    """
+    line_number = 0
+    for path in paths or ['-']:
+        file = sys.stdin if path == '-' else open(path, 'r')
+        try:
+            for line in file:
+                line_number += 1
+                text = line.strip()
+                if text and not text.startswith('#'):
+                    yield line_number, text
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+def chunked(iterable, size):
+    """
+    Split an iterable lazily into lists of at most `size` items.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+class ResultWriter:
+    """
+    Writes distance results incrementally as CSV or JSON lines.
+    """
+    def __init__(self, output, output_format):
+        self.output = output
+        self.output_format = output_format
+        if output_format == 'csv':
+            self.csv_writer = csv.writer(output)
+            self.csv_writer.writerow(OUTPUT_FIELDS)
+
+    def write_rows(self, rows):
+        if self.output_format == 'csv':
+            self.csv_writer.writerows((line, route, f"{km:.3f}", f"{nm:.3f}") for line, route, km, nm in rows)
+        else:
+            for row in rows:
+                self.output.write(json.dumps(dict(zip(OUTPUT_FIELDS, row))) + '\n')
+        self.output.flush()
+
+def run(paths, output, output_format='csv', workers=1, chunk_size=DEFAULT_CHUNK_SIZE,
+        mode='all', k=1, max_routes=None, model='spherical', diagnostics_output=None):
+    """
+    Stream the inputs of the given files through the distance engine and write the results to `output`.
+    With more than one worker the chunks are processed in a process pool, the output keeps the input order.
+    Returns the number of written result rows.
+    """
+    # Make sure the airport index cache is written before the workers start, so they all map the same files
+    get_airport_index()
+
+    options = (mode, k, max_routes, model)
+    writer = ResultWriter(output, output_format)
+    chunks = chunked(read_inputs(paths), chunk_size)
+    written = 0
+
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(options,))
+        try:
+            results = pool.imap(_process_chunk, chunks)
+            for rows, diagnostics in results:
+                writer.write_rows(rows)
+                written += len(rows)
+                _write_diagnostics(diagnostics, diagnostics_output)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        _init_worker(options)
+        for chunk in chunks:
+            rows, diagnostics = _process_chunk(chunk)
+            writer.write_rows(rows)
+            written += len(rows)
+            _write_diagnostics(diagnostics, diagnostics_output)
+
+    return written
+
+def _write_diagnostics(diagnostics, diagnostics_output):
+    if diagnostics_output is not None:
+        for line_number, diagnostic in diagnostics:
+            diagnostics_output.write(f"line {line_number}: {diagnostic}\n")
+
+def main(argv=None):
+    """
+    Command line entry point of the headless distance engine.
+    """
+    argument_parser = argparse.ArgumentParser(description="Calculate AeroGCM route distances without the GUI.")
+    argument_parser.add_argument('inputs', nargs='*', help="Files with one route input per line (default: stdin, '-' for stdin)")
+    argument_parser.add_argument('-o', '--output', help="Output file (default: stdout)")
+    argument_parser.add_argument('-f', '--format', choices=['csv', 'jsonl'], default='csv', help="Output format")
+    argument_parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    argument_parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Input lines per worker task")
+    argument_parser.add_argument('--mode', choices=['all', 'shortest', 'longest'], default='all',
+                                 help="Expand all '/' alternatives, or select the shortest/longest routes")
+    argument_parser.add_argument('-k', type=int, default=1, help="Number of routes per input for the shortest/longest mode")
+    argument_parser.add_argument('--max-routes', type=int, default=None, help="Maximum expanded routes per input line")
+    argument_parser.add_argument('--model', choices=DISTANCE_MODELS, default='spherical', help="Distance model")
+    argument_parser.add_argument('--diagnostics', action='store_true', help="Report invalid tokens on stderr")
+    args = argument_parser.parse_args(argv)
+    if args.k < 1:
+        argument_parser.error(f"argument -k: must be at least 1, got {args.k}")
+
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        run(args.inputs, output, args.format, max(1, args.workers), max(1, args.chunk_size),
+            args.mode, args.k, args.max_routes, args.model,
+            sys.stderr if args.diagnostics else None)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+# Run the command line interface
+if __name__ == "__main__":
+    main()
@@ -34,12 +34,13 @@ class AirportPair:
 
 #Object to represent a distance ring
 class DistanceRing:
-    def __init__(self,start_code,startcoord , distance, linestyle='line', color=(19.6/100, 64.3/100,80.8/100,1)):
+    def __init__(self,start_code,startcoord , distance, linestyle='line', color=(19.6/100, 64.3/100,80.8/100,1), enclosed_rows=None):
         self.start_code = start_code
         self.startcoord = startcoord
         self.linestyle = linestyle
         self.color = color
         self.distance = distance
+        self.enclosed_rows = enclosed_rows  # Airport index rows of the airports inside the ring, if they are highlighted
 
 #Object to represent a flight route distance
 class FlightRouteDistance:
@@ -48,3 +49,33 @@ class FlightRouteDistance:
         self.distancekm = distance
         self.distancenm = distance * 0.539957
 
+
+#Object to represent a problem found while parsing a single input token
+class ParseDiagnostic:
+    def __init__(self, token, message):
+        self.token = token
+        self.message = message
+
+    def __str__(self):
+        return f"{self.message}: {self.token}"
+
+#Object to represent one compiled comma separated input token (color directive, distance ring or route chain)
+class CompiledToken:
+    def __init__(self, text, kind, color=None, ring_code=None, ring_row=None, distance=None, stages=None, diagnostics=None,
+                 enclosed_rows=None):
+        self.text = text
+        self.kind = kind  # 'color', 'ring', 'route', 'empty' or 'invalid'
+        self.color = color
+        self.ring_code = ring_code
+        self.ring_row = ring_row
+        self.distance = distance
+        self.enclosed_rows = enclosed_rows  # Rows of the airports inside a ring token ending with '+', nearest first
+        self.stages = stages if stages is not None else []  # List of stages, each a list of (code, airport index row)
+        self.diagnostics = diagnostics if diagnostics is not None else []
+        self.route_distances = {}  # (Distance model, route limit) -> (list of FlightRouteDistance, truncated), filled on demand
+
+#Object to represent the compiled input, from which the plot data and the route distances are derived
+class CompiledInput:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.diagnostics = [diagnostic for token in tokens for diagnostic in token.diagnostics]
@@ -0,0 +1,413 @@
+""""
+AeroGCM - A Application to visualize and analyze flight routes
+    Copyright (C) 2025  MaxQ22
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import csv
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+#Import the common data directory
+from aerogcm_startup import aerogcm_data_dir
+
+"""
+FlightStore
+------------------
+This module provides the flight log database, an embedded SQLite database.
+By default it lives in memory for the session. When the environment variable AEROGCM_FLIGHT_STORE is set,
+it is stored in the file flight_log.sqlite3 of the AeroGCM data directory and kept between sessions.
+Features:
+- Every flight has a stable row id, that stays valid when other flights are added, edited or removed
+- One column per flight field, departure and arrival times are also stored as sortable UTC timestamps
+- Every sortable column is indexed, so a page of the log in any column order is one index range scan
+- A trigram full text index finds the flights containing a filter phrase without scanning the log
+- Every add, edit and remove is its own small transaction, no file is rewritten as a whole
+- CSV import (in one transaction) and export, in the column order of the flight logger
+- The schema version is checked on open, older schemas are migrated, a file of an unknown schema version is not modified
+- If the database file cannot be opened, the log falls back to an in-memory database for the session
+"""
+
+# File name of the flight log database in the data directory
+FLIGHT_STORE_FILE = 'flight_log.sqlite3'
+
+# Version of the database schema, stored as the SQLite user_version
+FLIGHT_STORE_SCHEMA_VERSION = 2
+
+# Database columns of a flight, in the order of the flight logger fields and the CSV columns
+FLIGHT_COLUMNS = ('departure_time', 'arrival_time', 'airline', 'callsign', 'aircraft_type',
+                  'registration', 'origin', 'destination')
+
+# Time columns, which are also stored as timestamps (seconds since 1970 UTC) in the column of the value
+TIMESTAMP_COLUMNS = {'departure_time': 'departure_timestamp', 'arrival_time': 'arrival_timestamp'}
+
+# Database columns, by which the flights of a page are ordered, for every sortable flight column.
+# The flight id is appended to every order, so equal values keep the logged order.
+SORT_ORDERS = {
+    'departure_time': ('departure_timestamp', 'departure_time'),
+    'arrival_time': ('arrival_timestamp', 'arrival_time'),
+    'airline': ('airline',),
+    'callsign': ('callsign',),
+    'aircraft_type': ('aircraft_type',),
+    'registration': ('registration',),
+    'origin': ('origin', 'destination'),
+    'destination': ('destination',),
+}
+
+# Number of flights shown on one page of the flight logger
+FLIGHT_PAGE_SIZE = 100
+
+# Up to this number, the flights matching a filter phrase are counted exactly and sorted after the text search.
+# Beyond it, the page is read in index order and every flight is tested for the phrase, which finds a page of a
+# common phrase sooner than sorting all matches.
+SEARCH_COUNT_LIMIT = 5000
+
+# Number of CSV rows inserted per executemany call during an import
+CSV_IMPORT_BATCH = 10000
+
+# The fields of a flight joined into one text, which the filter phrase is searched in
+SEARCH_TEXT = " || char(10) || ".join(f"{{row}}.{column}" for column in FLIGHT_COLUMNS)
+
+FLIGHT_TABLE = """
+CREATE TABLE IF NOT EXISTS flights (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    departure_time TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    departure_timestamp INTEGER,
+    arrival_time TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    arrival_timestamp INTEGER,
+    airline TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    callsign TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    aircraft_type TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    registration TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    origin TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    destination TEXT NOT NULL DEFAULT '' COLLATE NOCASE
+)"""
+
+# Indexes of the flights table, one for every sort order
+FLIGHT_INDEXES = tuple(
+    f"CREATE INDEX IF NOT EXISTS flights_{columns[0].replace('_timestamp', '_time')} ON flights ({', '.join(columns)})"
+    for columns in SORT_ORDERS.values())
+
+# Trigram full text index of the search texts, and the triggers keeping it in sync with the flights table
+SEARCH_TABLE = "CREATE VIRTUAL TABLE IF NOT EXISTS flights_search USING fts5(text, tokenize='trigram', detail='none', columnsize=0)"
+SEARCH_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS flights_search_insert AFTER INSERT ON flights BEGIN
+        INSERT INTO flights_search (rowid, text) VALUES (new.id, {SEARCH_TEXT.format(row='new')}); END""",
+    f"""CREATE TRIGGER IF NOT EXISTS flights_search_update AFTER UPDATE ON flights BEGIN
+        UPDATE flights_search SET text = {SEARCH_TEXT.format(row='new')} WHERE rowid = new.id; END""",
+    """CREATE TRIGGER IF NOT EXISTS flights_search_delete AFTER DELETE ON flights BEGIN
+        DELETE FROM flights_search WHERE rowid = old.id; END""",
+)
+
+def parse_timestamp(text):
+    """
+    Returns the seconds since 1970 (UTC) of an ISO 8601 date or time (e.g. 2025-03-01T14:05 or 2025-03-01 14:05+01:00),
+    or None if the text is not one. Times without a time zone are taken as UTC.
+    """
+    try:
+        time = datetime.fromisoformat(str(text).strip())
+    except ValueError:
+        return None
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)
+    return int(time.timestamp())
+
+def flight_row(fields):
+    """
+    Returns the fields of a flight (e.g. a CSV row) as a tuple of exactly one string per column.
+    Missing fields are empty, surplus fields are dropped.
+    """
+    fields = [str(field) for field in fields[:len(FLIGHT_COLUMNS)]]
+    return tuple(fields + [''] * (len(FLIGHT_COLUMNS) - len(fields)))
+
+def _stored_row(fields):
+    # The flight columns followed by the timestamp columns, in the order of STORED_COLUMNS
+    row = flight_row(fields)
+    return row + tuple(parse_timestamp(row[FLIGHT_COLUMNS.index(column)]) for column in TIMESTAMP_COLUMNS)
+
+# Columns written by an insert or update, in the order of _stored_row
+STORED_COLUMNS = FLIGHT_COLUMNS + tuple(TIMESTAMP_COLUMNS.values())
+
+def _like_pattern(phrase):
+    # LIKE pattern finding the phrase anywhere, and whether it needs an ESCAPE clause for a literal % or _
+    escaped = phrase.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%", escaped != phrase
+
+def _migrate_v1(connection):
+    """
+    Schema 1 stored the fields as case sensitive text with four indexes. The table is rebuilt with the
+    case insensitive columns, the timestamps, the indexes of all sort orders and the text search.
+    """
+    sequence = connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'flights'").fetchone()
+    for (name,) in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'flights' AND sql IS NOT NULL").fetchall():
+        connection.execute(f'DROP INDEX "{name}"')
+    connection.execute("ALTER TABLE flights RENAME TO flights_v1")
+    connection.execute(FLIGHT_TABLE)
+    connection.execute(f"INSERT INTO flights (id, {', '.join(STORED_COLUMNS)}) "
+                       f"SELECT id, {', '.join(FLIGHT_COLUMNS)}, "
+                       f"{', '.join(f'aerogcm_timestamp({column})' for column in TIMESTAMP_COLUMNS)} FROM flights_v1")
+    connection.execute("DROP TABLE flights_v1")
+    if sequence is not None:
+        # Ids of removed flights are not given again
+        connection.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'flights'", (sequence[0],))
+
+# Migrations, that update a database from the schema version of the key to the next version
+FLIGHT_STORE_MIGRATIONS = {1: _migrate_v1}
+
+class FlightStore:
+    def __init__(self, path=None):
+        """
+        Open (and create) the flight log database at the given path (default: the data directory).
+        Use ':memory:' for a database, that only lives as long as the store.
+        Use get_flight_store() to share one store in the process.
+        """
+        if path is None:
+            path = os.path.join(aerogcm_data_dir(), FLIGHT_STORE_FILE)
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        # Transactions are started explicitly, so schema changes are part of them, too
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.create_function('aerogcm_timestamp', 1, parse_timestamp, deterministic=True)
+        # Without the FTS5 trigram tokenizer in the SQLite library, a filter phrase is searched by scanning the flights
+        self.searchable = True
+        try:
+            self._open_schema()
+        except sqlite3.Error:
+            self.connection.close()
+            raise
+        if path != ':memory:':
+            # The write-ahead log makes the small transactions of single edits cheap
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+
+    @contextmanager
+    def _transaction(self):
+        self.connection.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def _open_schema(self):
+        """
+        Create the schema of a new database, or migrate the schema of an older one.
+        Raises sqlite3.DatabaseError for a database of an unknown (e.g. newer) schema version, which is left unchanged.
+        """
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        has_flights = self.connection.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'flights'").fetchone()[0] > 0
+        if version == FLIGHT_STORE_SCHEMA_VERSION:
+            self.searchable = self.connection.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE name = 'flights_search'").fetchone()[0] > 0
+            return
+        if version == 0 and not has_flights:
+            with self._transaction():
+                self.connection.execute(FLIGHT_TABLE)
+                self._create_indexes()
+                self.connection.execute(f"PRAGMA user_version = {FLIGHT_STORE_SCHEMA_VERSION}")
+            return
+        if version == 0 or version > FLIGHT_STORE_SCHEMA_VERSION or any(
+                step not in FLIGHT_STORE_MIGRATIONS for step in range(version, FLIGHT_STORE_SCHEMA_VERSION)):
+            raise sqlite3.DatabaseError(f"Unsupported flight log schema version {version} "
+                                        f"(supported: {FLIGHT_STORE_SCHEMA_VERSION}) in {self.path}")
+        with self._transaction():
+            for step in range(version, FLIGHT_STORE_SCHEMA_VERSION):
+                FLIGHT_STORE_MIGRATIONS[step](self.connection)
+            self._create_indexes()
+            self.connection.execute(f"PRAGMA user_version = {FLIGHT_STORE_SCHEMA_VERSION}")
+
+    def _create_indexes(self):
+        """
+        Create the sort indexes and the text search of the flights table, the text search is filled from the table.
+        """
+        for statement in FLIGHT_INDEXES:
+            self.connection.execute(statement)
+        try:
+            self.connection.execute(SEARCH_TABLE)
+        except sqlite3.OperationalError:
+            self.searchable = False
+            return
+        self.connection.execute("DELETE FROM flights_search")
+        self.connection.execute(f"INSERT INTO flights_search (rowid, text) SELECT id, {SEARCH_TEXT.format(row='flights')} FROM flights")
+        for statement in SEARCH_TRIGGERS:
+            self.connection.execute(statement)
+
+    def _drop_indexes(self):
+        """
+        Drop the sort indexes and the triggers of the text search, before a bulk import.
+        """
+        for (kind, name) in self.connection.execute(
+                "SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = 'flights' "
+                "AND sql IS NOT NULL").fetchall():
+            self.connection.execute(f'DROP {kind.upper()} "{name}"')
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM flights").fetchone()[0]
+
+    def add(self, fields):
+        """
+        Add a flight and return its row id.
+        """
+        placeholders = ', '.join('?' * len(STORED_COLUMNS))
+        with self._transaction():
+            cursor = self.connection.execute(
+                f"INSERT INTO flights ({', '.join(STORED_COLUMNS)}) VALUES ({placeholders})", _stored_row(fields))
+        return cursor.lastrowid
+
+    def update(self, flight_id, fields):
+        """
+        Replace the fields of the flight with the given row id.
+        """
+        assignments = ', '.join(f"{column} = ?" for column in STORED_COLUMNS)
+        with self._transaction():
+            self.connection.execute(f"UPDATE flights SET {assignments} WHERE id = ?", _stored_row(fields) + (flight_id,))
+
+    def remove(self, flight_id):
+        """
+        Remove the flight with the given row id.
+        """
+        with self._transaction():
+            self.connection.execute("DELETE FROM flights WHERE id = ?", (flight_id,))
+
+    def get(self, flight_id):
+        """
+        Returns the fields of the flight with the given row id as a list, or None if there is no such flight.
+        """
+        row = self.connection.execute(f"SELECT {', '.join(FLIGHT_COLUMNS)} FROM flights WHERE id = ?",
+                                      (flight_id,)).fetchone()
+        return None if row is None else list(row)
+
+    def routes(self):
+        """
+        Returns the (origin, destination) tuples of all flights, in the logged order.
+        """
+        return self.connection.execute("SELECT origin, destination FROM flights ORDER BY id").fetchall()
+
+    def count(self, phrase=''):
+        """
+        Returns the number of flights containing the phrase (case insensitive, all flights for an empty phrase),
+        or None if more than SEARCH_COUNT_LIMIT flights contain it.
+        """
+        if not phrase:
+            return len(self)
+        pattern, escape = _like_pattern(phrase)
+        search = "flights_search WHERE text" if self.searchable else f"flights WHERE ({SEARCH_TEXT.format(row='flights')})"
+        count = self.connection.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM {search} LIKE ?" + (" ESCAPE '\\'" if escape else "")
+            + " LIMIT ?)", (pattern, SEARCH_COUNT_LIMIT + 1)).fetchone()[0]
+        return None if count > SEARCH_COUNT_LIMIT else count
+
+    def page(self, phrase='', order_by=None, descending=False, offset=0, limit=FLIGHT_PAGE_SIZE, count=-1):
+        """
+        Returns the row ids and the fields (as lists) of one page of the flights containing the phrase,
+        ordered by the given flight column (default: the logged order), and the count of the matching flights
+        (see count(), pass it as count, if it is known already).
+        Every order is read from its index, the phrase is found with the text search, so a page takes
+        milliseconds also for logs of hundreds of thousands of flights.
+        """
+        if order_by is not None and order_by not in SORT_ORDERS:
+            raise ValueError(f"Unknown flight column: {order_by}")
+        if count == -1:
+            count = self.count(phrase)
+        direction = " DESC" if descending else ""
+        order = [f"{column}{direction}" for column in SORT_ORDERS.get(order_by, ())] + [f"id{direction}"]
+        query = f"SELECT id, {', '.join(FLIGHT_COLUMNS)} FROM flights"
+        parameters = []
+        if phrase:
+            pattern, escape = _like_pattern(phrase)
+            escape_clause = " ESCAPE '\\'" if escape else ""
+            if count is not None and self.searchable:
+                # Few matches: they are looked up in the text search and sorted
+                query += f" WHERE id IN (SELECT rowid FROM flights_search WHERE text LIKE ?{escape_clause})"
+            else:
+                # Many matches: the flights are read in index order until the page is full
+                query += f" WHERE ({SEARCH_TEXT.format(row='flights')}) LIKE ?{escape_clause}"
+            parameters.append(pattern)
+        query += f" ORDER BY {', '.join(order)} LIMIT ? OFFSET ?"
+        parameters += [int(limit), int(offset)]
+        rows = self.connection.execute(query, parameters).fetchall()
+        return [row[0] for row in rows], [list(row[1:]) for row in rows], count
+
+    def import_csv(self, file, replace=False):
+        """
+        Import the flights of a CSV file (path or open text file) in one transaction and return their number.
+        With replace, the imported flights replace the logged flights. The indexes and the text search are then
+        dropped during the import and built once at its end, which is much faster than updating them per row.
+        """
+        if isinstance(file, str):
+            with open(file, 'r', newline='') as csv_file:
+                return self.import_csv(csv_file, replace)
+        placeholders = ', '.join('?' * len(STORED_COLUMNS))
+        insert = f"INSERT INTO flights ({', '.join(STORED_COLUMNS)}) VALUES ({placeholders})"
+        count = 0
+        with self._transaction():
+            if replace:
+                self._drop_indexes()
+                self.connection.execute("DELETE FROM flights")
+            batch = []
+            for fields in csv.reader(file):
+                if not any(field.strip() for field in fields):
+                    continue
+                batch.append(_stored_row(fields))
+                if len(batch) >= CSV_IMPORT_BATCH:
+                    self.connection.executemany(insert, batch)
+                    count += len(batch)
+                    batch = []
+            self.connection.executemany(insert, batch)
+            count += len(batch)
+            if replace:
+                self._create_indexes()
+        return count
+
+    def export_csv(self, file):
+        """
+        Write all flights to a CSV file (path or open text file), in the logged order.
+        """
+        if isinstance(file, str):
+            with open(file, 'w', newline='') as csv_file:
+                return self.export_csv(csv_file)
+        writer = csv.writer(file)
+        writer.writerows(self.connection.execute(f"SELECT {', '.join(FLIGHT_COLUMNS)} FROM flights ORDER BY id"))
+
+# Process-wide flight store, opened on first use
+_flight_store = None
+_flight_store_lock = threading.Lock()
+
+def get_flight_store():
+    """
+    Returns the process-wide FlightStore. It is kept in memory for the session, unless the environment
+    variable AEROGCM_FLIGHT_STORE is set, then it is stored in the data directory.
+    If the database file cannot be opened, an in-memory store is used, so the flight logger still works for the session.
+    """
+    global _flight_store
+    if _flight_store is None:
+        with _flight_store_lock:
+            if _flight_store is None:
+                try:
+                    _flight_store = FlightStore(None if os.environ.get('AEROGCM_FLIGHT_STORE') else ':memory:')
+                except (OSError, sqlite3.Error) as error:
+                    print(f"Error: The flight log database could not be opened ({error}), the flight log is not saved.")
+                    _flight_store = FlightStore(':memory:')
+    return _flight_store
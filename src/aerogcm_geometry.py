@@ -0,0 +1,596 @@
+""""
+AeroGCM - A Application to visualize and analyze flight routes
+    Copyright (C) 2025  MaxQ22
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections import OrderedDict
+
+#Import numpy for the vectorized geometry
+import numpy as np
+
+"""
+AeroGCM Geometry
+------------------
+This module contains the vectorized geometry engine of AeroGCM.
+All functions work on whole lists of legs at once and return 2-D NumPy arrays
+with one row per leg and one column per sample point, so no Python loop runs per point.
+"""
+
+# Tolerance below which two points are treated as identical or antipodal
+DEGENERATE_EPSILON = 1e-12
+
+# Mean radius of the Earth in km, used for all spherical distances
+EARTH_RADIUS_KM = 6371.0
+
+# WGS84 ellipsoid, used for all ellipsoidal (geodesic) calculations
+WGS84_A = 6378.137  # Semi-major axis in km
+WGS84_F = 1 / 298.257223563  # Flattening
+WGS84_B = WGS84_A * (1 - WGS84_F)  # Semi-minor axis in km
+
+# Number of points used for each distance ring
+RING_POINTS = 360
+
+# Maximum memory in bytes of the arrays kept in the ring geometry cache
+RING_CACHE_BYTES = 16 * 1024 * 1024
+
+# Maximum memory in bytes of the arrays kept in a geometry cache
+GEOMETRY_CACHE_BYTES = 64 * 1024 * 1024
+
+# Limits of the number of points of adaptively sampled great circles and rings
+MIN_ADAPTIVE_POINTS = 4
+MAX_ADAPTIVE_POINTS = 1000
+MIN_RING_POINTS = 16
+
+# Highest latitude in degrees used to estimate the stretching of the map projection, routes over the poles are limited to it
+MAX_STRETCH_LATITUDE = 80.0
+
+def latlon_to_unit_vectors(lats, lons):
+    """
+    Convert latitudes and longitudes in degrees into ECEF unit vectors on the unit sphere.
+    Returns an array of shape (..., 3).
+    """
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)), axis=-1)
+
+def unit_vectors_to_latlon(vectors):
+    """
+    Convert ECEF unit vectors of shape (..., 3) back to latitudes and longitudes in degrees.
+    Returns two arrays with the leading shape of the input.
+    """
+    x = vectors[..., 0]
+    y = vectors[..., 1]
+    z = vectors[..., 2]
+    lats = np.degrees(np.arctan2(z, np.hypot(x, y)))
+    lons = np.degrees(np.arctan2(y, x))
+    return lats, lons
+
+def pairs_to_endpoint_arrays(parsed_pairs):
+    """
+    Collect the start and end coordinates of a list of AirportPair objects into four float64 arrays
+    (start latitudes, start longitudes, end latitudes, end longitudes).
+    """
+    count = len(parsed_pairs)
+    coords = np.empty((4, count), dtype=np.float64)
+    for i, pair in enumerate(parsed_pairs):
+        coords[0, i] = pair.startcoord.lat
+        coords[1, i] = pair.startcoord.lon
+        coords[2, i] = pair.endcoord.lat
+        coords[3, i] = pair.endcoord.lon
+    return coords[0], coords[1], coords[2], coords[3]
+
+def great_circle_frames(start_vectors, end_vectors):
+    """
+    Compute the angular length and the unit tangent direction at the start point for every leg.
+    Degenerate legs are handled without any division by zero:
+    - Identical start and end points get a zero length and a zero tangent.
+    - Antipodal points have no unique great circle, so the route via the north direction
+      of the start point is used (or via the 0 meridian, if the start point is a pole).
+    Returns the angular lengths in radians (shape (legs,)) and the tangents (shape (legs, 3)).
+    """
+    dot = np.clip(np.einsum('ij,ij->i', start_vectors, end_vectors), -1.0, 1.0)
+    cross_norm = np.linalg.norm(np.cross(start_vectors, end_vectors), axis=1)
+    angles = np.arctan2(cross_norm, dot)
+
+    # The component of the end point perpendicular to the start point points along the great circle
+    tangents = end_vectors - start_vectors * dot[:, None]
+    norms = np.linalg.norm(tangents, axis=1)
+    regular = norms > DEGENERATE_EPSILON
+    tangents[regular] /= norms[regular, None]
+    tangents[~regular] = 0.0
+
+    # Antipodal legs: Pick the local north direction as the tangent
+    antipodal = ~regular & (dot < 0)
+    if np.any(antipodal):
+        points = start_vectors[antipodal]
+        north = np.zeros_like(points)
+        north[:, 2] = 1.0
+        north -= points * points[:, 2:3]
+        north_norms = np.linalg.norm(north, axis=1)
+        at_pole = north_norms <= DEGENERATE_EPSILON
+        north[at_pole] = (1.0, 0.0, 0.0)
+        north_norms[at_pole] = 1.0
+        tangents[antipodal] = north / north_norms[:, None]
+        angles[antipodal] = np.pi
+
+    return angles, tangents
+
+def sample_great_circle_arrays(start_lats, start_lons, end_lats, end_lons, num_points=100):
+    """
+    Sample `num_points` + 1 points along the great circle of every leg given as endpoint arrays.
+    Returns two arrays (latitudes, longitudes) in degrees with the shape (legs, num_points + 1).
+    """
+    start_vectors = latlon_to_unit_vectors(start_lats, start_lons)
+    end_vectors = latlon_to_unit_vectors(end_lats, end_lons)
+    angles, tangents = great_circle_frames(start_vectors, end_vectors)
+
+    # Angle travelled along each leg for every sample fraction
+    fractions = np.linspace(0.0, 1.0, num_points + 1)
+    travelled = angles[:, None] * fractions[None, :]
+
+    # Rotate the start point towards the tangent direction by the travelled angle
+    points = (start_vectors[:, None, :] * np.cos(travelled)[:, :, None]
+              + tangents[:, None, :] * np.sin(travelled)[:, :, None])
+    return unit_vectors_to_latlon(points)
+
+def sample_great_circles(parsed_pairs, num_points=100):
+    """
+    Sample the great circles of a list of AirportPair objects in one pass.
+    Returns two arrays (latitudes, longitudes) in degrees with the shape (legs, num_points + 1).
+    """
+    if not parsed_pairs:
+        empty = np.empty((0, num_points + 1), dtype=np.float64)
+        return empty, empty.copy()
+    return sample_great_circle_arrays(*pairs_to_endpoint_arrays(parsed_pairs), num_points=num_points)
+
+def chord_error_spacing(max_chord_error, pixels_per_radian):
+    """
+    Returns the angular spacing in radians between two sample points, for which the straight chord between them
+    deviates at most max_chord_error pixels from the arc. The deviation (sagitta) of an arc of d radians
+    with unit curvature is d**2 / 8.
+    """
+    return np.sqrt(8.0 * max_chord_error / pixels_per_radian)
+
+def projection_stretch(latitudes):
+    """
+    Estimate of how much a cylindrical map projection (like the Miller projection of the map) increases
+    the curvature of the routes at the given latitudes in degrees (1 at the equator).
+    """
+    latitudes = np.minimum(np.abs(latitudes), MAX_STRETCH_LATITUDE)
+    return 1.0 / np.cos(np.radians(latitudes))**2
+
+def sample_great_circle_adaptive(start_lats, start_lons, end_lats, end_lons, spacing,
+                                 min_points=MIN_ADAPTIVE_POINTS, max_points=MAX_ADAPTIVE_POINTS):
+    """
+    Sample every leg with a number of points, that depends on its angular length instead of a fixed number.
+    spacing is the angular distance in radians between two points at the equator (see chord_error_spacing).
+    Legs reaching higher latitudes are sampled denser, as the map projection stretches them there.
+    Returns the latitudes and longitudes of all points as flat arrays, and the number of points of every leg.
+    """
+    start_vectors = latlon_to_unit_vectors(start_lats, start_lons)
+    end_vectors = latlon_to_unit_vectors(end_lats, end_lons)
+    angles, tangents = great_circle_frames(start_vectors, end_vectors)
+
+    # The highest latitude of a great circle is reached at its vertex, 90 degrees from its pole
+    poles = np.cross(start_vectors, tangents)
+    vertex_lats = np.degrees(np.arccos(np.clip(np.abs(poles[:, 2]), 0.0, 1.0)))
+    leg_spacing = spacing / np.sqrt(projection_stretch(vertex_lats))
+
+    counts = np.clip(np.ceil(angles / leg_spacing), min_points, max_points).astype(np.int64)
+    lengths = counts + 1
+
+    # Leg and fraction of every point of the flat result
+    legs = np.repeat(np.arange(len(counts)), lengths)
+    first_points = np.cumsum(lengths) - lengths
+    fractions = (np.arange(lengths.sum()) - np.repeat(first_points, lengths)) / np.repeat(counts, lengths)
+
+    # Rotate the start point towards the tangent direction by the travelled angle
+    travelled = angles[legs] * fractions
+    points = (start_vectors[legs] * np.cos(travelled)[:, None] + tangents[legs] * np.sin(travelled)[:, None])
+    lats, lons = unit_vectors_to_latlon(points)
+    return lats, lons, lengths
+
+def ring_point_count(center_lats, distances_km, spacing, min_points=MIN_RING_POINTS, max_points=MAX_ADAPTIVE_POINTS):
+    """
+    Returns one number of points, that samples all given distance rings smooth enough for the spacing
+    (see chord_error_spacing). The number is rounded up to a multiple of 8, so similar views share cached rings.
+    """
+    if len(distances_km) == 0:
+        return min_points
+    radii = np.asarray(distances_km, dtype=np.float64) / EARTH_RADIUS_KM
+
+    # A ring of angular radius r has the curvature 1/sin(r) on the sphere, and reaches up to r beyond its center
+    stretch = projection_stretch(np.abs(np.asarray(center_lats, dtype=np.float64)) + np.degrees(radii))
+    bearing_spacing = spacing / np.sqrt(np.maximum(np.abs(np.sin(radii)), 1e-6) * stretch)
+    count = int(np.ceil(np.max(2 * np.pi / bearing_spacing)))
+    return int(np.clip(-(-count // 8) * 8, min_points, max_points))
+
+def great_circle_bounds(start_lats, start_lons, end_lats, end_lons):
+    """
+    Calculate the latitude range and the covered longitude arc of every leg analytically, without sampling.
+    The latitude range is spanned by the end points, and by the northern or southern vertex of the great circle,
+    if the vertex lies between them. Along a great circle the longitude changes monotonically, eastwards if the
+    pole of the leg lies in the northern hemisphere, so the leg covers the arc from its start to its end longitude
+    in that direction.
+    Returns four arrays (min_lats, max_lats, lon_starts, lon_widths) in degrees, with eastward lon_widths.
+    """
+    start_lats = np.asarray(start_lats, dtype=np.float64)
+    start_lons = np.asarray(start_lons, dtype=np.float64)
+    end_lats = np.asarray(end_lats, dtype=np.float64)
+    end_lons = np.asarray(end_lons, dtype=np.float64)
+    start_vectors = latlon_to_unit_vectors(start_lats, start_lons)
+    end_vectors = latlon_to_unit_vectors(end_lats, end_lons)
+    angles, tangents = great_circle_frames(start_vectors, end_vectors)
+    poles = np.cross(start_vectors, tangents)
+    regular = np.linalg.norm(poles, axis=1) > DEGENERATE_EPSILON
+
+    min_lats = np.minimum(start_lats, end_lats)
+    max_lats = np.maximum(start_lats, end_lats)
+
+    # The northern vertex is the projection of the north pole into the plane of the great circle,
+    # it lies on the leg, if it is reached before the end point, moving from the start along the tangent
+    vertex_lats = np.degrees(np.arccos(np.clip(np.abs(poles[:, 2]), 0.0, 1.0)))
+    north_vertices = -poles * poles[:, 2:3]
+    north_vertices[:, 2] += 1.0
+    vertex_angles = np.mod(np.arctan2(np.einsum('ij,ij->i', north_vertices, tangents),
+                                      np.einsum('ij,ij->i', north_vertices, start_vectors)), 2 * np.pi)
+    north_inside = regular & (vertex_angles <= angles)
+    south_inside = regular & (np.mod(vertex_angles + np.pi, 2 * np.pi) <= angles)
+    max_lats[north_inside] = vertex_lats[north_inside]
+    min_lats[south_inside] = -vertex_lats[south_inside]
+
+    eastwards = poles[:, 2] >= 0
+    lon_widths = np.where(eastwards, np.mod(end_lons - start_lons, 360.0), np.mod(start_lons - end_lons, 360.0))
+    lon_starts = np.where(eastwards, start_lons, end_lons)
+    return min_lats, max_lats, lon_starts, lon_widths
+
+def ring_bounds(center_lats, center_lons, ring_lats, ring_lons):
+    """
+    Calculate the latitude range and the covered longitude arc of every distance ring from its sampled points
+    (arrays of the shape (rings, points), as drawn with the WGS84 direct solver, eg. from generate_ring_arrays).
+    The ring center is always included, so a ring, that is so big that it does not encompass its airport
+    (eg. 14000km@LAX), still shows the airport. A ring around a pole covers all longitudes.
+    Returns four arrays (min_lats, max_lats, lon_starts, lon_widths) in degrees, like great_circle_bounds.
+    """
+    lats = np.asarray(center_lats, dtype=np.float64)
+    lons = np.asarray(center_lons, dtype=np.float64)
+    if len(lats) == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty, empty, empty
+    ring_lats = np.asarray(ring_lats, dtype=np.float64).reshape(len(lats), -1)
+    ring_lons = np.asarray(ring_lons, dtype=np.float64).reshape(len(lats), -1)
+
+    min_lats = np.minimum(ring_lats.min(axis=1), lats)
+    max_lats = np.maximum(ring_lats.max(axis=1), lats)
+
+    # Follow the ring points without longitude jumps. A closed ring around a pole winds once around the globe,
+    # so its unwrapped longitude ends 360 degrees away from its start.
+    unwrapped = np.unwrap(ring_lons, period=360.0, axis=1)
+    around_pole = np.abs(unwrapped[:, -1] - unwrapped[:, 0]) > 180.0
+
+    # Other rings cover the arc of their unwrapped longitudes, extended to the center moved next to the arc
+    arc_min = unwrapped.min(axis=1)
+    arc_max = unwrapped.max(axis=1)
+    center = lons + 360.0 * np.round(((arc_min + arc_max) / 2 - lons) / 360.0)
+    lon_starts = np.minimum(arc_min, center)
+    lon_widths = np.maximum(arc_max, center) - lon_starts
+    lon_widths = np.where(around_pole, 360.0, np.minimum(lon_widths, 360.0))
+    lon_starts = np.where(around_pole, lons - 180.0, lon_starts)
+    return min_lats, max_lats, lon_starts, lon_widths
+
+def minimal_longitude_range(lon_starts, lon_widths):
+    """
+    Returns the shortest longitude range (min_lon, max_lon), that covers all given eastward arcs.
+    The range may cross the antimeridian, then max_lon is greater than 180 (eg. (130, 245) for Tokyo to San Francisco).
+    The complement of the largest gap between the arcs is used. min_lon is always in [-180, 180).
+    """
+    starts = np.mod(np.asarray(lon_starts, dtype=np.float64) + 180.0, 360.0) - 180.0
+    widths = np.clip(np.asarray(lon_widths, dtype=np.float64), 0.0, 360.0)
+    if starts.size == 0 or widths.max() >= 360.0:
+        return -180.0, 180.0
+
+    # Sweep the arcs sorted by their start, the furthest reached longitude before every arc gives the gaps
+    order = np.argsort(starts)
+    starts = starts[order]
+    reached = np.maximum.accumulate(starts + widths[order])
+    gaps = starts[1:] - reached[:-1]
+    wrap_gap = starts[0] + 360.0 - reached[-1]
+
+    if gaps.size and gaps.max() > wrap_gap:
+        largest = int(np.argmax(gaps))
+        if gaps[largest] <= 0:
+            return -180.0, 180.0
+        min_lon, max_lon = starts[largest + 1], reached[largest] + 360.0
+    else:
+        if wrap_gap <= 0:
+            return -180.0, 180.0
+        min_lon, max_lon = starts[0], reached[-1]
+    return float(min_lon), float(max_lon)
+
+def wrap_longitudes(lons, center_lon):
+    """
+    Shift longitudes by multiples of 360 degrees into the range of +-180 degrees around center_lon.
+    """
+    return np.mod(np.asarray(lons, dtype=np.float64) - center_lon + 180.0, 360.0) + center_lon - 180.0
+
+def haversine_distances(start_lats, start_lons, end_lats, end_lons):
+    """
+    Calculate the great-circle distances in km of many legs at once using the Haversine formula.
+    All arguments are arrays of the same shape in degrees, the result has that shape as well.
+    """
+    lat1 = np.radians(start_lats)
+    lat2 = np.radians(end_lats)
+    dlat = lat2 - lat1
+    dlon = np.radians(end_lons) - np.radians(start_lons)
+
+    a = np.sin(dlat / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
+
+def geodesic_destinations(lats, lons, bearings, distances_km, max_iterations=50, tolerance=1e-12):
+    """
+    Solve the direct geodesic problem on the WGS84 ellipsoid for many points at once (Vincenty's formulae).
+    All arguments are broadcast against each other; angles are in degrees, distances in km.
+    Returns the latitudes and longitudes of the destination points in degrees.
+    """
+    lats, lons, bearings, distances_km = np.broadcast_arrays(
+        np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64),
+        np.asarray(bearings, dtype=np.float64), np.asarray(distances_km, dtype=np.float64))
+    alpha1 = np.radians(bearings)
+    sin_alpha1 = np.sin(alpha1)
+    cos_alpha1 = np.cos(alpha1)
+
+    # Reduced latitude of the start points
+    tan_u1 = (1 - WGS84_F) * np.tan(np.radians(lats))
+    cos_u1 = 1 / np.sqrt(1 + tan_u1**2)
+    sin_u1 = tan_u1 * cos_u1
+
+    sigma1 = np.arctan2(tan_u1, cos_alpha1)
+    sin_alpha = cos_u1 * sin_alpha1
+    cos_sq_alpha = 1 - sin_alpha**2
+    u_sq = cos_sq_alpha * (WGS84_A**2 - WGS84_B**2) / WGS84_B**2
+    A = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    B = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+
+    # Iterate the angular distance on the auxiliary sphere until it converges for every point
+    sigma = distances_km / (WGS84_B * A)
+    for _ in range(max_iterations):
+        cos_2sigma_m = np.cos(2 * sigma1 + sigma)
+        sin_sigma = np.sin(sigma)
+        cos_sigma = np.cos(sigma)
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (cos_sigma * (-1 + 2 * cos_2sigma_m**2)
+                      - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma**2) * (-3 + 4 * cos_2sigma_m**2)))
+        sigma_new = distances_km / (WGS84_B * A) + delta_sigma
+        converged = np.all(np.abs(sigma_new - sigma) < tolerance)
+        sigma = sigma_new
+        if converged:
+            break
+
+    cos_2sigma_m = np.cos(2 * sigma1 + sigma)
+    sin_sigma = np.sin(sigma)
+    cos_sigma = np.cos(sigma)
+    tmp = sin_u1 * sin_sigma - cos_u1 * cos_sigma * cos_alpha1
+    lat2 = np.arctan2(sin_u1 * cos_sigma + cos_u1 * sin_sigma * cos_alpha1,
+                      (1 - WGS84_F) * np.sqrt(sin_alpha**2 + tmp**2))
+    lam = np.arctan2(sin_sigma * sin_alpha1, cos_u1 * cos_sigma - sin_u1 * sin_sigma * cos_alpha1)
+    C = WGS84_F / 16 * cos_sq_alpha * (4 + WGS84_F * (4 - 3 * cos_sq_alpha))
+    L = lam - (1 - C) * WGS84_F * sin_alpha * (sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m**2)))
+
+    # Normalize the longitudes to [-180, 180)
+    lon2 = (lons + np.degrees(L) + 180) % 360 - 180
+    return np.degrees(lat2), lon2
+
+def _vincenty_lambda_step(lam, L, sin_u1, cos_u1, sin_u2, cos_u2):
+    """
+    One iteration of Vincenty's inverse formula, returns the next estimate of the longitude on the auxiliary sphere.
+    """
+    sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+    sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+    cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+    sigma = np.arctan2(sin_sigma, cos_sigma)
+    # Coincident points have sin_sigma = 0, equatorial legs have cos_sq_alpha = 0
+    sin_alpha = np.where(sin_sigma > 0, cos_u1 * cos_u2 * sin_lam / sin_sigma, 0.0)
+    cos_sq_alpha = 1 - sin_alpha**2
+    cos_2sigma_m = np.where(cos_sq_alpha > 0, cos_sigma - 2 * sin_u1 * sin_u2 / cos_sq_alpha, 0.0)
+    C = WGS84_F / 16 * cos_sq_alpha * (4 + WGS84_F * (4 - 3 * cos_sq_alpha))
+    return L + (1 - C) * WGS84_F * sin_alpha * (sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m**2)))
+
+def geodesic_inverse(start_lats, start_lons, end_lats, end_lons, max_iterations=200, tolerance=1e-12):
+    """
+    Solve the inverse geodesic problem on the WGS84 ellipsoid for many legs at once (Vincenty's formulae).
+    All arguments are broadcast against each other and given in degrees.
+    Vincenty's iteration does not converge for some nearly antipodal legs. These legs fall back to
+    Karney's algorithm from geographiclib, or to the spherical solution if geographiclib is not installed.
+    Returns the distances in km and the initial and final bearings in degrees.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        np.asarray(start_lats, dtype=np.float64), np.asarray(start_lons, dtype=np.float64),
+        np.asarray(end_lats, dtype=np.float64), np.asarray(end_lons, dtype=np.float64))
+    L = np.radians((lon2 - lon1 + 180) % 360 - 180)
+
+    # Reduced latitudes of the start and end points
+    u1 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat1)))
+    u2 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat2)))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+
+    # Iterate the longitude on the auxiliary sphere. Only the legs, that have not converged yet, are iterated again.
+    lam = L.ravel().copy()
+    converged = np.zeros(lam.shape, dtype=bool)
+    active = np.arange(lam.size)
+    L_flat, sin_u1_flat, cos_u1_flat = L.ravel(), sin_u1.ravel(), cos_u1.ravel()
+    sin_u2_flat, cos_u2_flat = sin_u2.ravel(), cos_u2.ravel()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iterations):
+            lam_new = _vincenty_lambda_step(lam[active], L_flat[active], sin_u1_flat[active], cos_u1_flat[active],
+                                            sin_u2_flat[active], cos_u2_flat[active])
+            done = np.abs(lam_new - lam[active]) < tolerance
+            lam[active] = lam_new
+            converged[active[done]] = True
+            active = active[~done]
+            if active.size == 0:
+                break
+        lam = lam.reshape(L.shape)
+        converged = converged.reshape(L.shape)
+
+        # Auxiliary sphere quantities of the converged longitudes
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        sin_alpha = np.where(sin_sigma > 0, cos_u1 * cos_u2 * sin_lam / sin_sigma, 0.0)
+        cos_sq_alpha = 1 - sin_alpha**2
+        cos_2sigma_m = np.where(cos_sq_alpha > 0, cos_sigma - 2 * sin_u1 * sin_u2 / cos_sq_alpha, 0.0)
+
+        u_sq = cos_sq_alpha * (WGS84_A**2 - WGS84_B**2) / WGS84_B**2
+        A = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        B = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (cos_sigma * (-1 + 2 * cos_2sigma_m**2)
+                      - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma**2) * (-3 + 4 * cos_2sigma_m**2)))
+        distances = WGS84_B * A * (sigma - delta_sigma)
+        initial_bearings = np.degrees(np.arctan2(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)) % 360
+        final_bearings = np.degrees(np.arctan2(cos_u1 * sin_lam, -sin_u1 * cos_u2 + cos_u1 * sin_u2 * cos_lam)) % 360
+
+    # Fallback for the legs, that did not converge. The legs are handled as flat arrays, so scalar legs work the same way.
+    failed = np.flatnonzero(~(converged & np.isfinite(distances) & (np.abs(lam) <= np.pi)))
+    if failed.size:
+        distances = np.array(distances, dtype=np.float64).ravel()
+        initial_bearings = np.array(initial_bearings, dtype=np.float64).ravel()
+        final_bearings = np.array(final_bearings, dtype=np.float64).ravel()
+        lat1, lon1, lat2, lon2 = lat1.ravel(), lon1.ravel(), lat2.ravel(), lon2.ravel()
+        try:
+            from geographiclib.geodesic import Geodesic
+            for i in failed:
+                result = Geodesic.WGS84.Inverse(lat1[i], lon1[i], lat2[i], lon2[i])
+                distances[i] = result['s12'] / 1000
+                initial_bearings[i] = result['azi1'] % 360
+                final_bearings[i] = result['azi2'] % 360
+        except ImportError:
+            distances[failed] = haversine_distances(lat1[failed], lon1[failed], lat2[failed], lon2[failed])
+            initial_bearings[failed] = 0.0
+            final_bearings[failed] = 180.0
+        # [()] turns the 0-d result of scalar legs back into scalars, like the converged path returns them
+        distances = distances.reshape(L.shape)[()]
+        initial_bearings = initial_bearings.reshape(L.shape)[()]
+        final_bearings = final_bearings.reshape(L.shape)[()]
+
+    return distances, initial_bearings, final_bearings
+
+def generate_ring_arrays(lats, lons, distances_km, num_points=RING_POINTS):
+    """
+    Generate the points of many distance rings in one array operation.
+    Returns two arrays (latitudes, longitudes) in degrees with the shape (rings, num_points).
+    """
+    bearings = np.linspace(0, 360, num_points)
+    return geodesic_destinations(np.asarray(lats, dtype=np.float64)[:, None], np.asarray(lons, dtype=np.float64)[:, None],
+                                 bearings[None, :], np.asarray(distances_km, dtype=np.float64)[:, None])
+
+class GeometryCache:
+    """
+    LRU cache of geometry arrays (eg. the sampled or projected points of a leg), bounded by the memory of the arrays.
+    Counts the hits and misses of all lookups, so the effect of the cache can be measured.
+    """
+    def __init__(self, max_bytes=GEOMETRY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """
+        Returns the tuple of arrays cached for the key and marks it as recently used, or None on a miss.
+        """
+        arrays = self.entries.get(key)
+        if arrays is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return arrays
+
+    def put(self, key, arrays):
+        """
+        Cache a tuple of arrays for the key, evicting the least recently used entries beyond max_bytes.
+        """
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.nbytes -= sum(array.nbytes for array in previous)
+        self.entries[key] = arrays
+        self.nbytes += sum(array.nbytes for array in arrays)
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= sum(array.nbytes for array in evicted)
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        """
+        Returns the number of hits, misses and entries and the memory of the cache as a dict.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.nbytes}
+
+class RingGeometryCache:
+    """
+    Memoizes the points of distance rings by (airport, center, radius, number of points),
+    so unchanged rings are never computed again across redraws.
+    """
+    def __init__(self, max_bytes=RING_CACHE_BYTES):
+        self.rings = GeometryCache(max_bytes)
+
+    @staticmethod
+    def ring_key(ring, num_points):
+        return (ring.start_code, ring.startcoord.lat, ring.startcoord.lon, ring.distance, num_points)
+
+    def generate_rings(self, distance_rings, num_points=RING_POINTS):
+        """
+        Returns two arrays (latitudes, longitudes) with the shape (rings, num_points) for a list of DistanceRing objects.
+        All rings missing from the cache are generated together in one vectorized call.
+        """
+        keys = [self.ring_key(ring, num_points) for ring in distance_rings]
+        cached = {}
+        missing = {}
+        for key, ring in zip(keys, distance_rings):
+            if key in cached or key in missing:
+                continue
+            points = self.rings.get(key)
+            if points is None:
+                missing[key] = ring
+            else:
+                cached[key] = points
+
+        if missing:
+            rings = list(missing.values())
+            lats, lons = generate_ring_arrays([ring.startcoord.lat for ring in rings], [ring.startcoord.lon for ring in rings],
+                                              [ring.distance for ring in rings], num_points)
+            for i, key in enumerate(missing):
+                cached[key] = (lats[i].copy(), lons[i].copy())
+                self.rings.put(key, cached[key])
+
+        ring_lats = np.empty((len(keys), num_points))
+        ring_lons = np.empty((len(keys), num_points))
+        for i, key in enumerate(keys):
+            ring_lats[i], ring_lons[i] = cached[key]
+        return ring_lats, ring_lons
@@ -18,37 +18,65 @@ AeroGCM - A Application to visualize and analyze flight routes
 
 import re 
 import itertools
+from collections import OrderedDict
 from math import radians, sin, cos, sqrt, atan2
 
-#Import airportsdata to get the lat and long coordinates of each airport based on its ICAO/IATA code
-import airportsdata
+#Import numpy for the vectorized distance calculation
+import numpy as np
 
-#Import all the global datastructures
-from aerogcm_datastructures import *
+#Import the shared airport index to get the lat and long coordinates of each airport based on its ICAO/IATA code
+from aerogcm_airport_index import get_airport_index
 
 #Import all the global datastructures
 from aerogcm_datastructures import *
 
+#Import the vectorized distance kernel of the geometry engine
+from aerogcm_geometry import haversine_distances, geodesic_inverse
+
+#Import the spatial index for the airports inside distance rings
+from aerogcm_spatial_index import get_spatial_index
+
+# Names of the color directives, that can be used in the input
+COLOR_NAMES = ['RED', 'GREEN', 'BLUE', 'YELLOW', 'WHITE', 'BLACK']
+
+# Maximum number of compiled tokens kept in the token cache
+TOKEN_CACHE_SIZE = 50000
+
+# Default maximum number of routes, that the '/' alternatives are expanded into
+MAX_EXPANDED_ROUTES = 100000
+
+# Number of expanded routes, that are evaluated together in one vectorized batch
+ROUTE_BATCH_SIZE = 20000
+
+# Available distance models: spherical Haversine (R=6371 km) or ellipsoidal WGS84 geodesic
+DISTANCE_MODELS = ('spherical', 'ellipsoidal')
+
 class AirportInputParser:
     def __init__(self):
-        """ Load the ICAO and IATA airport data. """
-        self.airports_icao = airportsdata.load("ICAO")
-        self.airports_iata = airportsdata.load("IATA")      
+        """ Get the process-wide ICAO and IATA airport index. """
+        self.airports = get_airport_index()
+
+        # Cache of compiled input tokens, keyed by the stripped token text
+        self.token_cache = OrderedDict()
+
+        # Diagnostics of the last parsed input
+        self.diagnostics = []
+
+        # Maximum number of routes, that the '/' alternatives of the input are expanded into
+        self.max_expanded_routes = MAX_EXPANDED_ROUTES
+
+        # Default distance model for all route distances
+        self.distance_model = 'spherical'
     
     def get_airport_info(self, code):
         """
         Retrieve airport info (latitude and longitude) by ICAO or IATA code.
         Returns a Coordinate object if found, otherwise None.
         """
-        code = code.strip().upper()
-        if code in self.airports_icao:
-            airport = self.airports_icao[code]
-            return Coordinate(airport['lat'], airport['lon'])
-        elif code in self.airports_iata:
-            airport = self.airports_iata[code]
-            return Coordinate(airport['lat'], airport['lon'])
-        else:
+        row = self.airports.find(code)
+        if row is None:
             return None
+        return self.airports.coordinate(row)
     
     def haversine_distance(self, coord1, coord2):
         # Calculate great-circle distance using the Haversine formula
@@ -62,40 +90,273 @@ class AirportInputParser:
         a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
         c = 2 * atan2(sqrt(a), sqrt(1 - a))
         return R * c
+
+    def _distances(self, start_lats, start_lons, end_lats, end_lons, model=None):
+        """
+        Calculate leg distances in km with the given distance model (default: self.distance_model).
+        """
+        if model is None:
+            model = self.distance_model
+        if model == 'spherical':
+            return haversine_distances(start_lats, start_lons, end_lats, end_lons)
+        if model == 'ellipsoidal':
+            return geodesic_inverse(start_lats, start_lons, end_lats, end_lons)[0]
+        raise ValueError(f"Invalid distance model: {model}")
+
+    def leg_distances(self, start_rows, end_rows, model=None):
+        """
+        Calculate the distances in km of many legs given as arrays of airport index rows.
+        """
+        start_rows = np.asarray(start_rows, dtype=np.int64)
+        end_rows = np.asarray(end_rows, dtype=np.int64)
+        return self._distances(self.airports.lat[start_rows], self.airports.lon[start_rows],
+                               self.airports.lat[end_rows], self.airports.lon[end_rows], model)
+
+    def leg_geodesics(self, start_rows, end_rows):
+        """
+        Solve the WGS84 inverse geodesic problem for many legs given as arrays of airport index rows.
+        Returns the distances in km and the initial and final bearings in degrees.
+        """
+        start_rows = np.asarray(start_rows, dtype=np.int64)
+        end_rows = np.asarray(end_rows, dtype=np.int64)
+        return geodesic_inverse(self.airports.lat[start_rows], self.airports.lon[start_rows],
+                                self.airports.lat[end_rows], self.airports.lon[end_rows])
     
-    def calculate_route_distance(self, route_string):
-        routes = route_string.split(',')
+    def calculate_route_distance(self, route_string, mode='all', k=1, max_routes=None, model=None, diagnostics=None):
+        """
+        Calculate the distance of the routes in the input.
+        mode 'all' expands every '/' alternative (up to max_routes routes),
+        mode 'shortest' or 'longest' returns only the k shortest or longest routes of every route token.
+        model selects the 'spherical' or 'ellipsoidal' distance model (default: self.distance_model).
+        If a list is given as diagnostics, the ParseDiagnostics of the input are appended to it,
+        e.g. for invalid airport codes or a route expansion stopped at max_routes.
+        """
+        compiled = self.compile_input(route_string)
+        if mode == 'all':
+            results = self.compiled_route_distances(compiled, max_routes, model)
+        else:
+            results = self.best_route_distances(compiled, mode, k, model)
+        if diagnostics is not None:
+            diagnostics.extend(compiled.diagnostics)
+        return results
+
+    def iter_expanded_routes(self, compiled):
+        """
+        Lazily expand the '/' alternatives of all route tokens of a CompiledInput.
+        Yields (route label, list of airport index rows) tuples without materializing all combinations.
+        """
+        for token in compiled.tokens:
+            if token.kind != 'route':
+                continue
+            for combination in itertools.product(*token.stages):
+                yield '-'.join(code for code, row in combination), [row for code, row in combination]
+
+    def compiled_route_distances(self, compiled, max_routes=None, model=None):
+        """
+        Calculate the distance of every expanded route of a CompiledInput.
+        The routes are streamed in batches, so memory is bounded by the batch size and the result itself.
+        At most max_routes routes (default: self.max_expanded_routes) are expanded,
+        if the limit is hit a diagnostic is added to the compiled input.
+        """
+        if max_routes is None:
+            max_routes = self.max_expanded_routes
+
+        routes = self.iter_expanded_routes(compiled)
         results = []
+        expanded = 0
+        while expanded < max_routes:
+            batch = list(itertools.islice(routes, min(ROUTE_BATCH_SIZE, max_routes - expanded)))
+            if not batch:
+                break
+            expanded += len(batch)
+            route_labels, route_rows = zip(*batch)
+            results.extend(self._route_distances(route_labels, route_rows, model))
+
+        if expanded >= max_routes and next(routes, None) is not None:
+            compiled.diagnostics.append(ParseDiagnostic(str(max_routes), "Route expansion stopped after the maximum number of routes"))
+        return results
 
-        for route in routes:
-            if '-' not in route:
-                continue  # Ignore invalid tokens
+    def cached_route_distances(self, compiled, max_routes=None, model=None):
+        """
+        Like compiled_route_distances, but the distances are stored on the compiled tokens.
+        Compiled tokens are cached by their text, so after an edit only the new or changed tokens are calculated,
+        all of them in one vectorized call. Used for the live preview, where the input changes with every keystroke.
+        """
+        if max_routes is None:
+            max_routes = self.max_expanded_routes
+        if model is None:
+            model = self.distance_model
 
-            # Split the route into segments, handling '/' separators
-            segments = route.split('-')
-            expanded_routes = [[]]
+        # Expand the routes of all tokens without distances for this model and limit, every token at most up to the limit
+        cache_key = (model, max_routes)
+        missing = {id(token): token for token in compiled.tokens if token.kind == 'route' and cache_key not in token.route_distances}
+        route_labels = []
+        route_rows = []
+        route_counts = []
+        truncated = []
+        for token in missing.values():
+            routes = self.iter_expanded_routes(CompiledInput([token]))
+            count = 0
+            for route_label, rows in itertools.islice(routes, max_routes):
+                route_labels.append(route_label)
+                route_rows.append(rows)
+                count += 1
+            route_counts.append(count)
+            truncated.append(next(routes, None) is not None)
 
-            for segment in segments:
-                options = segment.split('/')
-                expanded_routes = [r + [opt] for r in expanded_routes for opt in options]
+        # Calculate the new routes in one call and store them on their tokens
+        distances = []
+        if route_rows:
+            distances = self.route_distance_array(route_rows, model).tolist()
+        start = 0
+        for token, count, token_truncated in zip(missing.values(), route_counts, truncated):
+            token_results = [FlightRouteDistance(route_label, distance)
+                             for route_label, distance in zip(route_labels[start:start + count], distances[start:start + count])
+                             if distance == distance]  # Skip routes with missing airport info (NaN)
+            token.route_distances[cache_key] = (token_results, token_truncated)
+            start += count
+
+        # Collect the distances of all tokens in input order, up to the limit
+        results = []
+        stopped = False
+        for token in compiled.tokens:
+            if token.kind != 'route':
+                continue
+            token_results, token_truncated = token.route_distances[cache_key]
+            room = max_routes - len(results)
+            results.extend(token_results[:room])
+            if token_truncated or len(token_results) > room:
+                stopped = True
+                break
+        if stopped:
+            compiled.diagnostics.append(ParseDiagnostic(str(max_routes), "Route expansion stopped after the maximum number of routes"))
+        return results
+
+    def best_route_distances(self, compiled, mode='shortest', k=1, model=None):
+        """
+        Find the k shortest or longest routes of every route token of a CompiledInput without enumerating
+        every combination of its '/' alternatives.
+        The stages of a route form a layered graph. A dynamic program keeps the k best partial routes for every
+        airport of a stage, so the cost grows with the number of legs between neighbouring stages only.
+        """
+        if mode not in ('shortest', 'longest'):
+            raise ValueError(f"Invalid route selection mode: {mode}")
+        if k < 1:
+            raise ValueError(f"Invalid number of routes: {k}, at least 1 route must be selected")
+        sign = 1.0 if mode == 'shortest' else -1.0
+
+        results = []
+        for token in compiled.tokens:
+            if token.kind != 'route':
+                continue
+            for total_distance, combination in self._best_stage_paths(token.stages, sign, k, model):
+                route_label = '-'.join(code for code, row in combination)
+                results.append(FlightRouteDistance(route_label, total_distance))
+        return results
+
+    def _best_stage_paths(self, stages, sign, k, model=None):
+        """
+        Dynamic program over the layered stage graph of one route.
+        Returns up to k (distance, combination) tuples ordered from best to worst,
+        where sign=1 selects the shortest and sign=-1 the longest routes.
+        """
+        rows = [np.array([row for code, row in stage], dtype=np.int64) for stage in stages]
 
-            for expanded_route in expanded_routes:
-                total_distance = 0
-                route_str = '-'.join(expanded_route)
+        # cost[node, rank] holds the k best signed partial distances, unknown airports are unreachable
+        cost = np.where(rows[0] >= 0, 0.0, np.inf)[:, None]
+        cost = np.concatenate((cost, np.full((len(rows[0]), k - 1), np.inf)), axis=1)
+        back_pointers = []
 
-                # Calculate the distance for the full route
-                for i in range(len(expanded_route) - 1):
-                    start = self.get_airport_info(expanded_route[i])
-                    end = self.get_airport_info(expanded_route[i + 1])
+        for prev_rows, next_rows in zip(rows, rows[1:]):
+            # Signed distances of all legs between the two stages
+            prev_lat = self.airports.lat[prev_rows][:, None]
+            prev_lon = self.airports.lon[prev_rows][:, None]
+            next_lat = self.airports.lat[next_rows][None, :]
+            next_lon = self.airports.lon[next_rows][None, :]
+            weights = sign * self._distances(prev_lat, prev_lon, next_lat, next_lon, model)
+            weights[(prev_rows < 0)[:, None] | (next_rows < 0)[None, :]] = np.inf
 
-                    if start and end:
-                        total_distance += self.haversine_distance(start, end)
-                    else:
-                        total_distance = None
-                        break  # If any airport info is missing, skip this route
+            # Candidates for every next node: (previous node, rank) x next node
+            candidates = (cost[:, :, None] + weights[:, None, :]).reshape(-1, len(next_rows))
+            order = np.argsort(candidates, axis=0, kind='stable')[:k]
+            cost = np.take_along_axis(candidates, order, axis=0).T
+            if cost.shape[1] < k:
+                cost = np.concatenate((cost, np.full((len(next_rows), k - cost.shape[1]), np.inf)), axis=1)
+                order = np.concatenate((order, np.zeros((k - order.shape[0], len(next_rows)), dtype=order.dtype)))
+            back_pointers.append(order.T)  # back_pointers[node, rank] = previous node * k + previous rank
 
-                if total_distance is not None:
-                    results.append(FlightRouteDistance(route_str, total_distance))
+        # Pick the k best end states and walk back through the stages
+        final = cost.ravel()
+        best = np.argsort(final, kind='stable')[:k]
+        paths = []
+        for state in best.tolist():
+            if not np.isfinite(final[state]):
+                break
+            total_distance = abs(float(final[state]))
+            node, rank = divmod(state, k)
+            nodes = [node]
+            for pointers in reversed(back_pointers):
+                node, rank = divmod(int(pointers[node, rank]), k)
+                nodes.append(node)
+            nodes.reverse()
+            paths.append((total_distance, [stage[node] for stage, node in zip(stages, nodes)]))
+        return paths
+
+    def calculate_expanded_route_distances(self, expanded_routes, model=None):
+        """
+        Calculate the total distance of every expanded route (a list of airport codes).
+        Routes containing an unknown airport are skipped.
+        """
+        route_labels = ['-'.join(expanded_route) for expanded_route in expanded_routes]
+        route_rows = [self.airports.find_many(expanded_route).tolist() for expanded_route in expanded_routes]
+        return self._route_distances(route_labels, route_rows, model)
+
+    def route_distance_array(self, route_rows, model=None):
+        """
+        Calculate the total distance of every route given as a list of airport index rows (-1 for unknown).
+        Every unique leg across all routes is computed only once, in one vectorized call.
+        The route totals are then built by indexed summation over the leg distances.
+        Returns a float64 array aligned with route_rows, routes containing an unknown airport are NaN.
+        """
+        # Assign an id to every unique (origin, destination) leg and remember the legs of each route
+        leg_ids = {}
+        route_legs = []
+        route_starts = []
+        for rows in route_rows:
+            route_starts.append(len(route_legs))
+            for i in range(len(rows) - 1):
+                route_legs.append(leg_ids.setdefault((rows[i], rows[i + 1]), len(leg_ids)))
+        leg_rows = np.array(list(leg_ids), dtype=np.int64).reshape(-1, 2)
+
+        # Compute all unique legs at once, legs with an unknown airport get NaN
+        leg_distances = np.full(len(leg_rows), np.nan)
+        valid = (leg_rows >= 0).all(axis=1)
+        start_rows = leg_rows[valid, 0]
+        end_rows = leg_rows[valid, 1]
+        leg_distances[valid] = self.leg_distances(start_rows, end_rows, model)
+
+        # Sum up the legs of each route, a NaN leg makes the whole route NaN. Routes without legs have length 0.
+        route_starts = np.array(route_starts, dtype=np.int64)
+        leg_counts = np.diff(np.append(route_starts, len(route_legs)))
+        route_distances = np.zeros(len(route_rows))
+        if route_legs:
+            route_distances[leg_counts > 0] = np.add.reduceat(leg_distances[np.array(route_legs, dtype=np.int64)],
+                                                              route_starts[leg_counts > 0])
+        return route_distances
+
+    def _route_distances(self, route_labels, route_rows, model=None):
+        """
+        Calculate the total distance of every route given as a list of airport index rows (-1 for unknown).
+        Routes containing an unknown airport are skipped.
+        """
+        if not route_rows:
+            return []
+        route_distances = self.route_distance_array(route_rows, model)
+
+        results = []
+        for route_label, total_distance in zip(route_labels, route_distances.tolist()):
+            if total_distance == total_distance:  # Skip routes with missing airport info (NaN)
+                results.append(FlightRouteDistance(route_label, total_distance))
 
         return results
         
@@ -111,86 +372,156 @@ class AirportInputParser:
         }
         return color_dict.get(color_name, None)  # Return None if color is not recognized
 
-    def parseInput(self, input_text):
+    def compile_token(self, token):
         """
-        Parses the input and returns a list of AirportPair objects and DistanceRing objects with optional color information.
-        Colors can be specified by name (e.g., RED, GREEN) and will apply to all subsequent routes and distance rings until another color is provided.
+        Compile a single stripped input token into a CompiledToken.
+        Compiled tokens do not depend on their neighbours, so they are cached by their text.
+        Editing one token of a large input therefore only compiles that token again.
+        """
+        compiled = self.token_cache.get(token)
+        if compiled is not None:
+            self.token_cache.move_to_end(token)
+            return compiled
+
+        compiled = self._compile_token(token)
+        self.token_cache[token] = compiled
+        if len(self.token_cache) > TOKEN_CACHE_SIZE:
+            self.token_cache.popitem(last=False)
+        return compiled
+
+    def _compile_token(self, token):
+        # Check if the token is empty (e.g. a trailing comma)
+        if not token:
+            return CompiledToken(token, 'empty')
+
+        # Check if the token is a color (by name)
+        if token.upper() in COLOR_NAMES:
+            return CompiledToken(token, 'color', color=self.convert_color_name_to_rgb(token.upper()))
+
+        # Check if the token is a valid distance ring (e.g., 900nm@LHR or 1500km@SFO)
+        # A trailing '+' (e.g., 1000nm@KEWR+) highlights all airports inside the ring
+        if '@' in token and ('nm' in token or 'km' in token):
+            try:
+                # Split the token into distance and airport code
+                distance_part, airport_code = token.split('@')
+                airport_code = airport_code.strip().upper()
+                with_airports = airport_code.endswith('+')
+                airport_code = airport_code.rstrip('+').strip()
+                distance_part = distance_part.strip().lower()
+
+                # Convert distance to kilometers if necessary
+                if 'nm' in distance_part:
+                    distance = float(distance_part.replace('nm', '')) * 1.852  # Convert nm to km
+                elif 'km' in distance_part:
+                    distance = float(distance_part.replace('km', ''))  # Already in km
+                else:
+                    raise ValueError(f"Invalid distance format: {distance_part}")
+            except ValueError:
+                return CompiledToken(token, 'invalid', diagnostics=[ParseDiagnostic(token, "Invalid input format")])
+
+            # Resolve the airport of the ring center
+            row = self.airports.find(airport_code)
+            if row is None:
+                return CompiledToken(token, 'invalid', diagnostics=[ParseDiagnostic(airport_code, "Invalid airport code")])
+            enclosed_rows = self.airports_within_rows(row, distance)[0] if with_airports else None
+            return CompiledToken(token, 'ring', ring_code=airport_code, ring_row=row, distance=distance, enclosed_rows=enclosed_rows)
+
+        # Check if the token is a valid route (contains '-')
+        if '-' in token:
+            # Split by '-' to handle legs in series and by '/' to handle multiple options at each stage
+            stages = []
+            diagnostics = []
+            for i, leg in enumerate(token.split('-')):
+                stage = []
+                for code in leg.split('/'):
+                    code = code.strip().upper()
+                    row = self.airports.find(code)
+                    if row is None:
+                        row = -1
+                        message = "Invalid start code" if i == 0 else "Invalid destination code"
+                        diagnostics.append(ParseDiagnostic(code, message))
+                    stage.append((code, row))
+                stages.append(stage)
+            return CompiledToken(token, 'route', stages=stages, diagnostics=diagnostics)
+
+        # If token is neither a color, a distance ring, nor a valid route, report it as invalid
+        return CompiledToken(token, 'invalid', diagnostics=[ParseDiagnostic(token, "Invalid token")])
+
+    def airports_within_rows(self, row, distance_km):
+        """
+        Returns the airport index rows and the distances in km of all other airports within distance_km
+        of the airport in the given row, nearest first. Distances are spherical great circle distances.
+        """
+        rows, distances = get_spatial_index().within_radius(self.airports.lat[row], self.airports.lon[row], distance_km)
+        other = rows != row
+        return rows[other], distances[other]
+
+    def airports_within(self, code, distance_km):
+        """
+        Returns a list of (ICAO code, distance in km) of all airports within distance_km of an airport (ICAO or IATA code),
+        nearest first. Returns None, if the code is unknown.
+        """
+        row = self.airports.find(code)
+        if row is None:
+            return None
+        rows, distances = self.airports_within_rows(row, distance_km)
+        return list(zip(self.airports.icao[rows].tolist(), distances.tolist()))
+
+    def nearest_airports(self, lat, lon, k=1):
+        """
+        Returns a list of (ICAO code, distance in km) of the k airports nearest to a coordinate, nearest first.
+        """
+        return get_spatial_index().nearest_codes(lat, lon, k)
+
+    def compile_input(self, input_text):
+        """
+        Compile the whole input into a CompiledInput, reusing the cached tokens.
+        """
+        return CompiledInput([self.compile_token(token.strip()) for token in input_text.split(',')])
+
+    def compiled_plot_data(self, compiled):
+        """
+        Derive the list of AirportPair objects and DistanceRing objects from a CompiledInput.
+        Colors apply to all subsequent routes and distance rings until another color is provided.
         """
-        # Split input by commas to handle multiple routes and color changes
-        tokens = [token.strip() for token in input_text.split(',')]
         parsed_pairs = []
         parsed_rings = []  # List for storing DistanceRing objects
+        coordinates = {}  # Coordinate objects shared by all pairs and rings of the same airport
+
+        def coordinate(row):
+            if row not in coordinates:
+                coordinates[row] = self.airports.coordinate(row)
+            return coordinates[row]
 
         # Set color to default color
         current_color = (19.6/100, 64.3/100,80.8/100,1)
 
-        # Iterate over each token in the input
-        for token in tokens:
-            # Check if the token is a color (by name)
-            if token.upper() in ['RED', 'GREEN', 'BLUE', 'YELLOW', 'WHITE', 'BLACK']:
-                current_color = self.convert_color_name_to_rgb(token.upper())
-            
-            # Check if the token is a valid distance ring (e.g., 900nm@LHR or 1500km@SFO)
-            elif '@' in token and ('nm' in token or 'km' in token):
-                try:
-                    # Split the token into distance and airport code
-                    distance_part, airport_code = token.split('@')
-                    airport_code = airport_code.strip().upper()
-                    distance_part = distance_part.strip().lower()
-
-                    # Convert distance to kilometers if necessary
-                    if 'nm' in distance_part:
-                        distance = float(distance_part.replace('nm', '')) * 1.852  # Convert nm to km
-                    elif 'km' in distance_part:
-                        distance = float(distance_part.replace('km', ''))  # Already in km
-                    else:
-                        raise ValueError(f"Invalid distance format: {distance_part}")
-
-                    # Retrieve coordinates for the start airport
-                    start_coord = self.get_airport_info(airport_code)
-           
-                    parsed_rings.append(DistanceRing(airport_code, start_coord, distance, color=current_color))
-
-                except ValueError:
-                    print(f"Invalid input format: {token}")
-
-            elif '-' in token:  # Check if the token is a valid route (contains '-')
-                try:
-                    # Split by '-' to handle legs in series (e.g., LAX-EWR or SFO-LAX)
-                    legs = [leg.strip() for leg in token.split('-')]
-
-                    # First leg can have multiple starting airports, split by '/'
-                    start_codes = [start.strip().upper() for start in legs[0].split('/')]
-
-                    # Iterate over the remaining legs in the series
-                    for i in range(1, len(legs)):
-                        # Split by '/' to handle multiple destination options at each step
-                        end_codes = [end.strip().upper() for end in legs[i].split('/')]
-
-                        # Retrieve coordinates for each start airport
-                        for start_code in start_codes:
-                            start_coord = self.get_airport_info(start_code)
-
-                            if start_coord:
-                                # Iterate over each destination option and create AirportPair objects
-                                for end_code in end_codes:
-                                    end_coord = self.get_airport_info(end_code)
-
-                                    if end_coord:
-                                        # Create an AirportPair with the current color
-                                        parsed_pairs.append(AirportPair(start_code, end_code, start_coord, end_coord, color=current_color))
-                                    else:
-                                        print(f"Invalid destination code: {end_code}")
-                            else:
-                                print(f"Invalid start code: {start_code}")
-
-                        # Set the current end_codes as the new start_codes for the next leg
-                        start_codes = end_codes  # Move to the destinations for the next leg
-
-                except ValueError:
-                    print(f"Invalid input format: {token}")
-            else:
-                # If token is neither a color, a distance ring, nor a valid route, print an error message
-                print(f"Invalid token: {token}")
+        for token in compiled.tokens:
+            if token.kind == 'color':
+                current_color = token.color
+
+            elif token.kind == 'ring':
+                parsed_rings.append(DistanceRing(token.ring_code, coordinate(token.ring_row), token.distance, color=current_color,
+                                                 enclosed_rows=token.enclosed_rows))
+
+            elif token.kind == 'route':
+                # Connect every valid airport of a stage with every valid airport of the next stage
+                for start_stage, end_stage in zip(token.stages, token.stages[1:]):
+                    for start_code, start_row in start_stage:
+                        if start_row < 0:
+                            continue
+                        for end_code, end_row in end_stage:
+                            if end_row >= 0:
+                                parsed_pairs.append(AirportPair(start_code, end_code, coordinate(start_row), coordinate(end_row), color=current_color))
 
         return parsed_pairs, parsed_rings
+
+    def parseInput(self, input_text):
+        """
+        Parses the input and returns a list of AirportPair objects and DistanceRing objects with optional color information.
+        Colors can be specified by name (e.g., RED, GREEN) and will apply to all subsequent routes and distance rings until another color is provided.
+        The diagnostics of the parsed input are stored in self.diagnostics.
+        """
+        compiled = self.compile_input(input_text)
+        self.diagnostics = compiled.diagnostics
+        return self.compiled_plot_data(compiled)
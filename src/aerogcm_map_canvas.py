@@ -0,0 +1,63 @@
+""""
+AeroGCM - A Application to visualize and analyze flight routes
+    Copyright (C) 2025  MaxQ22
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Import the Kivy widget and graphics classes
+from kivy.uix.widget import Widget
+from kivy.graphics import Color, Rectangle
+from kivy.graphics.texture import Texture
+
+"""
+MapView
+------------------
+This module contains the Kivy widget showing the AeroGCM map.
+Features:
+- Shows the RGBA image of a map rendered off-screen by the MapRenderWorker
+- Reuses its texture while the image size does not change, so showing a new frame is a single upload
+"""
+
+class MapView(Widget):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.texture = None
+        with self.canvas:
+            # Black background, visible until the first image arrives
+            Color(0, 0, 0, 1)
+            self.background_rect = Rectangle(pos=self.pos, size=self.size)
+            Color(1, 1, 1, 1)
+            self.image_rect = Rectangle(pos=self.pos, size=self.size)
+        self.bind(pos=self._update_rects, size=self._update_rects)
+
+    def _update_rects(self, *args):
+        self.background_rect.pos = self.image_rect.pos = self.pos
+        self.background_rect.size = self.size
+        if self.texture is not None:
+            self.image_rect.size = self.texture.size
+        else:
+            self.image_rect.size = self.size
+
+    def show_image(self, rgba, width, height):
+        """
+        Show an RGBA image (rows from top to bottom, like the Agg buffer) of the given size in pixels.
+        """
+        if self.texture is None or self.texture.size != (width, height):
+            self.texture = Texture.create(size=(width, height), colorfmt='rgba')
+            self.texture.flip_vertical()
+            self.image_rect.texture = self.texture
+        self.texture.blit_buffer(rgba, colorfmt='rgba', bufferfmt='ubyte')
+        self._update_rects()
+        self.canvas.ask_update()
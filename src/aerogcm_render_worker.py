@@ -0,0 +1,209 @@
+""""
+AeroGCM - A Application to visualize and analyze flight routes
+    Copyright (C) 2025  MaxQ22
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import queue
+import threading
+import traceback
+
+# Import the startup profile, the first map of the GUI is rendered by the worker
+from aerogcm_startup import startup_profile
+
+"""
+MapRenderWorker
+------------------
+This module renders AeroGCM maps in a background thread, so the user interface never waits for a map.
+Features:
+- Parses the input, calculates the route distances and renders the map into an off-screen Agg figure
+- Hands back the finished RGBA image and the distance table through a callback
+- Every job carries a generation number. Jobs and results superseded by a newer generation are discarded,
+  and a running render is cancelled between its phases, as soon as a newer job is submitted
+- Reports the progress of a render through a callback
+"""
+
+# Default resolution of the off-screen figure
+RENDER_DPI = 100
+
+class RenderCancelled(Exception):
+    """
+    Raised inside the worker, when the running job was superseded by a newer one.
+    """
+
+# A map render request of the user interface
+class RenderJob:
+    def __init__(self, generation, input_text, width, height, options=None, model='spherical',
+                 dpi=RENDER_DPI, world_map=False, background_path=None):
+        self.generation = generation
+        self.input_text = input_text
+        self.width = width
+        self.height = height
+        self.options = options or {}  # Keyword arguments of MapRenderer.render (show_labels, ...)
+        self.model = model
+        self.dpi = dpi
+        self.world_map = world_map  # Draw the empty world map instead of the input
+        self.background_path = background_path  # Save the world map to this file, if it does not exist
+
+# The outcome of a RenderJob
+class RenderResult:
+    def __init__(self, generation, rgba=None, width=0, height=0, route_distances=None, diagnostics=None, error=None):
+        self.generation = generation
+        self.rgba = rgba  # RGBA bytes of the rendered map, None if the map did not change
+        self.width = width
+        self.height = height
+        self.route_distances = route_distances  # List of FlightRouteDistance, None for the world map
+        self.diagnostics = diagnostics or []
+        self.error = error
+
+class MapRenderWorker:
+    def __init__(self, deliver, progress=None):
+        """
+        Create the worker thread. deliver(result) and progress(generation, fraction) are called from the
+        worker thread, the user interface has to hand them over to its own thread (e.g. with the Kivy Clock).
+        """
+        self.deliver = deliver
+        self.progress = progress
+        self.latest_generation = None
+        self.jobs = queue.Queue()
+
+        # Parser and renderer are created in the worker thread, with the first job
+        self.parser = None
+        self.renderer = None
+        self.rendered = False  # True after the first completed render, which is measured by the startup profile
+
+        self.thread = threading.Thread(target=self._run, name='AeroGCM map renderer', daemon=True)
+        self.thread.start()
+
+    def submit(self, job):
+        """
+        Queue a job. All older jobs, that are not finished yet, are cancelled.
+        """
+        self.latest_generation = job.generation
+        self.jobs.put(job)
+
+    def stop(self):
+        """
+        Stop the worker thread after the current job.
+        """
+        self.latest_generation = None
+        self.jobs.put(None)
+
+    def is_stale(self, job):
+        return job.generation != self.latest_generation
+
+    def _check(self, job, fraction):
+        """
+        Report the progress of the job, or cancel it, if a newer job was submitted.
+        """
+        if self.is_stale(job):
+            raise RenderCancelled()
+        if self.progress is not None:
+            self.progress(job.generation, fraction)
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            # Only the newest queued job is rendered
+            while job is not None and not self.jobs.empty():
+                job = self.jobs.get()
+            if job is None:
+                return
+            if self.is_stale(job):
+                continue
+            try:
+                result = self.render(job)
+            except RenderCancelled:
+                continue
+            except Exception as e:
+                traceback.print_exc()
+                result = RenderResult(job.generation, error=str(e))
+            if not self.is_stale(job):
+                self.deliver(result)
+
+    def _ensure_renderer(self):
+        if self.renderer is None:
+            with startup_profile.phase('map imports'):
+                from aerogcm_input_parser import AirportInputParser
+                from aerogcm_renderer import MapRenderer
+            with startup_profile.phase('airport data load'):
+                self.parser = AirportInputParser()
+            self.renderer = MapRenderer(parser=self.parser, use_blitting=True)
+        return self.renderer
+
+    def render(self, job):
+        """
+        Render one job in the worker thread and return its RenderResult.
+        """
+        renderer = self._ensure_renderer()
+        if self.rendered:
+            return self._render_job(renderer, job)
+        # The first render (drawing and rasterizing the first map) is a phase of the startup profile,
+        # a first render cancelled by a newer job is reported as a phase of its own
+        with startup_profile.phase('first render'):
+            result = self._render_job(renderer, job)
+        self.rendered = True
+        return result
+
+    def _render_job(self, renderer, job):
+        self._check(job, 0.1)
+
+        figure = renderer.map_fig
+        figure.set_dpi(job.dpi)
+        figure.set_size_inches(max(job.width, 1) / job.dpi, max(job.height, 1) / job.dpi)
+
+        result = RenderResult(job.generation)
+        if job.world_map:
+            renderer.draw_world_map()
+        else:
+            # Compile the input once, both the plot data and the route distances are derived from it.
+            # Tokens are cached by their text, so only changed tokens are compiled again
+            compiled = self.parser.compile_input(job.input_text.strip())
+            self._check(job, 0.2)
+            # The distances of unchanged tokens are reused from the previous renders
+            result.route_distances = self.parser.cached_route_distances(compiled, model=job.model)
+            result.diagnostics = compiled.diagnostics
+            self._check(job, 0.4)
+
+            parsed_pairs, parsed_rings = self.parser.compiled_plot_data(compiled)
+            drawn = renderer.render(parsed_pairs, parsed_rings, **job.options)
+
+            # Without anything to draw, the map stays unchanged, unless it has to be redrawn at a new size
+            unchanged_size = renderer.background is not None and renderer.background_bounds == figure.bbox.bounds
+            if not drawn and unchanged_size:
+                return result
+        self._check(job, 0.7)
+
+        # Rasterize: with an unchanged background, only the routes are drawn on top of it
+        renderer.refresh()
+        result.width, result.height = figure.canvas.get_width_height()
+        result.rgba = bytes(figure.canvas.buffer_rgba())
+
+        if job.world_map and job.background_path:
+            self._save_background(job.background_path)
+        return result
+
+    def _save_background(self, path):
+        """
+        Save the empty world map, which the user interface shows at the next start until the first render is done.
+        """
+        if os.path.isfile(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.renderer.save(path, dpi=self.renderer.map_fig.dpi)
+        except OSError as e:
+            print(f"Could not write the map background cache: {e}")
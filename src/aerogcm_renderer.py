@@ -0,0 +1,876 @@
+""""
+AeroGCM - A Application to visualize and analyze flight routes
+    Copyright (C) 2025  MaxQ22
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import sys
+import glob
+import argparse
+import multiprocessing
+
+#Import numpy for some general maths vector handling
+import numpy as np
+
+# Import the Matplotlib figure and the Agg canvas, so the map can be drawn without pyplot and without a display
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.transforms import offset_copy
+
+# Import Basemap for the plotting of the world map
+from mpl_toolkits.basemap import Basemap
+
+# Import all the global datastructures
+from aerogcm_datastructures import *
+
+#Import the ordered dict for the LRU cache of the Basemap instances
+from collections import OrderedDict
+
+# Import the vectorized geometry engine for the great circle sampling
+from aerogcm_geometry import (sample_great_circle_arrays, sample_great_circle_adaptive, chord_error_spacing,
+                             ring_point_count, great_circle_bounds, ring_bounds, minimal_longitude_range,
+                             wrap_longitudes, pairs_to_endpoint_arrays, GeometryCache, RingGeometryCache)
+
+# Import the input parser that parses the inputs into the dataset for plotting
+from aerogcm_input_parser import AirportInputParser
+
+"""
+MapRenderer
+------------------
+This module contains the map drawing logic of AeroGCM as a pure matplotlib/Agg renderer.
+Features:
+- Draws great circles, distance rings, airport labels, country lines and city names into any matplotlib figure
+- Used by the Kivy GUI, but works without a display as well
+- Renders .aerogcm files to PNG/SVG, and whole directories of .aerogcm files in a process pool
+
+Usage:
+    python ./src/aerogcm_renderer.py routes.aerogcm -o routes.png
+    python ./src/aerogcm_renderer.py --batch ./maps --output-dir ./png --workers 8
+"""
+
+# Default size of headless figures in inches
+DEFAULT_FIGURE_SIZE = (12, 8)
+
+# Default resolution of headless raster output
+DEFAULT_DPI = 150
+
+# Padding in degrees around the routes and rings of the zoomed map
+BOUNDS_PADDING = 5.0
+
+# Number of points per distance ring, from which the ring bounds are taken
+RING_BOUNDS_POINTS = 360
+
+# Maximum deviation in pixels of the drawn routes and rings from the true curves, sets the adaptive sampling
+MAX_CHORD_ERROR_PX = 0.5
+
+# Number of grid columns of the route density mode
+DENSITY_GRID_SIZE = 400
+
+# Colormap of the route density mode
+DEFAULT_DENSITY_CMAP = 'inferno'
+
+# Route styles: every great circle as a line, or the density of all great circles as one image
+ROUTE_STYLES = ('lines', 'density')
+
+# Map bounds are rounded outwards to this grid (in degrees), so similar extents share one Basemap instance
+BASEMAP_GRID_DEGREES = 2.0
+
+# Maximum number of projected Basemap instances kept per renderer
+BASEMAP_CACHE_SIZE = 16
+
+# Bounds of the initial world map
+WORLD_BOUNDS = (-60.0, 90.0, -180.0, 180.0)
+
+# Font size of the airport labels, and the size of the airport markers, in points
+AIRPORT_LABEL_FONTSIZE = 10
+AIRPORT_MARKER_SIZE = 5
+
+# Size in points of the markers of the airports inside highlighted distance rings (e.g. 1000nm@KEWR+)
+ENCLOSED_MARKER_SIZE = 2
+
+# Approximate width of a label character relative to the font size, used to estimate the label boxes
+LABEL_CHARACTER_WIDTH = 0.65
+
+# Positions tried for every airport label as (ha, va, offset in marker sizes): left or right of the
+# marker first (the side of the first leg of the airport), then above and below it
+LABEL_POSITIONS = {
+    'right': ('right', 'baseline', 0),
+    'left': ('left', 'baseline', 0),
+    'above': ('center', 'bottom', 1),
+    'below': ('center', 'top', -1),
+}
+
+class LabelGrid:
+    """
+    Screen space grid of the boxes of placed labels, to find overlapping labels.
+    Every box is stored in all grid cells it touches, so a collision test only compares the boxes
+    of a few neighbouring cells, and placing n labels costs about O(n).
+    """
+    def __init__(self, cell_size):
+        self.cell_size = max(float(cell_size), 1.0)
+        self.cells = {}
+
+    def _cells(self, box):
+        x0, y0, x1, y1 = (int(np.floor(value / self.cell_size)) for value in box)
+        return [(column, row) for column in range(x0, x1 + 1) for row in range(y0, y1 + 1)]
+
+    def collides(self, box):
+        x0, y0, x1, y1 = box
+        for cell in self._cells(box):
+            for other in self.cells.get(cell, ()):
+                if x0 < other[2] and other[0] < x1 and y0 < other[3] and other[1] < y1:
+                    return True
+        return False
+
+    def place(self, box):
+        """
+        Adds the box (x0, y0, x1, y1), if it does not overlap any placed box. Returns True, if it was placed.
+        """
+        if self.collides(box):
+            return False
+        for cell in self._cells(box):
+            self.cells.setdefault(cell, []).append(box)
+        return True
+
+class BasemapCache:
+    """
+    LRU cache of Basemap instances, keyed by the grid rounded bounds and the resolution.
+    Constructing a Basemap clips the whole coastline and continent datasets, so re-plotting
+    into a recently used extent reuses the existing instance instead.
+    """
+    def __init__(self, ax, max_maps=BASEMAP_CACHE_SIZE, grid=BASEMAP_GRID_DEGREES):
+        self.ax = ax
+        self.max_maps = max_maps
+        self.grid = grid
+        self.maps = OrderedDict()
+
+    def snap_bounds(self, min_lat, max_lat, min_lon, max_lon):
+        """
+        Round the bounds outwards to the grid, limited to the valid latitude range.
+        Ranges across the antimeridian keep max_lon above 180, with min_lon shifted into [-180, 180).
+        Ranges of 360 degrees or more become the whole world.
+        """
+        grid = self.grid
+        min_lon = np.floor(min_lon / grid) * grid
+        max_lon = np.ceil(max_lon / grid) * grid
+        if max_lon - min_lon >= 360.0:
+            min_lon, max_lon = -180.0, 180.0
+        else:
+            shift = np.floor((min_lon + 180.0) / 360.0) * 360.0
+            min_lon, max_lon = min_lon - shift, max_lon - shift
+        return (max(np.floor(min_lat / grid) * grid, -90.0), min(np.ceil(max_lat / grid) * grid, 90.0),
+                min_lon, max_lon)
+
+    def get(self, min_lat, max_lat, min_lon, max_lon, resolution='l'):
+        """
+        Returns the Miller projection Basemap for the given bounds and resolution, drawing into the cached axes.
+        """
+        bounds = tuple(float(value) for value in self.snap_bounds(min_lat, max_lat, min_lon, max_lon))
+        key = (bounds, resolution)
+        m = self.maps.get(key)
+        if m is not None:
+            self.maps.move_to_end(key)
+            return m
+
+        min_lat, max_lat, min_lon, max_lon = bounds
+        m = Basemap(projection='mill', llcrnrlat=min_lat, urcrnrlat=max_lat,
+                    llcrnrlon=min_lon, urcrnrlon=max_lon, resolution=resolution, ax=self.ax)
+        self.maps[key] = m
+        if len(self.maps) > self.max_maps:
+            self.maps.popitem(last=False)
+        return m
+
+class MapRenderer:
+    def __init__(self, figure=None, ax=None, parser=None, use_blitting=False):
+        """
+        Create a renderer drawing into the given matplotlib figure and axes.
+        Without a figure, an off-screen Agg figure is created.
+        With use_blitting, the static map background is rasterized once per extent and style,
+        and refresh() only draws the route, ring and label artists on top of it.
+        """
+        if figure is None:
+            figure = Figure(figsize=DEFAULT_FIGURE_SIZE)
+            FigureCanvasAgg(figure)
+        if ax is None:
+            ax = figure.add_subplot()
+        self.map_fig = figure
+        self.map_ax = ax
+
+        # Input parser, shared with the GUI if one is given
+        self.parser = parser if parser is not None else AirportInputParser()
+
+        # Cache of the distance ring geometry, so unchanged rings are not computed again on every redraw
+        self.ring_cache = RingGeometryCache()
+
+        # Cache of the projected Basemap instances of recently used map extents
+        self.basemap_cache = BasemapCache(self.map_ax)
+
+        # Cache of the projected points of great circles and rings, by leg or ring, sample spacing and map extent,
+        # so unchanged routes are not sampled and projected again on redraws
+        self.geometry_cache = GeometryCache()
+
+        # Adaptive sampling: maximum deviation of the drawn curves in pixels, and the resolution of the
+        # saved image (None: the resolution of the figure)
+        self.max_chord_error = MAX_CHORD_ERROR_PX
+        self.output_dpi = None
+
+        # Blitting state: the key (Basemap, style) of the drawn background, its cached raster
+        # with the figure size it was taken at, and the overlay artists drawn on top of it
+        self.use_blitting = use_blitting
+        self.background_key = None
+        self.background = None
+        self.background_bounds = None
+        self.overlay_artists = []
+        self.saving = False
+        if use_blitting:
+            self.map_fig.canvas.mpl_connect('draw_event', self._on_draw)
+
+        # Initialize the world map
+        self.draw_world_map()
+
+    def draw_world_map(self):
+        """
+        Draw the initial world map without any routes.
+        """
+        self.map_ax.clear()
+        self.background_key = None
+        self.background = None
+        self.overlay_artists = []
+        self.m = self.basemap_cache.get(*WORLD_BOUNDS, resolution='c')
+        # Set the figure background color to black
+        self.map_fig.patch.set_facecolor('black')
+
+        # Draw the map boundary with black fill
+        self.m.drawmapboundary(fill_color='black')
+
+        # Draw coastlines with white color
+        self.m.drawcoastlines(color='white')
+
+        # Fill continents and lakes with colors
+        self.m.fillcontinents(color='gray', lake_color='black')
+
+    def sample_great_circle(self, start, end, num_points=100):
+        """
+        Samples `num_points` along the great circle between two coordinates.
+        Uses the vectorized geometry engine for a single leg.
+        Returns two arrays: latitudes and longitudes of the sampled points.
+        """
+        lats, lons = sample_great_circle_arrays([start[0]], [start[1]], [end[0]], [end[1]], num_points)
+        return lats[0], lons[0]
+    
+    def calc_bounding_box(self, parsed_pairs, parsed_rings):
+        """
+        Function calculates the bounding box of all the great circles and distance rings, to zoom into the section of the map, that is showing them.
+        The bounds of the great circles are calculated analytically from the end points and vertices, the bounds of the
+        distance rings from their (cached) ellipsoidal points.
+        The longitude range is the shortest one covering everything, so routes across the Pacific are shown across the antimeridian,
+        in that case max_lon is greater than 180.
+        """
+        # Latitude ranges and longitude arcs of every great circle and distance ring
+        leg_bounds = great_circle_bounds(*pairs_to_endpoint_arrays(parsed_pairs))
+        # The ring bounds are taken from the ellipsoidal ring points, so rings passing near a pole are classified like they are drawn
+        ring_lats, ring_lons = self.ring_cache.generate_rings(parsed_rings, RING_BOUNDS_POINTS)
+        ring_bounds_ = ring_bounds([ring.startcoord.lat for ring in parsed_rings], [ring.startcoord.lon for ring in parsed_rings],
+                                   ring_lats, ring_lons)
+        min_lats, max_lats, lon_starts, lon_widths = (np.concatenate(values) for values in zip(leg_bounds, ring_bounds_))
+
+        # Determine the bounds with padding
+        min_lat = max(float(min_lats.min()) - BOUNDS_PADDING, -90)
+        max_lat = min(float(max_lats.max()) + BOUNDS_PADDING, 90)
+        min_lon, max_lon = minimal_longitude_range(lon_starts, lon_widths)
+        if max_lon - min_lon + 2 * BOUNDS_PADDING >= 360:
+            min_lon, max_lon = -180.0, 180.0
+        else:
+            min_lon, max_lon = min_lon - BOUNDS_PADDING, max_lon + BOUNDS_PADDING
+
+        return min_lat, max_lat, min_lon, max_lon
+
+    def project(self, lons, lats):
+        """
+        Project longitudes and latitudes to map coordinates. The longitudes are wrapped around the center
+        of the map first, so points east of the antimeridian land on a map across it.
+        """
+        center_lon = (self.m.llcrnrlon + self.m.urcrnrlon) / 2
+        return self.m(wrap_longitudes(lons, center_lon), lats)
+    
+    def plot_airports(self, parsed_pairs, parsed_rings):
+        """
+        Function plots the airport labels and a dot on every airport.
+        Ensures that each airport is plotted only once, even if it appears in multiple lists.
+        The dots are drawn as one scatter collection per color. Labels, that would overlap an already placed
+        label, are moved around their airport or left out. Hubs (the airports with the most legs) are labeled first.
+        """
+        # Collect every airport once with its position, color, preferred label side and number of legs
+        airports = {}
+        def add_airport(code, coord, color, side):
+            airport = airports.get(code)
+            if airport is None:
+                airport = airports[code] = [coord.lon, coord.lat, color, side, 0]
+            airport[4] += 1
+
+        for pair in parsed_pairs:
+            add_airport(pair.start_code, pair.startcoord, pair.color, 'right')
+            add_airport(pair.end_code, pair.endcoord, pair.color, 'left')
+        for ring in parsed_rings:
+            add_airport(ring.start_code, ring.startcoord, ring.color, 'right')
+        if not airports:
+            return
+
+        codes = list(airports)
+        values = list(airports.values())
+        x, y = self.project([value[0] for value in values], [value[1] for value in values])
+        x = np.atleast_1d(x)
+        y = np.atleast_1d(y)
+
+        # Plot the airport dots, one collection per color
+        airports_by_color = {}
+        for i, value in enumerate(values):
+            airports_by_color.setdefault(tuple(value[2]), []).append(i)
+        for color, indices in airports_by_color.items():
+            self.map_ax.scatter(x[indices], y[indices], s=AIRPORT_MARKER_SIZE**2, color=[color], linewidths=1, zorder=2)
+
+        # Screen positions of the airports, after the axes got their final (equal aspect) position
+        self.map_ax.apply_aspect()
+        screen = self.map_ax.transData.transform(np.column_stack((x, y)))
+        pixels_per_point = self.map_fig.dpi / 72
+        height = AIRPORT_LABEL_FONTSIZE * pixels_per_point
+        offset = AIRPORT_MARKER_SIZE * pixels_per_point
+        grid = LabelGrid(height)
+
+        # Text transforms, that move the labels above and below their marker
+        transforms = {side: offset_copy(self.map_ax.transData, fig=self.map_fig, y=shift * AIRPORT_MARKER_SIZE, units='points')
+                      for side, (ha, va, shift) in LABEL_POSITIONS.items() if shift}
+
+        # Place the labels of the hubs first, every label at the first free position
+        legs = np.array([value[4] for value in values])
+        for i in np.argsort(-legs, kind='stable'):
+            code = codes[i]
+            color, side = values[i][2], values[i][3]
+            sx, sy = screen[i]
+            width = len(code) * AIRPORT_LABEL_FONTSIZE * LABEL_CHARACTER_WIDTH * pixels_per_point
+            boxes = {
+                'right': (sx - width, sy, sx, sy + height),
+                'left': (sx, sy, sx + width, sy + height),
+                'above': (sx - width / 2, sy + offset, sx + width / 2, sy + offset + height),
+                'below': (sx - width / 2, sy - offset - height, sx + width / 2, sy - offset),
+            }
+            other_side = 'left' if side == 'right' else 'right'
+            for position in (side, other_side, 'above', 'below'):
+                if grid.place(boxes[position]):
+                    ha, va, shift = LABEL_POSITIONS[position]
+                    self.map_ax.text(x[i], y[i], code, fontsize=AIRPORT_LABEL_FONTSIZE, ha=ha, va=va, color=color,
+                                     transform=transforms.get(position, self.map_ax.transData))
+                    break
+
+    def plot_cities(self):
+        """
+        Plots markers and names of important world cities on the Basemap instance (self.m).
+        """
+        # List of major cities with their coordinates (latitude, longitude) and names
+        major_cities = [
+            {"name": "New York", "lat": 40.7128, "lon": -74.0060},
+            {"name": "London", "lat": 51.5074, "lon": -0.1278},
+            {"name": "Tokyo", "lat": 35.6895, "lon": 139.6917},
+            {"name": "Paris", "lat": 48.8566, "lon": 2.3522},
+            {"name": "Sydney", "lat": -33.8688, "lon": 151.2093},
+            {"name": "Moscow", "lat": 55.7558, "lon": 37.6176},
+            {"name": "Cairo", "lat": 30.0444, "lon": 31.2357},
+            {"name": "Beijing", "lat": 39.9042, "lon": 116.4074},
+            {"name": "Mumbai", "lat": 19.0760, "lon": 72.8777},
+            {"name": "Rio de Janeiro", "lat": -22.9068, "lon": -43.1729}
+        ]
+
+        # Define marker color in RGBA format
+        marker_color = (19.6/100, 64.3/100,80.8/100,1) # Custom color (dark blue-grey)
+
+        # Plot each city on the map
+        for city in major_cities:
+            # Convert city coordinates to map projection
+            x, y = self.project(city["lon"], city["lat"])
+            
+            # Plot a marker for the city
+            self.m.plot(x, y, marker='o', markersize=5, markerfacecolor=marker_color, markeredgewidth=0)
+            
+            # Add the city name next to the marker
+            self.map_ax.text(x, y, city["name"], fontsize=10, ha='right', color=marker_color)
+
+    def sample_spacing(self):
+        """
+        Returns the angular spacing in radians between the sample points of routes and rings on the current map,
+        so that their chords deviate at most self.max_chord_error pixels from the true curve.
+        """
+        width_px = self.map_ax.bbox.width
+        if self.output_dpi:
+            width_px *= self.output_dpi / self.map_fig.dpi
+        pixels_per_degree = max(width_px, 1.0) / (self.m.urcrnrlon - self.m.llcrnrlon)
+        return chord_error_spacing(self.max_chord_error, np.degrees(pixels_per_degree))
+
+    def split_segments(self, x, y, lengths):
+        """
+        Split projected lines at the map boundary, so points across the boundary are not connected.
+        x and y hold the points of all lines one after another, lengths the number of points of every line.
+        A line is split, wherever it jumps by more than half the map width or height between two points.
+        All lines are processed with array operations at once.
+        Returns the list of segments as (points, 2) arrays, as needed by a LineCollection.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if x.size == 0:
+            return []
+
+        # A segment starts at the first point of every line and after every large jump in x or y
+        starts = np.zeros(x.shape, dtype=bool)
+        starts[1:] = (np.abs(np.diff(x)) > self.m.xmax / 2) | (np.abs(np.diff(y)) > self.m.ymax / 2)
+        starts[np.cumsum(lengths) - lengths] = True
+
+        points = np.stack((x, y), axis=1)
+        return np.split(points, np.flatnonzero(starts)[1:])
+
+    def add_line_collections(self, x, y, lengths, colors, linewidth):
+        """
+        Draw the projected lines (flat points and the number of points of every line, see split_segments)
+        split at the map boundary, with one LineCollection for all lines of the same color.
+        """
+        lengths = np.asarray(lengths, dtype=np.int64)
+        lines_by_color = {}
+        for line, color in enumerate(colors):
+            lines_by_color.setdefault(tuple(color), []).append(line)
+
+        point_lines = np.repeat(np.arange(len(lengths)), lengths)
+        for color, lines in lines_by_color.items():
+            if len(lines) == len(lengths):
+                segments = self.split_segments(x, y, lengths)
+            else:
+                selected = np.isin(point_lines, lines)
+                segments = self.split_segments(x[selected], y[selected], lengths[lines])
+            # zorder 2 draws the lines above the continents, like plotted Line2D artists
+            self.map_ax.add_collection(LineCollection(segments, colors=[color], linewidths=linewidth, zorder=2), autolim=False)
+
+    def plot_distance_rings(self, distance_rings):
+        """
+        Plots the specified distance rings on the Basemap without connecting points across the map boundary.
+
+        Parameters:
+        distance_rings (list): List of DistanceRing objects to be plotted.
+        """
+        if not distance_rings:
+            return
+
+        # Number of points, so that the largest ring is smooth at the current map extent
+        num_points = ring_point_count([ring.startcoord.lat for ring in distance_rings],
+                                      [ring.distance for ring in distance_rings], self.sample_spacing())
+
+        # Draw all rings split at the map boundary
+        map_x, map_y = self.projected_rings(distance_rings, num_points)
+        self.add_line_collections(map_x, map_y, [num_points] * len(distance_rings), [ring.color for ring in distance_rings], 1.5)
+
+    def plot_enclosed_airports(self, distance_rings):
+        """
+        Plots a small dot on every airport inside the distance rings, that highlight their airports (e.g. 1000nm@KEWR+),
+        with one scatter collection per ring.
+        """
+        airports = self.parser.airports
+        for ring in distance_rings:
+            if ring.enclosed_rows is None or len(ring.enclosed_rows) == 0:
+                continue
+            x, y = self.project(airports.lon[ring.enclosed_rows], airports.lat[ring.enclosed_rows])
+            self.map_ax.scatter(x, y, s=ENCLOSED_MARKER_SIZE**2, color=[ring.color], linewidths=0, zorder=2)
+
+    def extent_key(self):
+        """
+        Returns the extent of the current map, which is part of the key of all cached projected geometry.
+        """
+        return (self.m.llcrnrlon, self.m.llcrnrlat, self.m.urcrnrlon, self.m.urcrnrlat)
+
+    def projected_rings(self, distance_rings, num_points):
+        """
+        Returns the points of all rings in map projection coordinates as flat x and y arrays, num_points per ring.
+        Rings missing from the geometry cache are taken from the ring cache and projected in one call.
+        """
+        extent = self.extent_key()
+        keys = [(RingGeometryCache.ring_key(ring, num_points), extent) for ring in distance_rings]
+        projected = {}
+        missing = {}
+        for key, ring in zip(keys, distance_rings):
+            if key in projected or key in missing:
+                continue
+            xy = self.geometry_cache.get(key)
+            if xy is None:
+                missing[key] = ring
+            else:
+                projected[key] = xy
+
+        if missing:
+            # Get the points from the ring cache, rings missing there are generated in one vectorized call
+            ring_lats, ring_lons = self.ring_cache.generate_rings(list(missing.values()), num_points)
+            map_x, map_y = self.project(ring_lons, ring_lats)
+            for i, key in enumerate(missing):
+                projected[key] = (map_x[i].copy(), map_y[i].copy())
+                self.geometry_cache.put(key, projected[key])
+
+        return (np.concatenate([projected[key][0] for key in keys]),
+                np.concatenate([projected[key][1] for key in keys]))
+
+    def projected_great_circles(self, parsed_pairs, spacing=None):
+        """
+        Returns the great circles of all pairs in map projection coordinates, as flat x and y arrays
+        and the number of points of every great circle. Every leg is sampled adaptively, with the given
+        angular spacing (default: see sample_spacing), so short legs only need a few points.
+        """
+        if spacing is None:
+            spacing = self.sample_spacing()
+
+        # Projected legs are cached by their end points, the spacing and the map extent
+        extent = self.extent_key()
+        keys = [(pair.startcoord.lat, pair.startcoord.lon, pair.endcoord.lat, pair.endcoord.lon, spacing, extent)
+                for pair in parsed_pairs]
+        cached = {}
+        for key in keys:
+            if key not in cached:
+                cached[key] = self.geometry_cache.get(key)
+
+        # Sample and project the great circles missing from the cache in one call each
+        missing = [key for key, xy in cached.items() if xy is None]
+        if missing:
+            start_lats, start_lons, end_lats, end_lons = np.array([key[:4] for key in missing], dtype=np.float64).T
+            lats, lons, lengths = sample_great_circle_adaptive(start_lats, start_lons, end_lats, end_lons, spacing)
+            missing_x, missing_y = self.project(lons, lats)
+            ends = np.cumsum(lengths)
+            for key, start, end in zip(missing, ends - lengths, ends):
+                cached[key] = (missing_x[start:end].copy(), missing_y[start:end].copy())
+                self.geometry_cache.put(key, cached[key])
+
+        projected = [cached[key] for key in keys]
+
+        lengths = np.array([len(x) for x, y in projected], dtype=np.int64)
+        return np.concatenate([x for x, y in projected]), np.concatenate([y for x, y in projected]), lengths
+
+    def plot_great_circles(self, parsed_pairs):
+        """
+        Function plots the great circles onto the map without connecting 
+        points across the map boundary in longitude and latitude.
+        """
+        if not parsed_pairs:
+            return
+
+        # Draw all great circles split at the map boundary, one LineCollection per color
+        x, y, lengths = self.projected_great_circles(parsed_pairs)
+        self.add_line_collections(x, y, lengths, [pair.color for pair in parsed_pairs], 2)
+
+    def plot_route_density(self, parsed_pairs, cmap=DEFAULT_DENSITY_CMAP, grid_size=DENSITY_GRID_SIZE):
+        """
+        Function plots the density of the great circles instead of the single lines, for very large route sets.
+        All sampled points of the great circles are binned into a grid over the projected map,
+        which is drawn as one mesh layer. The drawing cost depends on the grid size, not on the number of routes.
+        The layer is a QuadMesh and not an image, because matplotlib draws images during a full draw even if they are
+        animated, so with blitting a heatmap would end up in the cached background.
+        """
+        if not parsed_pairs:
+            return
+
+        # Sample the great circles with half a grid cell between the points, so every crossed cell is counted
+        spacing = np.radians((self.m.urcrnrlon - self.m.llcrnrlon) / grid_size) / 2
+        x, y, lengths = self.projected_great_circles(parsed_pairs, spacing)
+
+        # Grid over the map extent, with square cells of grid_size columns
+        width = self.m.urcrnrx - self.m.llcrnrx
+        height = self.m.urcrnry - self.m.llcrnry
+        columns = int(grid_size)
+        rows = max(1, int(round(grid_size * height / width)))
+
+        # Bin all points into the grid at once
+        column = np.floor((x - self.m.llcrnrx) / width * columns).astype(np.int64)
+        row = np.floor((y - self.m.llcrnry) / height * rows).astype(np.int64)
+        inside = (column >= 0) & (column < columns) & (row >= 0) & (row < rows)
+        counts = np.bincount(row[inside] * columns + column[inside], minlength=rows * columns).reshape(rows, columns)
+
+        # Logarithmic scale, so single routes stay visible next to the busiest corridors. Empty cells are transparent.
+        density = np.ma.masked_equal(np.log1p(counts), 0)
+        x_edges = np.linspace(self.m.llcrnrx, self.m.urcrnrx, columns + 1)
+        y_edges = np.linspace(self.m.llcrnry, self.m.urcrnry, rows + 1)
+        self.m.pcolormesh(x_edges, y_edges, density, cmap=cmap, alpha=0.8, zorder=2, shading='flat')
+
+    def render(self, parsed_pairs, parsed_rings, show_labels=True, show_country_lines=False, show_city_names=False,
+               route_style='lines', density_cmap=DEFAULT_DENSITY_CMAP):
+        """
+        Draws the great circles and distance rings into the figure
+        and adjusts the map boundaries to fit all great circles.
+        With route_style='density', the great circles are drawn as a density heatmap (see plot_route_density).
+        Returns False, if there was nothing to draw.
+        """
+        # If no valid pairs, skip updating
+        if not (parsed_pairs or parsed_rings):
+            return False
+
+        #Calculate the bounding box, in which all the distance rings and great circles are contained to zoom the map
+        min_lat, max_lat, min_lon, max_lon = self.calc_bounding_box(parsed_pairs, parsed_rings)
+
+        # Reset the map view with new bounds, recently used extents reuse their Basemap
+        self.m = self.basemap_cache.get(min_lat, max_lat, min_lon, max_lon, resolution='l')
+        background_key = (self.m, show_country_lines)
+
+        if self.use_blitting and background_key == self.background_key:
+            # The background is unchanged, only remove the previous routes, rings and labels
+            for artist in self.overlay_artists:
+                artist.remove()
+        else:
+            self.draw_background(show_country_lines)
+            self.background_key = background_key
+
+        # Remember the existing artists, everything added from here on is an overlay
+        background_artists = set(self.map_ax.get_children())
+
+        # Plot the great circles again after setting the new boundaries
+        if route_style == 'density':
+            self.plot_route_density(parsed_pairs, density_cmap)
+        else:
+            self.plot_great_circles(parsed_pairs)
+
+        #Plot the distance rings around the airport, and the highlighted airports inside of them
+        self.plot_distance_rings(parsed_rings)
+        self.plot_enclosed_airports(parsed_rings)
+
+        # Plot the airports, if desired
+        if show_labels:
+            #Optionally draw airport names
+            self.plot_airports(parsed_pairs, parsed_rings)
+
+        #Plot the city names, if that is desired
+        if show_city_names == True:
+            #Optionally draw city names of some known cities
+            self.plot_cities()
+
+        # Collect the overlay artists, with blitting they are only drawn on top of the cached background
+        self.overlay_artists = [artist for artist in self.map_ax.get_children() if artist not in background_artists]
+        if self.use_blitting:
+            for artist in self.overlay_artists:
+                artist.set_animated(True)
+
+        return True
+
+    def draw_background(self, show_country_lines=False):
+        """
+        Clear the axes and draw the static map background (boundary, coastlines, continents and country lines) of self.m.
+        """
+        self.map_ax.clear()
+        self.background = None
+        self.overlay_artists = []
+
+        # Set the figure background color to black
+        self.map_fig.patch.set_facecolor('black')
+
+        # Draw the map boundary with black fill
+        self.m.drawmapboundary(fill_color='black')
+
+        # Draw coastlines with white color
+        self.m.drawcoastlines(color='white')
+
+        # Fill continents and lakes with colors
+        self.m.fillcontinents(color='gray', lake_color='black')
+
+        #Draw the Country Lines, if desired
+        if show_country_lines == True:
+            # Optionally draw countries
+            self.m.drawcountries(color='lightgray')
+
+    def _on_draw(self, event):
+        """
+        Called after every full draw of the figure. The overlay artists are animated and therefore not part
+        of the full draw, so the rendered image is the pure background, which is cached before the overlays are drawn.
+        """
+        canvas = self.map_fig.canvas
+        if self.saving or event.canvas is not canvas:
+            return
+        self.background = canvas.copy_from_bbox(self.map_fig.bbox)
+        self.background_bounds = self.map_fig.bbox.bounds
+        self._draw_overlays()
+
+    def _draw_overlays(self):
+        """
+        Draw the overlay artists into the current canvas image, in the order of their z-order.
+        """
+        for artist in sorted(self.overlay_artists, key=lambda artist: artist.get_zorder()):
+            self.map_ax.draw_artist(artist)
+
+    def refresh(self):
+        """
+        Show the current map on the canvas.
+        With blitting, the cached background is restored and only the overlays are drawn on top.
+        The full figure is only drawn, if the background changed or the canvas was resized.
+        """
+        canvas = self.map_fig.canvas
+        if not self.use_blitting or self.background is None or self.background_bounds != self.map_fig.bbox.bounds:
+            canvas.draw()
+            return
+        canvas.restore_region(self.background)
+        self._draw_overlays()
+        canvas.blit(self.map_fig.bbox)
+
+    def cache_stats(self):
+        """
+        Returns the hit and miss counters and the memory of the projected geometry cache and the ring cache.
+        """
+        return {'geometry': self.geometry_cache.stats(), 'rings': self.ring_cache.rings.stats()}
+
+    def render_input(self, input_text, **options):
+        """
+        Parses the input text and draws it. The options are passed on to render().
+        Returns the CompiledInput of the text.
+        """
+        compiled = self.parser.compile_input(input_text.strip())
+        parsed_pairs, parsed_rings = self.parser.compiled_plot_data(compiled)
+        if not self.render(parsed_pairs, parsed_rings, **options):
+            self.draw_world_map()
+        return compiled
+
+    def save(self, output_path, dpi=DEFAULT_DPI):
+        """
+        Saves the figure to a file, the format (e.g. PNG or SVG) is taken from the file extension.
+        """
+        if not self.use_blitting:
+            self.map_fig.savefig(output_path, dpi=dpi, facecolor=self.map_fig.get_facecolor())
+            return
+
+        # Animated artists are not part of a saved figure, so the overlays are made regular artists while saving
+        for artist in self.overlay_artists:
+            artist.set_animated(False)
+        self.saving = True
+        try:
+            self.map_fig.savefig(output_path, dpi=dpi, facecolor=self.map_fig.get_facecolor())
+        finally:
+            for artist in self.overlay_artists:
+                artist.set_animated(True)
+            self.saving = False
+            # Saving redraws the canvas, possibly at another resolution
+            self.background = None
+
+    def render_file(self, input_path, output_path, dpi=DEFAULT_DPI, max_chord_error=None, **options):
+        """
+        Renders a .aerogcm file to an image file without a display.
+        The routes and rings are sampled for the resolution of the image, with at most max_chord_error pixels
+        deviation (default: self.max_chord_error).
+        Returns the CompiledInput of the file.
+        """
+        self.output_dpi = dpi
+        if max_chord_error is not None:
+            self.max_chord_error = max_chord_error
+        with open(input_path, 'r') as file:
+            compiled = self.render_input(file.read(), **options)
+        self.save(output_path, dpi)
+        return compiled
+
+# Renderer of the current worker process, kept warm between files by the pool initializer
+_worker_renderer = None
+_worker_options = None
+
+def _init_worker(options):
+    global _worker_renderer, _worker_options
+    _worker_renderer = MapRenderer()
+    _worker_options = options
+
+def _render_job(job):
+    input_path, output_path = job
+    dpi, options = _worker_options
+    try:
+        compiled = _worker_renderer.render_file(input_path, output_path, dpi, **options)
+        return input_path, output_path, [str(diagnostic) for diagnostic in compiled.diagnostics], None
+    except Exception as e:
+        return input_path, output_path, [], str(e)
+
+def render_directory(input_dir, output_dir, output_format='png', workers=1, dpi=DEFAULT_DPI, progress=None, **options):
+    """
+    Renders all .aerogcm files of a directory into output_dir, using a pool of worker processes.
+    Every worker keeps its renderer, airport index and map caches between files.
+    `progress` is called with (input path, output path, diagnostics, error) for every finished file.
+    Returns the number of successfully rendered files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = []
+    for input_path in sorted(glob.glob(os.path.join(input_dir, '*.aerogcm'))):
+        name = os.path.splitext(os.path.basename(input_path))[0]
+        jobs.append((input_path, os.path.join(output_dir, f"{name}.{output_format}")))
+
+    if workers > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(workers, len(jobs)), initializer=_init_worker, initargs=((dpi, options),))
+        results = pool.imap_unordered(_render_job, jobs)
+    else:
+        pool = None
+        _init_worker((dpi, options))
+        results = map(_render_job, jobs)
+
+    rendered = 0
+    try:
+        for result in results:
+            if progress is not None:
+                progress(*result)
+            if result[3] is None:
+                rendered += 1
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return rendered
+
+def main(argv=None):
+    """
+    Command line entry point of the headless map renderer.
+    """
+    argument_parser = argparse.ArgumentParser(description="Render AeroGCM files to images without the GUI.")
+    argument_parser.add_argument('input', nargs='?', help=".aerogcm file to render")
+    argument_parser.add_argument('-o', '--output', help="Output image file (PNG, SVG, ... by extension)")
+    argument_parser.add_argument('--batch', metavar='DIR', help="Render every .aerogcm file of a directory")
+    argument_parser.add_argument('--output-dir', help="Output directory of the batch mode (default: the input directory)")
+    argument_parser.add_argument('-f', '--format', default='png', help="Image format of the batch mode (png, svg, ...)")
+    argument_parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    argument_parser.add_argument('--dpi', type=int, default=DEFAULT_DPI, help="Resolution of raster images")
+    argument_parser.add_argument('--no-labels', action='store_true', help="Hide the airport identifiers")
+    argument_parser.add_argument('--country-lines', action='store_true', help="Draw the country lines")
+    argument_parser.add_argument('--city-names', action='store_true', help="Draw the names of major cities")
+    argument_parser.add_argument('--density', action='store_true', help="Draw the route density instead of single routes")
+    argument_parser.add_argument('--cmap', default=DEFAULT_DENSITY_CMAP, help="Matplotlib colormap of the route density")
+    argument_parser.add_argument('--max-chord-error', type=float, default=MAX_CHORD_ERROR_PX,
+                                 help="Maximum deviation in pixels of the drawn routes and rings from the true curves")
+    args = argument_parser.parse_args(argv)
+
+    options = {'show_labels': not args.no_labels, 'show_country_lines': args.country_lines,
+               'show_city_names': args.city_names, 'route_style': 'density' if args.density else 'lines',
+               'density_cmap': args.cmap, 'max_chord_error': args.max_chord_error}
+
+    if args.batch:
+        def progress(input_path, output_path, diagnostics, error):
+            if error is not None:
+                print(f"Failed to render {input_path}: {error}", file=sys.stderr)
+            else:
+                print(output_path)
+            for diagnostic in diagnostics:
+                print(f"{input_path}: {diagnostic}", file=sys.stderr)
+
+        rendered = render_directory(args.batch, args.output_dir or args.batch, args.format,
+                                    max(1, args.workers), args.dpi, progress, **options)
+        return 0 if rendered else 1
+
+    if not args.input:
+        argument_parser.error("an input file or --batch is required")
+    output = args.output or os.path.splitext(args.input)[0] + '.' + args.format
+    compiled = MapRenderer().render_file(args.input, output, args.dpi, **options)
+    for diagnostic in compiled.diagnostics:
+        print(f"{args.input}: {diagnostic}", file=sys.stderr)
+    return 0
+
+# Run the command line interface
+if __name__ == "__main__":
+    sys.exit(main())
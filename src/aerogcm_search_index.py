@@ -0,0 +1,406 @@
+""""
+AeroGCM - A Application to visualize and analyze flight routes
+    Copyright (C) 2025  MaxQ22
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+
+#Import numpy for the columnar posting lists
+import numpy as np
+
+#Import the shared airport index, whose text columns are indexed
+from aerogcm_airport_index import get_airport_index
+
+#Import the common cache directory
+from aerogcm_startup import aerogcm_cache_dir
+
+"""
+AirportSearchIndex
+------------------
+This module provides a prebuilt inverted index for the airport search by city, airport name, ICAO, IATA and country.
+Features:
+- Every word of the indexed fields is a term, the terms are sorted, so exact and prefix matches are one slice of the posting lists
+- A trigram index over the terms finds substring matches, and similar terms for misspelled queries (fuzzy matches)
+- Results are ranked exact > prefix > substring > fuzzy, then by field (code > city > name > country), with a top-k cutoff
+- The index is persisted next to the airport index cache and rebuilt only when airportsdata changes
+- Search-as-you-type: a query, that extends the previous one, is matched only against the previous matches
+"""
+
+# Version of the on-disk index layout. Increase it whenever the stored arrays change.
+SEARCH_INDEX_FORMAT_VERSION = 1
+
+# Indexed fields in the order of their rank, ICAO and IATA codes share the 'code' field
+SEARCH_FIELDS = ('code', 'city', 'name', 'country')
+
+# Match tiers in the order of their rank
+MATCH_TIERS = ('exact', 'prefix', 'substring', 'fuzzy')
+
+# Default number of returned search results
+SEARCH_RESULT_LIMIT = 100
+
+# Minimum length of a query word for substring and fuzzy matches
+MIN_SUBSTRING_LENGTH = 3
+MIN_FUZZY_LENGTH = 4
+
+# Share of the trigrams of a query word, that a term must contain to be a fuzzy match
+FUZZY_TRIGRAM_SHARE = 0.5
+
+# Maximum number of previous matches, that a refined query is matched against, larger sets are searched in the whole index
+MAX_REFINED_MATCHES = 500
+
+# Score of rows, that do not match a query word
+NO_MATCH = np.iinfo(np.int32).max // 4
+
+def normalize_text(text):
+    """
+    Lower case the text and strip accents, so 'Zürich' is found as 'zurich'.
+    """
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(character for character in text if not unicodedata.combining(character))
+
+def text_words(text):
+    """
+    Returns the normalized words of a text.
+    """
+    return re.findall(r'[a-z0-9]+', normalize_text(text))
+
+def _trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+def _ranges(starts, ends):
+    """
+    Expand the ranges [start, end) into one index array without a Python loop.
+    """
+    counts = ends - starts
+    if counts.sum() == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+class SearchMatches:
+    """
+    All airport rows matching a query, with their ranking keys (lower is better).
+    fuzzy is True, if a word of the query only matched misspelled terms.
+    """
+    def __init__(self, words, rows, keys, fuzzy=False):
+        self.words = words
+        self.rows = rows
+        self.keys = keys
+        self.fuzzy = fuzzy
+
+    def __len__(self):
+        return len(self.rows)
+
+    def refines(self, words):
+        """
+        Returns True, if every match of the given query words is a match of these words as well:
+        The query has at least as many words, and every word contains the word at the same position here
+        (words shorter than MIN_SUBSTRING_LENGTH only match prefixes, so they must start with it).
+        Fuzzy matches and empty results are never refined, as a more specific query can find other fuzzy matches.
+        """
+        if self.fuzzy or len(self.rows) == 0 or len(words) < len(self.words):
+            return False
+        for previous, word in zip(self.words, words):
+            if len(previous) < MIN_SUBSTRING_LENGTH:
+                if len(word) >= MIN_SUBSTRING_LENGTH or not word.startswith(previous):
+                    return False
+            elif previous not in word:
+                return False
+        return True
+
+class AirportSearchIndex:
+    def __init__(self, arrays, airports=None):
+        """
+        Create the index from a dict of arrays.
+        Use AirportSearchIndex.build() or get_search_index() instead of calling this directly.
+        """
+        self.airports = airports if airports is not None else get_airport_index()
+        self.terms = arrays['terms']
+        self.term_offsets = arrays['term_offsets']
+        self.posting_rows = arrays['posting_rows']
+        self.posting_fields = arrays['posting_fields']
+        self.trigrams = arrays['trigrams']
+        self.trigram_offsets = arrays['trigram_offsets']
+        self.trigram_terms = arrays['trigram_terms']
+
+        # Airports with an IATA code are usually the larger ones and are ranked first among equal matches
+        self.no_iata = (self.airports.iata == '').astype(np.int32)
+
+        # Postings by airport row, to match queries against a few candidate rows (created on first use)
+        self.row_offsets = None
+        self.row_postings = None
+        self.posting_terms = None
+
+    @classmethod
+    def build(cls, airports=None):
+        """
+        Build the index from the text columns of the airport index.
+        """
+        airports = airports if airports is not None else get_airport_index()
+        postings = set()
+        columns = (('code', [code.lower() for code in airports.icao.tolist()]),
+                   ('code', [code.lower() for code in airports.iata.tolist()]))
+        for field, values in columns:
+            field_id = SEARCH_FIELDS.index(field)
+            postings.update((value, row, field_id) for row, value in enumerate(values) if value)
+
+        # Interned text columns: the words of every unique value are only extracted once
+        for field, column in (('city', 'city'), ('name', 'name'), ('country', 'country')):
+            field_id = SEARCH_FIELDS.index(field)
+            value_words = [text_words(value) for value in getattr(airports, column + '_values').tolist()]
+            for row, value_id in enumerate(getattr(airports, column + '_ids').tolist()):
+                postings.update((word, row, field_id) for word in value_words[value_id])
+
+        # Sort the postings by term, so the postings of a term and of a term prefix are one slice
+        postings = sorted(postings)
+        posting_terms = [term for term, row, field in postings]
+        terms, first = np.unique(np.array(posting_terms, dtype=str), return_index=True)
+        term_offsets = np.append(first, len(postings)).astype(np.int64)
+
+        # Trigram -> term ids, for substring and fuzzy matches
+        trigram_postings = sorted((trigram, term_id) for term_id, term in enumerate(terms.tolist()) for trigram in _trigrams(term))
+        trigrams, trigram_first = np.unique(np.array([trigram for trigram, term_id in trigram_postings], dtype=str),
+                                            return_index=True)
+        arrays = {
+            'terms': terms,
+            'term_offsets': term_offsets,
+            'posting_rows': np.array([row for term, row, field in postings], dtype=np.int32),
+            'posting_fields': np.array([field for term, row, field in postings], dtype=np.int8),
+            'trigrams': trigrams,
+            'trigram_offsets': np.append(trigram_first, len(trigram_postings)).astype(np.int64),
+            'trigram_terms': np.array([term_id for trigram, term_id in trigram_postings], dtype=np.int32),
+        }
+        return cls(arrays, airports)
+
+    @staticmethod
+    def cache_path(airports, cache_dir=None):
+        """
+        Returns the cache file of the index for the airportsdata version of the airport index.
+        """
+        if cache_dir is None:
+            cache_dir = aerogcm_cache_dir()
+        return os.path.join(cache_dir, f"airport_search_v{SEARCH_INDEX_FORMAT_VERSION}_{airports.version}.npz")
+
+    def save(self, cache_dir=None):
+        """
+        Write the index to its versioned cache file, through a temporary file, that is moved in place.
+        """
+        path = self.cache_path(self.airports, cache_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(prefix='.airport_search_', suffix='.npz', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                np.savez(file, terms=self.terms, term_offsets=self.term_offsets, posting_rows=self.posting_rows,
+                         posting_fields=self.posting_fields, trigrams=self.trigrams,
+                         trigram_offsets=self.trigram_offsets, trigram_terms=self.trigram_terms)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, airports=None, cache_dir=None):
+        """
+        Load the index from its cache file. Returns None, if there is no valid cache for the airport index.
+        """
+        airports = airports if airports is not None else get_airport_index()
+        try:
+            with np.load(cls.cache_path(airports, cache_dir)) as file:
+                arrays = {name: file[name] for name in file.files}
+            index = cls(arrays, airports)
+        except (OSError, ValueError, KeyError):
+            return None
+        if len(index.posting_rows) and index.posting_rows.max() >= len(airports):
+            return None
+        return index
+
+    def _prefix_range(self, prefix):
+        start = np.searchsorted(self.terms, prefix, side='left')
+        end = np.searchsorted(self.terms, prefix + '\uffff', side='left')
+        return int(start), int(end)
+
+    def _trigram_terms(self, trigram):
+        i = int(np.searchsorted(self.trigrams, trigram))
+        if i < len(self.trigrams) and self.trigrams[i] == trigram:
+            return self.trigram_terms[self.trigram_offsets[i]:self.trigram_offsets[i + 1]]
+        return np.empty(0, dtype=np.int32)
+
+    def _word_terms(self, word):
+        """
+        Returns the term ids matching a query word, their tier (index into MATCH_TIERS),
+        and whether the terms are fuzzy matches.
+        """
+        start, end = self._prefix_range(word)
+        term_ids = [np.arange(start, end)]
+        tiers = [np.where(self.terms[start:end] == word, 0, 1)]
+
+        if len(word) >= MIN_SUBSTRING_LENGTH:
+            # Terms containing all trigrams of the word, verified to contain the word
+            trigram_terms = [self._trigram_terms(trigram) for trigram in _trigrams(word)]
+            candidates = trigram_terms[0]
+            for other in trigram_terms[1:]:
+                candidates = np.intersect1d(candidates, other, assume_unique=True)
+            candidates = np.array([term_id for term_id in candidates.tolist()
+                                   if not start <= term_id < end and word in self.terms[term_id]], dtype=np.int64)
+            term_ids.append(candidates)
+            tiers.append(np.full(len(candidates), 2))
+
+            # Fuzzy matches only for words, that have no other match
+            if len(word) >= MIN_FUZZY_LENGTH and end == start and len(candidates) == 0:
+                counts = np.bincount(np.concatenate(trigram_terms), minlength=len(self.terms))
+                needed = max(2, int(np.ceil(FUZZY_TRIGRAM_SHARE * len(trigram_terms))))
+                fuzzy = np.flatnonzero(counts >= needed)
+                return fuzzy, np.full(len(fuzzy), 3), True
+
+        return np.concatenate(term_ids), np.concatenate(tiers), False
+
+    def _word_scores(self, word):
+        """
+        Returns the best score (tier * number of fields + field) of every airport row for a query word,
+        and whether the word only matched fuzzy.
+        """
+        term_ids, tiers, fuzzy = self._word_terms(word)
+        postings = _ranges(self.term_offsets[term_ids], self.term_offsets[term_ids + 1])
+        posting_tiers = np.repeat(tiers, self.term_offsets[term_ids + 1] - self.term_offsets[term_ids])
+        scores = np.full(len(self.airports), NO_MATCH, dtype=np.int32)
+        np.minimum.at(scores, self.posting_rows[postings],
+                      (posting_tiers * len(SEARCH_FIELDS) + self.posting_fields[postings]).astype(np.int32))
+        return scores, fuzzy
+
+    def _ranked(self, words, rows, scores, fuzzy):
+        """
+        Returns the SearchMatches of the rows with a score for every word. Rows are ranked by their score,
+        then airports with an IATA code first.
+        """
+        matching = scores < NO_MATCH
+        rows = rows[matching]
+        return SearchMatches(words, rows, scores[matching] * 2 + self.no_iata[rows], fuzzy)
+
+    def match(self, query):
+        """
+        Returns the SearchMatches of all airports matching all words of the query.
+        """
+        words = text_words(query)
+        if not words:
+            return SearchMatches(words, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+        # Every word has to match, the score of a row is the sum of the scores of its words
+        scores = np.zeros(len(self.airports), dtype=np.int64)
+        any_fuzzy = False
+        for word in words:
+            word_scores, fuzzy = self._word_scores(word)
+            scores += word_scores
+            any_fuzzy = any_fuzzy or fuzzy
+        return self._ranked(words, np.arange(len(self.airports)), scores, any_fuzzy)
+
+    def _row_index(self):
+        """
+        Create the postings by airport row on first use.
+        """
+        if self.row_offsets is None:
+            self.posting_terms = np.repeat(np.arange(len(self.terms)), np.diff(self.term_offsets))
+            self.row_postings = np.argsort(self.posting_rows, kind='stable')
+            self.row_offsets = np.searchsorted(self.posting_rows[self.row_postings], np.arange(len(self.airports) + 1))
+
+    def refine(self, previous, query):
+        """
+        Returns the SearchMatches of the query, using the SearchMatches of a previous query to narrow the search.
+        If the query extends the previous one (e.g. 'fra' -> 'fran'), only the terms of the previous matches are
+        compared with the query words, otherwise (or if nothing matches anymore) the whole index is searched.
+        """
+        words = text_words(query)
+        if previous is None or len(previous) > MAX_REFINED_MATCHES or not previous.refines(words):
+            return self.match(query)
+
+        # All postings of the previous matches
+        self._row_index()
+        rows = previous.rows
+        counts = self.row_offsets[rows + 1] - self.row_offsets[rows]
+        postings = self.row_postings[_ranges(self.row_offsets[rows], self.row_offsets[rows + 1])]
+        candidates = np.repeat(np.arange(len(rows)), counts)
+        terms = self.terms[self.posting_terms[postings]]
+        fields = self.posting_fields[postings].astype(np.int64)
+
+        scores = np.zeros(len(rows), dtype=np.int64)
+        for word in words:
+            exact = terms == word
+            prefix = np.char.startswith(terms, word)
+            substring = np.char.find(terms, word) >= 0 if len(word) >= MIN_SUBSTRING_LENGTH else prefix
+            tiers = np.select([exact, prefix, substring], [0, 1, 2], default=-1)
+            matched = tiers >= 0
+            word_scores = np.full(len(rows), NO_MATCH, dtype=np.int64)
+            np.minimum.at(word_scores, candidates[matched], tiers[matched] * len(SEARCH_FIELDS) + fields[matched])
+            scores += word_scores
+
+        matches = self._ranked(words, rows, scores, False)
+        if len(matches) == 0:
+            # The query may still have fuzzy matches outside of the previous matches
+            return self.match(query)
+        return matches
+
+    def top(self, matches, k=SEARCH_RESULT_LIMIT):
+        """
+        Returns the rows of the best k of the SearchMatches, best first.
+        Only the top k rows are sorted, larger result sets are never fully ranked.
+        """
+        rows, keys = matches.rows, matches.keys
+        if len(rows) > k:
+            top = np.argpartition(keys, k - 1)[:k]
+            rows, keys = rows[top], keys[top]
+        return rows[np.lexsort((rows, keys))]
+
+    def search(self, query, k=SEARCH_RESULT_LIMIT):
+        """
+        Search the airports for all words of the query.
+        Returns the airport rows of the best k matches (best first) and the total number of matching airports.
+        """
+        matches = self.match(query)
+        return self.top(matches, k), len(matches)
+
+    def search_records(self, query, k=SEARCH_RESULT_LIMIT):
+        """
+        Returns (airport name, ICAO code, city, country) tuples of the best k matches, and the total number of matches.
+        """
+        rows, total = self.search(query, k)
+        return [(self.airports.text('name', row), str(self.airports.icao[row]), self.airports.text('city', row),
+                 self.airports.text('country', row)) for row in rows.tolist()], total
+
+# Process-wide search index, created on first use
+_search_index = None
+_search_index_lock = threading.Lock()
+
+def get_search_index():
+    """
+    Returns the process-wide AirportSearchIndex.
+    On the first call the cache is loaded, or built and written if it is missing or outdated.
+    """
+    global _search_index
+    if _search_index is None:
+        with _search_index_lock:
+            if _search_index is None:
+                index = AirportSearchIndex.load()
+                if index is None:
+                    index = AirportSearchIndex.build()
+                    try:
+                        index.save()
+                    except OSError as e:
+                        print(f"Could not write the airport search index cache: {e}")
+                _search_index = index
+    return _search_index
@@ -0,0 +1,203 @@
+""""
+AeroGCM - A Application to visualize and analyze flight routes
+    Copyright (C) 2025  MaxQ22
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import threading
+
+#Import numpy for the vectorized cell and distance calculations
+import numpy as np
+
+#Import the shared airport index, whose unit vectors are indexed
+from aerogcm_airport_index import get_airport_index
+
+#Import the unit vector conversion and the Earth radius of the geometry engine
+from aerogcm_geometry import latlon_to_unit_vectors, EARTH_RADIUS_KM
+
+"""
+AirportSpatialIndex
+------------------
+This module provides a spatial index over the unit vectors of all airports of the airport index.
+Features:
+- Cube-face grid: every airport is stored in one cell of a grid on the six faces of a cube around the globe
+- Radius queries (which airports are within 1000nm of KEWR?) only test the airports of the cells overlapping the search cap
+- k-nearest queries (which airport is nearest to a coordinate?) by growing the search radius
+- Distances are great circle distances on the sphere (R=6371 km), like the spherical distance model
+"""
+
+# Number of grid cells along each edge of a cube face
+SPATIAL_CELLS_PER_FACE = 32
+
+# Axes of the six cube faces: (normal, u axis, v axis)
+CUBE_FACES = np.array([
+    [[1, 0, 0], [0, 1, 0], [0, 0, 1]],
+    [[-1, 0, 0], [0, -1, 0], [0, 0, 1]],
+    [[0, 1, 0], [-1, 0, 0], [0, 0, 1]],
+    [[0, -1, 0], [1, 0, 0], [0, 0, 1]],
+    [[0, 0, 1], [0, 1, 0], [-1, 0, 0]],
+    [[0, 0, -1], [0, 1, 0], [1, 0, 0]],
+], dtype=np.float64)
+
+def _cube_cells(vectors, cells_per_face):
+    """
+    Returns the cube-face grid cell of every unit vector of shape (n, 3).
+    The face is picked by the largest component, the cell by the gnomonic (u, v) coordinates on that face.
+    """
+    normals = CUBE_FACES[:, 0]
+    faces = np.argmax(vectors @ normals.T, axis=1)
+    axes = CUBE_FACES[faces]
+    depth = np.einsum('ij,ij->i', vectors, axes[:, 0])
+    u = np.einsum('ij,ij->i', vectors, axes[:, 1]) / depth
+    v = np.einsum('ij,ij->i', vectors, axes[:, 2]) / depth
+    column = np.clip(((u + 1) / 2 * cells_per_face).astype(np.int64), 0, cells_per_face - 1)
+    row = np.clip(((v + 1) / 2 * cells_per_face).astype(np.int64), 0, cells_per_face - 1)
+    return (faces * cells_per_face + row) * cells_per_face + column
+
+def _cell_geometry(cells_per_face):
+    """
+    Returns the center unit vector of every grid cell, and the angle in radians from the center to its farthest corner.
+    The cell edges are great circles, so every point of a cell lies within that angle of its center.
+    """
+    edges = np.linspace(-1.0, 1.0, cells_per_face + 1)
+    centers = (edges[:-1] + edges[1:]) / 2
+    cell_centers = []
+    cell_radii = []
+    for normal, u_axis, v_axis in CUBE_FACES:
+        v, u = np.meshgrid(centers, centers, indexing='ij')
+        center = normal + u[..., None] * u_axis + v[..., None] * v_axis
+        center /= np.linalg.norm(center, axis=-1, keepdims=True)
+        radius = np.zeros(u.shape)
+        for du in (edges[:-1], edges[1:]):
+            for dv in (edges[:-1], edges[1:]):
+                dv_grid, du_grid = np.meshgrid(dv, du, indexing='ij')
+                corner = normal + du_grid[..., None] * u_axis + dv_grid[..., None] * v_axis
+                corner /= np.linalg.norm(corner, axis=-1, keepdims=True)
+                angle = np.arccos(np.clip(np.einsum('...i,...i->...', center, corner), -1.0, 1.0))
+                radius = np.maximum(radius, angle)
+        cell_centers.append(center.reshape(-1, 3))
+        cell_radii.append(radius.ravel())
+    return np.concatenate(cell_centers), np.concatenate(cell_radii)
+
+class AirportSpatialIndex:
+    def __init__(self, airports=None, cells_per_face=SPATIAL_CELLS_PER_FACE):
+        """
+        Build the index over the unit vectors of the given AirportIndex (default: the process-wide index).
+        Use get_spatial_index() to share one index in the process.
+        """
+        self.airports = airports if airports is not None else get_airport_index()
+        self.cells_per_face = cells_per_face
+        self.unit_vectors = np.ascontiguousarray(self.airports.unit_vectors, dtype=np.float64)
+
+        # The airport rows sorted by their cell, and the offset of every cell into them (CSR layout)
+        cells = _cube_cells(self.unit_vectors, cells_per_face)
+        self.rows = np.argsort(cells, kind='stable')
+        self.cell_offsets = np.searchsorted(cells[self.rows], np.arange(6 * cells_per_face**2 + 1))
+        self.cell_centers, self.cell_radii = _cell_geometry(cells_per_face)
+
+        # Sorted unit vectors, so the candidates of neighbouring cells are read from contiguous memory
+        self.sorted_vectors = self.unit_vectors[self.rows]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _candidate_runs(self, vector, angle):
+        """
+        Returns the start and end positions (into self.rows) of the runs of airports in the cells, that overlap
+        the cap of the given angle. Cells, whose bounding circle does not reach the cap, are pruned as a whole.
+        Neighbouring cells of a face row are contiguous in the sorted layout, so they are merged into one run.
+        """
+        cell_angles = np.arccos(np.clip(self.cell_centers @ vector, -1.0, 1.0))
+        cells = np.flatnonzero(cell_angles <= angle + self.cell_radii)
+        if len(cells) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        starts = self.cell_offsets[cells]
+        ends = self.cell_offsets[cells + 1]
+        run_heads = np.ones(len(cells), dtype=bool)
+        run_heads[1:] = starts[1:] != ends[:-1]
+        heads = np.flatnonzero(run_heads)
+        starts = starts[heads]
+        ends = ends[np.append(heads[1:] - 1, len(cells) - 1)]
+        non_empty = ends > starts
+        return starts[non_empty], ends[non_empty]
+
+    def within_radius(self, lat, lon, radius_km, sort=True):
+        """
+        Returns the rows of all airports within radius_km of the coordinate, and their distances in km.
+        With sort, the airports are sorted by their distance.
+        """
+        vector = latlon_to_unit_vectors(lat, lon)
+        angle = min(max(radius_km, 0.0) / EARTH_RADIUS_KM, np.pi)
+        starts, ends = self._candidate_runs(vector, angle)
+        if len(starts) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        # The dot products are calculated on contiguous slices of the sorted vectors, without gathering them first
+        runs = list(zip(starts.tolist(), ends.tolist()))
+        dots = np.concatenate([self.sorted_vectors[start:end] @ vector for start, end in runs])
+        positions = np.concatenate([np.arange(start, end) for start, end in runs])
+        inside = dots >= np.cos(angle)
+        positions = positions[inside]
+        distances = np.arccos(np.clip(dots[inside], -1.0, 1.0)) * EARTH_RADIUS_KM
+        if sort:
+            # Equal distances are practically impossible, so the faster unstable sort is used
+            order = np.argsort(distances)
+            positions, distances = positions[order], distances[order]
+        return self.rows[positions], distances
+
+    def nearest(self, lat, lon, k=1):
+        """
+        Returns the rows of the k airports nearest to the coordinate, and their distances in km, nearest first.
+        The search radius starts at the size, which holds k airports at the average airport density,
+        and is doubled until k airports are found.
+        """
+        k = min(int(k), len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        # A cap of angle a covers the fraction (1 - cos(a)) / 2 of the sphere
+        angle = np.arccos(1.0 - 2.0 * k / len(self))
+        while True:
+            rows, distances = self.within_radius(lat, lon, angle * EARTH_RADIUS_KM)
+            if len(rows) >= k or angle >= np.pi:
+                return rows[:k], distances[:k]
+            angle = min(angle * 2, np.pi)
+
+    def within_radius_codes(self, lat, lon, radius_km):
+        """
+        Returns a list of (ICAO code, distance in km) of all airports within radius_km of the coordinate, nearest first.
+        """
+        rows, distances = self.within_radius(lat, lon, radius_km)
+        return list(zip(self.airports.icao[rows].tolist(), distances.tolist()))
+
+    def nearest_codes(self, lat, lon, k=1):
+        """
+        Returns a list of (ICAO code, distance in km) of the k airports nearest to the coordinate.
+        """
+        rows, distances = self.nearest(lat, lon, k)
+        return list(zip(self.airports.icao[rows].tolist(), distances.tolist()))
+
+# Process-wide spatial index, created on first use
+_spatial_index = None
+_spatial_index_lock = threading.Lock()
+
+def get_spatial_index():
+    """
+    Returns the process-wide AirportSpatialIndex over the process-wide airport index.
+    """
+    global _spatial_index
+    if _spatial_index is None:
+        with _spatial_index_lock:
+            if _spatial_index is None:
+                _spatial_index = AirportSpatialIndex()
+    return _spatial_index
@@ -0,0 +1,109 @@
+""""
+AeroGCM - A Application to visualize and analyze flight routes
+    Copyright (C) 2025  MaxQ22
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+"""
+AeroGCM Startup
+------------------
+This module is imported first by the AeroGCM entry point and only uses the standard library.
+Features:
+- Common paths (cache directory, data directory, bundled resources), available without loading any heavy module
+- A startup profile, that breaks down the cold start into imports, data load and first render
+  The report is printed when the environment variable AEROGCM_STARTUP_PROFILE is set.
+"""
+
+def aerogcm_cache_dir():
+    """
+    Returns the directory used for AeroGCM caches.
+    It can be overridden with the AEROGCM_CACHE_DIR environment variable.
+    """
+    cache_dir = os.environ.get('AEROGCM_CACHE_DIR')
+    if not cache_dir:
+        cache_dir = os.path.join(os.path.expanduser('~'), '.aerogcm', 'cache')
+    return cache_dir
+
+def aerogcm_data_dir():
+    """
+    Returns the directory used for AeroGCM user data (e.g. the flight log).
+    It can be overridden with the AEROGCM_DATA_DIR environment variable.
+    """
+    data_dir = os.environ.get('AEROGCM_DATA_DIR')
+    if not data_dir:
+        data_dir = os.path.join(os.path.expanduser('~'), '.aerogcm')
+    return data_dir
+
+def resource_path(name):
+    """
+    Returns the path of a bundled resource file (e.g. the icon), also inside the PyInstaller executable.
+    """
+    if hasattr(sys, '_MEIPASS'):
+        return os.path.join(sys._MEIPASS, name)
+    return os.path.join('.', name)
+
+class StartupProfile:
+    """
+    Collects the duration of the startup phases and the time of startup milestones.
+    """
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.phases = []  # List of (name, duration in s)
+        self.milestones = []  # List of (name, time since start in s)
+        self.reported = False
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Context manager measuring the duration of one startup phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def mark(self, name):
+        """
+        Record a milestone (e.g. 'window shown') relative to the start of the profile.
+        """
+        self.milestones.append((name, time.perf_counter() - self.start_time))
+
+    def report(self):
+        """
+        Returns the startup timing report as text.
+        """
+        lines = ["AeroGCM startup profile:"]
+        for name, duration in self.phases:
+            lines.append(f"  {name:<24}{duration * 1000:9.1f} ms")
+        for name, elapsed in self.milestones:
+            lines.append(f"  @ {name:<22}{elapsed * 1000:9.1f} ms after start")
+        return '\n'.join(lines)
+
+    def print_report(self):
+        """
+        Print the report once, if the AEROGCM_STARTUP_PROFILE environment variable is set.
+        """
+        if os.environ.get('AEROGCM_STARTUP_PROFILE') and not self.reported:
+            self.reported = True
+            print(self.report())
+
+# Process-wide startup profile, started when the entry point imports this module
+startup_profile = StartupProfile()
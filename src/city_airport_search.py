@@ -17,6 +17,7 @@ AeroGCM - Flight Logger
 """
 
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from kivy.clock import Clock
 from kivy.uix.popup import Popup
 from kivy.uix.boxlayout import BoxLayout
@@ -25,19 +26,29 @@ from kivy.uix.button import Button
 from kivy.uix.label import Label
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.gridlayout import GridLayout
-import airportsdata
+from aerogcm_airport_index import get_airport_index
+from aerogcm_search_index import get_search_index, SEARCH_RESULT_LIMIT
 
 """
 CityAirportSearch
 ------------------
-This module provides a Kivy Popup dialog for searching airports by city name.
+This module provides a Kivy Popup dialog for searching airports by city, airport name, ICAO/IATA code or country.
 Features:
-- User can enter a city name (partial matches allowed)
-- Results are shown in a scrollable table with airport name and identifier
+- User can enter a search phrase (partial and misspelled words allowed)
+- Searches run on a prebuilt inverted index, the best matches are shown first
+- Search-as-you-type: every change of the phrase starts a search on a worker thread, superseded searches are discarded
+- A phrase, that extends the previous one (e.g. 'fra' -> 'fran'), is only matched against the previous matches
+- Results are shown in a scrollable table with airport name and identifier, added page by page on the UI thread
 - Clicking an identifier inserts it into the main ICAO/IATA input field
 - Entry field is focused when popup opens, and pressing Enter triggers search
 """
 
+# Number of result rows added to the table per frame
+RESULT_PAGE_SIZE = 20
+
+# Number of worker threads for the searches. With one worker, the searches run in order and share the refinement state.
+SEARCH_WORKERS = 1
+
 # Main class for the city airport search popup
 class CityAirportSearch(Popup):
     def __init__(self, main_layout, **kwargs):
@@ -53,16 +64,31 @@ class CityAirportSearch(Popup):
         # Main vertical layout for the popup
         layout = BoxLayout(orientation='vertical', spacing=10, padding=10)
 
-        # Load airports database once for performance
-        self.airports = airportsdata.load('ICAO')
+        # Use the shared airport index, which is loaded only once per process.
+        # The search index is loaded by the first search on the worker thread, so opening the popup never waits for it.
+        self.airports = get_airport_index()
+        self.search_index = None
+
+        # Maximum number of shown search results
+        self.result_limit = SEARCH_RESULT_LIMIT
 
-        # TextInput for city name entry
+        # Search state: the generation of the newest search (older results are discarded), the worker pool,
+        # the future of the newest search, the matches of the previous search (only used on the worker thread)
+        # and the event adding the next page of results
+        self.search_generation = 0
+        self.search_executor = None
+        self.pending_search = None
+        self.previous_matches = None
+        self.page_event = None
+
+        # TextInput for the search phrase, every change starts a new search
         self.search_input = TextInput(
-            hint_text="Enter city name",
+            hint_text="Enter city, airport name, ICAO/IATA code or country",
             multiline=False,
             size_hint_y=None,
             height=40
         )
+        self.search_input.bind(text=self.on_search_text)
         layout.add_widget(self.search_input)
 
         # Button to trigger airport search
@@ -92,71 +118,120 @@ class CityAirportSearch(Popup):
         """
         Called when the popup is opened.
         Sets focus to the entry field and binds Enter key to search.
+        Starts loading the search index in the background.
         """
         super().on_open()
         self.search_input.focus = True
         self.search_input.bind(on_text_validate=self.search_airports)
+        self._executor().submit(self._load_search_index)
 
-    def search_airports(self, *args):
+    def on_dismiss(self):
         """
-        Search for airports matching the entered city name (partial matches allowed).
-        Populates the table with airport name and identifier.
+        Called when the popup is closed. Discards running searches and stops the worker pool.
         """
-        city_name = self.search_input.text.strip().lower()
-        self.table_layout.clear_widgets()
-        # Add table headers
-        self.table_layout.add_widget(Label(text="Airport Name", bold=True, size_hint_y=None, height=30))
-        self.table_layout.add_widget(Label(text="Identifier", bold=True, size_hint_y=None, height=30))
-
-        airports = airportsdata.load('ICAO')
-        found = []
-        # Search for airports where the city name contains the entered phrase
-        for ident, data in airports.items():
-            city = data.get('city', '').lower()
-            if city_name in city:
-                found.append((data.get('name', ''), ident))
+        self.search_generation += 1
+        if self.page_event is not None:
+            self.page_event.cancel()
+        if self.search_executor is not None:
+            self.search_executor.shutdown(wait=False, cancel_futures=True)
+            self.search_executor = None
+        return super().on_dismiss()
+
+    def _executor(self):
+        if self.search_executor is None:
+            self.search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix='aerogcm-search')
+        return self.search_executor
+
+    def _load_search_index(self):
+        if self.search_index is None:
+            self.search_index = get_search_index()
+        return self.search_index
+
+    def on_search_text(self, instance, text):
+        """
+        Search as you type.
+        """
+        self.search_airports()
 
-        if not found:
-            self.info_label.text = "No airports found for this city."
+    def search_airports(self, *args):
+        """
+        Search for airports matching the entered phrase (partial matches allowed) on the worker thread.
+        A search, that has not started yet, is cancelled by the next one. The results of superseded searches are discarded.
+        """
+        phrase = self.search_input.text.strip()
+        self.search_generation += 1
+        generation = self.search_generation
+        if self.pending_search is not None:
+            self.pending_search.cancel()
+            self.pending_search = None
+
+        if not phrase:
+            self._update_results(generation, [], phrase, 0)
             return
-        self.info_label.text = f"Found {len(found)} airports."
+        self.pending_search = self._executor().submit(self._search_airports_thread, generation, phrase)
 
-        # Add each found airport to the table
-        for name, ident in found:
-            name_lbl = Label(text=name, size_hint_y=None, height=30)
-            ident_btn = Button(text=ident, size_hint_y=None, height=30)
-            # Bind button to select_airport to insert identifier into main input
-            ident_btn.bind(on_press=lambda btn, i=ident: self.select_airport(i))
-            self.table_layout.add_widget(name_lbl)
-            self.table_layout.add_widget(ident_btn)
-
-    def _search_airports_thread(self, city_phrase):
-        found = []
-        if city_phrase:
-            for ident, data in self.airports.items():
-                city = data.get('city', '').lower()
-                if city_phrase in city:
-                    found.append((data.get('name', ''), ident))
+    def _find_airports(self, phrase):
+        """
+        Returns (airport name, identifier) tuples of the best matching airports, and the total number of matches.
+        The matches of the previous phrase are used to narrow the search, if the phrase extends it.
+        """
+        index = self._load_search_index()
+        matches = index.refine(self.previous_matches, phrase)
+        self.previous_matches = matches
+        rows = index.top(matches, self.result_limit)
+        return [(self.airports.text('name', row), str(self.airports.icao[row])) for row in rows.tolist()], len(matches)
+
+    def _result_info(self, shown, total):
+        if shown < total:
+            return f"Found {total} airports, showing the best {shown}."
+        return f"Found {total} airports."
+
+    def _search_airports_thread(self, generation, city_phrase):
+        # Skip searches, that were superseded while they were waiting
+        if generation != self.search_generation:
+            return
+        found, total = self._find_airports(city_phrase)
+        if generation != self.search_generation:
+            return
         # Schedule UI update on the main thread
-        Clock.schedule_once(lambda dt: self._update_results(found, city_phrase))
+        Clock.schedule_once(lambda dt: self._update_results(generation, found, city_phrase, total))
+
+    def _update_results(self, generation, found, city_phrase, total):
+        """
+        Show the results of a search, if it is still the newest one. The first page of results is added at once,
+        the following pages on the next frames, so the UI stays responsive.
+        """
+        if generation != self.search_generation:
+            return
+        if self.page_event is not None:
+            self.page_event.cancel()
+            self.page_event = None
 
-    def _update_results(self, found, city_phrase):
         self.table_layout.clear_widgets()
         # Add table headers
         self.table_layout.add_widget(Label(text="Airport Name", bold=True, size_hint_y=None, height=30))
         self.table_layout.add_widget(Label(text="Identifier", bold=True, size_hint_y=None, height=30))
 
         if not city_phrase:
-            self.info_label.text = "Enter a city name to search."
+            self.info_label.text = "Enter a search phrase."
             return
 
         if not found:
-            self.info_label.text = "No airports found for this city."
+            self.info_label.text = "No airports found."
+            return
+        self.info_label.text = self._result_info(len(found), total)
+        self._add_result_page(generation, found, 0)
+
+    def _add_result_page(self, generation, found, start):
+        """
+        Add RESULT_PAGE_SIZE found airports to the table and schedule the next page.
+        """
+        self.page_event = None
+        if generation != self.search_generation:
             return
-        self.info_label.text = f"Found {len(found)} airports."
 
-        # Add each found airport to the table
-        for name, ident in found:
+        # Add each found airport of the page to the table
+        for name, ident in found[start:start + RESULT_PAGE_SIZE]:
             name_lbl = Label(text=name, size_hint_y=None, height=30)
             ident_btn = Button(text=ident, size_hint_y=None, height=30)
             # Bind button to select_airport to insert identifier
@@ -164,6 +239,9 @@ class CityAirportSearch(Popup):
             self.table_layout.add_widget(name_lbl)
             self.table_layout.add_widget(ident_btn)
 
+        if start + RESULT_PAGE_SIZE < len(found):
+            self.page_event = Clock.schedule_once(lambda dt: self._add_result_page(generation, found, start + RESULT_PAGE_SIZE))
+
     def select_airport(self, ident):
         """
         Insert the selected airport identifier into the main ICAO/IATA input field.
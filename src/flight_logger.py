@@ -18,35 +18,123 @@ AeroGCM - Flight Logger
 
 import os
 import csv
-import io
+import sqlite3
+from kivy.clock import Clock
 from kivy.uix.popup import Popup
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.textinput import TextInput
 from kivy.uix.label import Label
-from kivy.uix.scrollview import ScrollView
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.filechooser import FileChooserIconView
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 
-class FlightLogger(Popup):
-    # Class variable to persist CSV string between popups
-    csv_data = None
+#Import the flight log database
+from aerogcm_flight_store import get_flight_store, FLIGHT_COLUMNS, FLIGHT_PAGE_SIZE, SEARCH_COUNT_LIMIT
+
+"""
+FlightLogger
+------------------
+This module provides a Kivy Popup dialog to log flights, and to plot the logged flights on the map.
+Features:
+- Flights are shown in pages of a recycled table, only the visible rows are instantiated as widgets
+- Only the shown page is read from the flight log database, the flights are never all loaded into memory
+- Sorting by any column (click the header) and a text filter run in the database, on its sort indexes and its text search
+- Flights are stored in the flight log database (in memory, or on disk with AEROGCM_FLIGHT_STORE), every edit is written to it immediately
+- Flights can be imported from and exported to CSV files, replacing logged flights has to be confirmed
+"""
+
+# Columns of a logged flight
+FLIGHT_FIELDS = ["Departure Time", "Arrival Time", "Airline", "Callsign", "Airplane Type", "Registration", "Origin", "Destination"]
+
+# Height of a table row
+FLIGHT_ROW_HEIGHT = 30
 
-    def __init__(self, main_layout, **kwargs):
+# Delay in seconds after the last key press in the filter input, before the table is filtered
+FILTER_DELAY = 0.2
+
+class FlightRow(RecycleDataViewBehavior, BoxLayout):
+    """
+    One row of the flight table: the fields of a flight, a Remove and an Edit button.
+    The RecycleView reuses the rows for the visible flights, refresh_view_attrs fills them.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.size_hint_y = None
+        self.height = FLIGHT_ROW_HEIGHT
+        self.flight_logger = None
+        self.flight_id = None
+
+        self.field_labels = [Label(text='') for field in FLIGHT_FIELDS]
+        for label in self.field_labels:
+            self.add_widget(label)
+        remove_button = Button(text="Remove")
+        remove_button.bind(on_press=lambda instance: self.flight_logger.remove_flight(self.flight_id))
+        self.add_widget(remove_button)
+        edit_button = Button(text="Edit")
+        edit_button.bind(on_press=lambda instance: self.flight_logger.edit_flight(self.flight_id))
+        self.add_widget(edit_button)
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.flight_logger = data['flight_logger']
+        self.flight_id = data['flight_id']
+        fields = data['fields']
+        for i, label in enumerate(self.field_labels):
+            label.text = fields[i] if i < len(fields) else ''
+        return super().refresh_view_attrs(rv, index, data)
+
+class FlightLogger(Popup):
+    def __init__(self, main_layout, store=None, **kwargs):
         super().__init__(**kwargs)
         self.title = "Flight Logger"
         self.size_hint = (0.9, 0.9)
         self.main_layout = main_layout
+        self.store = store if store is not None else get_flight_store()
 
         # Main layout for the popup
         layout = BoxLayout(orientation='vertical', spacing=10, padding=10)
 
-        # Table to display logged flights
-        self.flight_table_scroll_view = ScrollView()
-        self.flight_table_layout = GridLayout(cols=10, size_hint_y=None)
-        self.flight_table_layout.bind(minimum_height=self.flight_table_layout.setter('height'))
-        self.flight_table_scroll_view.add_widget(self.flight_table_layout)
-        layout.add_widget(self.flight_table_scroll_view)
+        # Filter input, the table only shows the flights containing the phrase
+        self.filter_input = TextInput(hint_text="Filter flights", multiline=False, size_hint_y=None, height=40)
+        self.filter_trigger = Clock.create_trigger(self.apply_filter, FILTER_DELAY)
+        self.filter_input.bind(text=lambda instance, text: self.filter_trigger())
+        layout.add_widget(self.filter_input)
+
+        # Table header, clicking a column header sorts the table by that column
+        header_layout = GridLayout(cols=len(FLIGHT_FIELDS) + 2, size_hint_y=None, height=40)
+        self.header_buttons = []
+        for column, header in enumerate(FLIGHT_FIELDS):
+            header_button = Button(text=header, bold=True)
+            header_button.bind(on_press=lambda instance, c=column: self.sort_by(c))
+            header_layout.add_widget(header_button)
+            self.header_buttons.append(header_button)
+        header_layout.add_widget(Label(text="Remove", bold=True))
+        header_layout.add_widget(Label(text="Edit", bold=True))
+        layout.add_widget(header_layout)
+
+        # Recycled table to display logged flights, only the visible rows are widgets
+        self.flight_table = RecycleView()
+        table_rows = RecycleBoxLayout(orientation='vertical', default_size=(None, FLIGHT_ROW_HEIGHT),
+                                      default_size_hint=(1, None), size_hint_y=None)
+        table_rows.bind(minimum_height=table_rows.setter('height'))
+        self.flight_table.add_widget(table_rows)
+        # The view class is handed to the layout manager, so it is set after the layout is added
+        self.flight_table.viewclass = FlightRow
+        layout.add_widget(self.flight_table)
+
+        # Page navigation of the table
+        page_layout = BoxLayout(size_hint_y=None, height=40, spacing=10)
+        self.previous_button = Button(text="Previous", size_hint_x=0.2)
+        self.previous_button.bind(on_press=lambda instance: self.show_page(self.page_offset - FLIGHT_PAGE_SIZE))
+        page_layout.add_widget(self.previous_button)
+        self.page_label = Label(text='')
+        page_layout.add_widget(self.page_label)
+        self.next_button = Button(text="Next", size_hint_x=0.2)
+        self.next_button.bind(on_press=lambda instance: self.show_page(self.page_offset + FLIGHT_PAGE_SIZE))
+        page_layout.add_widget(self.next_button)
+        layout.add_widget(page_layout)
 
         # Buttons for file operations and adding new flights
         button_layout = BoxLayout(size_hint_y=None, height=50, spacing=10)
@@ -85,23 +173,20 @@ class FlightLogger(Popup):
 
         self.content = layout
 
-        # List to store flight data
-        self.flights = []
-        # Load from csv_data if available
-        if FlightLogger.csv_data:
-            self._load_from_csv_string(FlightLogger.csv_data)
-            self.update_table()
+        # Table state: sort column (None: logged order), sort direction, filter phrase, offset of the shown page,
+        # the number of flights passing the filter (None: more than SEARCH_COUNT_LIMIT) and the ids of the shown flights
+        self.sort_column = None
+        self.sort_descending = False
+        self.filter_phrase = ''
+        self.page_offset = 0
+        self.shown_count = 0
+        self.view_ids = []
 
-    def _save_to_csv_string(self):
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerows(self.flights)
-        FlightLogger.csv_data = output.getvalue()
+        # Show the first page of the logged flights
+        self.update_table()
 
-    def _load_from_csv_string(self, csv_string):
-        input_io = io.StringIO(csv_string)
-        reader = csv.reader(input_io)
-        self.flights = list(reader)
+    def get_flight(self, flight_id):
+        return self.store.get(flight_id)
 
     def open_file(self, *args):
         file_chooser = FileChooserIconView()
@@ -113,14 +198,43 @@ class FlightLogger(Popup):
         self.file_popup.open()
 
     def load_file(self, selection):
-        if selection:
-            file_path = selection[0]
-            with open(file_path, 'r') as file:
-                reader = csv.reader(file)
-                self.flights = list(reader)
-
-            self.update_table()
         self.file_popup.dismiss()
+        if not selection:
+            return
+        if len(self.store) > 0:
+            self.confirm_replace(selection[0])
+        else:
+            self.import_file(selection[0])
+
+    def confirm_replace(self, file_path):
+        """
+        Ask before the flights of a file replace the logged flights.
+        """
+        layout = BoxLayout(orientation='vertical', spacing=10, padding=10)
+        layout.add_widget(Label(text=f"The {len(self.store)} logged flights will be replaced by the flights of\n{os.path.basename(file_path)}."))
+        button_layout = BoxLayout(size_hint_y=None, height=50, spacing=10)
+        replace_button = Button(text="Replace")
+        cancel_button = Button(text="Cancel")
+        button_layout.add_widget(replace_button)
+        button_layout.add_widget(cancel_button)
+        layout.add_widget(button_layout)
+
+        self.confirm_popup = Popup(title='Replace Logged Flights', content=layout, size_hint=(0.6, 0.4))
+        replace_button.bind(on_press=lambda instance: (self.confirm_popup.dismiss(), self.import_file(file_path)))
+        cancel_button.bind(on_press=self.confirm_popup.dismiss)
+        self.confirm_popup.open()
+
+    def import_file(self, file_path):
+        """
+        Replace the logged flights by the flights of a CSV file, in one transaction.
+        If the file cannot be read, the logged flights stay unchanged.
+        """
+        try:
+            self.store.import_csv(file_path, replace=True)
+        except (OSError, UnicodeDecodeError, csv.Error, sqlite3.Error) as error:
+            print(f"Could not open the flight log file {file_path}: {error}")
+            return
+        self.update_table(reset_page=True)
 
     def save_file(self, *args):
         file_chooser = FileChooserIconView()
@@ -150,51 +264,98 @@ class FlightLogger(Popup):
 
     def save_to_file(self, selection):
         if selection:
-            file_path = selection[0]
-            with open(file_path, 'w', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerows(self.flights)
+            try:
+                self.store.export_csv(selection[0])
+            except (OSError, sqlite3.Error) as error:
+                print(f"Could not save the flight log file {selection[0]}: {error}")
         self.file_popup.dismiss()
 
     def add_flight(self, *args):
         add_popup = AddFlightPopup(self)
         add_popup.open()
 
-    def remove_flight(self, flight):
-        self.flights.remove(flight)
-        self._save_to_csv_string()
+    def append_flight(self, flight):
+        """
+        Log a new flight and show the updated page of the table.
+        """
+        self.store.add(flight)
         self.update_table()
 
+    def update_flight(self, flight_id, flight):
+        """
+        Replace the fields of a logged flight and show the updated page of the table.
+        """
+        self.store.update(flight_id, flight)
+        self.update_table()
+
+    def remove_flight(self, flight_id):
+        """
+        Remove the flight with the given id (the clicked row) and show the updated page of the table.
+        """
+        self.store.remove(flight_id)
+        self.update_table()
+
+    def sort_by(self, column):
+        """
+        Sort the table by a column, clicking the same column again reverses the order.
+        """
+        if self.sort_column == column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+        for i, header_button in enumerate(self.header_buttons):
+            marker = (' v' if self.sort_descending else ' ^') if i == column else ''
+            header_button.text = FLIGHT_FIELDS[i] + marker
+        self.update_table(reset_page=True)
+
+    def apply_filter(self, *args):
+        self.filter_phrase = self.filter_input.text.strip()
+        self.update_table(reset_page=True)
+
+    def show_page(self, offset):
+        """
+        Show the page of the table starting at the given offset, if there are flights to show there.
+        """
+        if offset < 0 or (offset > self.page_offset and len(self.view_ids) < FLIGHT_PAGE_SIZE):
+            return
+        self.page_offset = offset
+        self.update_table()
 
-    def update_table(self):
-        self.flight_table_layout.clear_widgets()
-
-        headers = ["Departure Time", "Arrival Time", "Airline", "Callsign", "Airplane Type", "Registration", "Origin", "Destination", "Remove", "Edit"]
-        for header in headers:
-            self.flight_table_layout.add_widget(Label(text=header, size_hint_y=None, height=40, bold=True))
-
-        for idx, flight in enumerate(self.flights):
-            # Add all 8 fields
-            for field in flight:
-                self.flight_table_layout.add_widget(Label(text=field, size_hint_y=None, height=30))
-            # Add Remove and Edit buttons in the same row
-            remove_button = Button(text="Remove", size_hint_y=None, height=30)
-            remove_button.bind(on_press=lambda instance, f=flight: self.remove_flight(f))
-            edit_button = Button(text="Edit", size_hint_y=None, height=30)
-            edit_button.bind(on_press=lambda instance, i=idx: self.edit_flight(i))
-            self.flight_table_layout.add_widget(remove_button)
-            self.flight_table_layout.add_widget(edit_button)
-
-        self._save_to_csv_string()
-    def edit_flight(self, flight_index):
-        edit_popup = EditFlightPopup(self, flight_index)
+    def update_table(self, reset_page=False):
+        """
+        Read the shown page of the table from the database, in the table order.
+        Only the rows in the visible part of the page are (re)created as widgets.
+        """
+        if reset_page:
+            self.page_offset = 0
+        order_by = FLIGHT_COLUMNS[self.sort_column] if self.sort_column is not None else None
+        view_ids, flights, self.shown_count = self.store.page(self.filter_phrase, order_by, self.sort_descending,
+                                                              self.page_offset)
+        if not view_ids and self.page_offset > 0:
+            # The last flights of the last page were removed, the page before is shown
+            self.page_offset = max(0, self.page_offset - FLIGHT_PAGE_SIZE)
+            view_ids, flights, self.shown_count = self.store.page(self.filter_phrase, order_by, self.sort_descending,
+                                                                  self.page_offset, count=self.shown_count)
+        self.view_ids = view_ids
+        self.flight_table.data = [{'flight_id': flight_id, 'fields': flight, 'flight_logger': self}
+                                  for flight_id, flight in zip(view_ids, flights)]
+        total = f"more than {SEARCH_COUNT_LIMIT}" if self.shown_count is None else str(self.shown_count)
+        if view_ids:
+            self.page_label.text = f"Flights {self.page_offset + 1}-{self.page_offset + len(view_ids)} of {total}"
+        else:
+            self.page_label.text = "No flights"
+        self.previous_button.disabled = self.page_offset == 0
+        self.next_button.disabled = len(view_ids) < FLIGHT_PAGE_SIZE or self.page_offset + len(view_ids) == self.shown_count
+
+    def edit_flight(self, flight_id):
+        edit_popup = EditFlightPopup(self, flight_id)
         edit_popup.open()
 
     def plot_flights(self, *args):
-        routes = [f"{flight[6]}-{flight[7]}" for flight in self.flights]
+        routes = [f"{origin}-{destination}" for origin, destination in self.store.routes()]
         self.main_layout.icao_input.text = ','.join(routes)
         self.main_layout.update_map(None)
-        self._save_to_csv_string()
         self.dismiss()
 
 
@@ -208,7 +369,7 @@ class AddFlightPopup(Popup):
         layout = BoxLayout(orientation='vertical', spacing=10, padding=10)
 
         self.fields = {}
-        self.field_names = ["Departure Time", "Arrival Time", "Airline", "Callsign", "Airplane Type", "Registration", "Origin", "Destination"]
+        self.field_names = FLIGHT_FIELDS
         for field in self.field_names:
             field_layout = BoxLayout(size_hint_y=None, height=50)
             field_layout.add_widget(Label(text=field, size_hint_x=0.4))
@@ -232,25 +393,24 @@ class AddFlightPopup(Popup):
 
     def add_flight(self, *args):
         flight = [self.fields[field].text for field in self.field_names]
-        self.flight_logger.flights.append(flight)
-        self.flight_logger.update_table()
+        self.flight_logger.append_flight(flight)
         self.dismiss()
 
 
 # New popup for editing flights
 class EditFlightPopup(Popup):
-    def __init__(self, flight_logger, flight_index, **kwargs):
+    def __init__(self, flight_logger, flight_id, **kwargs):
         super().__init__(**kwargs)
         self.title = "Edit Flight"
         self.size_hint = (0.8, 0.8)
         self.flight_logger = flight_logger
-        self.flight_index = flight_index
+        self.flight_id = flight_id
 
         layout = BoxLayout(orientation='vertical', spacing=10, padding=10)
 
         self.fields = {}
-        self.field_names = ["Departure Time", "Arrival Time", "Airline", "Callsign", "Airplane Type", "Registration", "Origin", "Destination"]
-        flight_data = self.flight_logger.flights[self.flight_index]
+        self.field_names = FLIGHT_FIELDS
+        flight_data = self.flight_logger.get_flight(self.flight_id)
         for i, field in enumerate(self.field_names):
             field_layout = BoxLayout(size_hint_y=None, height=50)
             field_layout.add_widget(Label(text=field, size_hint_x=0.4))
@@ -277,6 +437,5 @@ class EditFlightPopup(Popup):
 
     def save_flight(self, *args):
         updated_flight = [self.fields[field].text for field in self.field_names]
-        self.flight_logger.flights[self.flight_index] = updated_flight
-        self.flight_logger.update_table()
+        self.flight_logger.update_flight(self.flight_id, updated_flight)
         self.dismiss()
\ No newline at end of file
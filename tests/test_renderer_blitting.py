@@ -0,0 +1,60 @@
+""""
+AeroGCM - A Application to visualize and analyze flight routes
+    Copyright (C) 2025  MaxQ22
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import sys
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from aerogcm_renderer import MapRenderer
+
+"""
+Renderer blitting check
+------------------
+With blitting, only the overlays (routes, rings, labels, density heatmap) are redrawn on top of the cached map
+background. A blitted render must look exactly like the same render in a fresh renderer, so no overlay of a
+previous render may be part of the cached background.
+"""
+
+ROUTES = 'EDDF-KJFK,EDDF-KORD,EDDF-KATL,EGLL-KJFK'
+OTHER_ROUTES = 'EDDF-KJFK,EDDF-KORD,EDDF-KATL,EGLL-KBOS'
+
+def render_image(renderer, input_text, route_style):
+    parsed_pairs, parsed_rings = renderer.parser.compiled_plot_data(renderer.parser.compile_input(input_text))
+    renderer.render(parsed_pairs, parsed_rings, show_labels=False, route_style=route_style)
+    renderer.refresh()
+    return np.asarray(renderer.map_fig.canvas.buffer_rgba()).copy()
+
+def fresh_image(input_text, route_style):
+    return render_image(MapRenderer(use_blitting=True), input_text, route_style)
+
+def test_density_then_lines_matches_fresh_render():
+    renderer = MapRenderer(use_blitting=True)
+    render_image(renderer, ROUTES, 'density')
+    image = render_image(renderer, ROUTES, 'lines')
+    assert np.array_equal(image, fresh_image(ROUTES, 'lines'))
+
+def test_density_with_new_routes_matches_fresh_render():
+    renderer = MapRenderer(use_blitting=True)
+    render_image(renderer, ROUTES, 'density')
+    image = render_image(renderer, OTHER_ROUTES, 'density')
+    assert np.array_equal(image, fresh_image(OTHER_ROUTES, 'density'))